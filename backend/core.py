@@ -18,11 +18,20 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 import chromadb
 from chromadb.config import Settings
 from difflib import SequenceMatcher
+from utils.tiered_cache import TieredCache
+from utils.log_store import AppendOnlyStore
+from utils.single_flight import SingleFlight, request_key
+from utils.prompt_templates import PromptTemplate
+from services.model_router import MODEL_ROUTER
+from services.llm_resilience import LLM_RESILIENCE, LLM_CALL_TIMEOUT_SECONDS, UpstreamError
+from services.llm_metering import LLM_METER, usage_context, current_usage_tags
 
 load_dotenv()
 
 # // KIRTAN START
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+# Point at scripts/mock_openrouter.py (http://127.0.0.1:8800/api/v1) for offline benchmarks
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1").rstrip("/")
 # // KIRTAN STOP
 
 # /* GROQ LOGIC - DEPRECATED (commented for rollback) */
@@ -33,6 +42,11 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# Optional Supabase sink for LLM usage records (see services/llm_metering.py)
+LLM_USAGE_TABLE = os.getenv("LLM_USAGE_TABLE")
+if LLM_USAGE_TABLE:
+    LLM_METER.add_sink("supabase", lambda records: supabase.table(LLM_USAGE_TABLE).insert(records).execute())
+
 # ---------------- ChromaDB ----------------
 chroma_client = chromadb.PersistentClient(path="./chroma_db")
 collection = chroma_client.get_or_create_collection("company_docs")
@@ -99,6 +113,13 @@ TABLES = {
     "organizations": ["id", "name", "description", "created_at"]
 }
 
+# Schema as shown to the LLM, rendered once. Set-valued entries are sorted so
+# the text is byte-identical across workers (stable prompt prefix).
+TABLES_SCHEMA_JSON = json.dumps(
+    {table: list(cols) if isinstance(cols, list) else sorted(cols) for table, cols in TABLES.items()},
+    indent=2
+)
+
 # Tables that must be access-controlled by role/email
 ACCESS_CONTROLLED = {"projects", "employee_login"}
 
@@ -125,18 +146,38 @@ STM_SUMMARY_TRIGGER = 20   # when to summarize
 EMAIL_RE = re.compile(r"[a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z]{2,}", re.I)
 WORD_TOKEN_RE = re.compile(r"[a-z0-9@._-]+", re.I)
 
-USER_LLM_CACHE = {}
+# Two-level caches (process LRU -> shared store), see utils/tiered_cache.py
+# USER_LLM_CACHE: user_id -> user_llm_settings row (read by get_active_llm)
+# USER_IDENTITY_CACHE: email -> user uuid (get_user_id probes)
+USER_LLM_CACHE = TieredCache(
+    "llm_settings",
+    local_ttl=int(os.getenv("LLM_SETTINGS_LOCAL_TTL_SECONDS", "60")),
+    shared_ttl=int(os.getenv("LLM_SETTINGS_SHARED_TTL_SECONDS", "900"))
+)
+USER_IDENTITY_CACHE = TieredCache(
+    "user_identity",
+    local_ttl=int(os.getenv("IDENTITY_LOCAL_TTL_SECONDS", "300")),
+    shared_ttl=int(os.getenv("IDENTITY_SHARED_TTL_SECONDS", "3600"))
+)
 UUID_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.I)
 LEGACY_SETTINGS_FILE = "legacy_llm_settings.json"
-
-def load_legacy_settings():
-    if not os.path.exists(LEGACY_SETTINGS_FILE):
-        return {}
+# Append-only log replacing the JSON file; the JSON is imported on first use
+LEGACY_SETTINGS_LOG = os.getenv("LEGACY_SETTINGS_LOG", "legacy_llm_settings.log")
+_legacy_settings_store = None
+
+def _legacy_store():
+    global _legacy_settings_store
+    if _legacy_settings_store is None:
+        _legacy_settings_store = AppendOnlyStore(LEGACY_SETTINGS_LOG, import_json=LEGACY_SETTINGS_FILE)
+    return _legacy_settings_store
+
+def load_legacy_settings(user_id: str) -> dict | None:
+    """Settings saved by set_active_llm while the DB upsert was failing (indexed lookup)."""
     try:
-        with open(LEGACY_SETTINGS_FILE, 'r') as f:
-            return json.load(f)
-    except:
-        return {}
+        return _legacy_store().get(str(user_id))
+    except Exception as e:
+        print(f"⚠ Failed to load legacy settings: {e}")
+        return None
     
 # -----------------------------------------------------------------------------------------------
 # -----------------------------------------------------------------------------------------------
@@ -198,7 +239,16 @@ def handle_greetings(user_message: str, user_name: str = None):
 
 # // KIRTAN START 05-03
 def get_user_id(email: str) -> str | None:
-    """Fetch user uuid from Supabase using email."""
+    """Fetch user uuid from Supabase using email (cached per email)."""
+    uid = USER_IDENTITY_CACHE.get(email, loader=_lookup_user_id) if email else None
+    if uid:
+        return uid
+
+    print("⚠ Could not find UUID, falling back to email")
+    return email
+
+
+def _lookup_user_id(email: str) -> str | None:
     try:
         # 1. Try 'profiles' table (This is what Setting.js uses!)
         try:
@@ -228,9 +278,8 @@ def get_user_id(email: str) -> str | None:
 
     except Exception as e:
         print("⚠ get_user_id error:", e)
-        
-    print("⚠ Could not find UUID, falling back to email")
-    return email
+
+    return None
 # // KIRTAN STOP 05-03
 
 def get_user_perms_id(email: str) -> int | None:
@@ -284,12 +333,13 @@ def save_chat_message(
     chat_id: str,
     response_length=None,
     response_category=None,
-    keep_limit: int = 200
+    keep_limit: int = 200,
+    user_id=None
 ):
     """Save chat message with full privacy isolation (user + project + chat)."""
     
     
-    user_id = get_user_perms_id(user_email)
+    user_id = user_id or get_user_perms_id(user_email)
     if not user_id:
         print("⚠ Cannot save chat — user not found:", user_email)
         return
@@ -416,7 +466,7 @@ def save_chat_message(
 
 def load_chat_history(user_email: str, project_id: str = None,
                       chat_id: str = None, limit: int = 15):
-    """Fetch private chat history for one user, project, and chat_id."""
+    """Fetch the last `limit` messages (oldest first) for one user, project, and chat_id."""
     try:
         if not user_email:
             print("⚠ No email found — skipping history load.")
@@ -457,7 +507,7 @@ def load_chat_history(user_email: str, project_id: str = None,
             .eq("user_id", user_id)
             .eq("project_id", project_id)
             .eq("chat_id", chat_id)
-            .order("created_at", desc=False)
+            .order("created_at", desc=True)
             .limit(limit)
             .execute()
         )
@@ -468,7 +518,8 @@ def load_chat_history(user_email: str, project_id: str = None,
             return []
         
         print(f"[DEBUG] Loading chat history for {user_email} | project_id={project_id} | chat_id={chat_id}")
-        return [{"role": m["role"], "content": m["content"]} for m in res.data]
+        # Newest `limit` rows, returned in conversation order (same window as ChatSession.history)
+        return [{"role": m["role"], "content": m["content"]} for m in reversed(res.data)]
         
 
     except Exception as e:
@@ -477,13 +528,7 @@ def load_chat_history(user_email: str, project_id: str = None,
 
 # -----------------------------------------------------------------------------------------------
 
-def generate_episodic_summary(messages: list[str], user_email: str = None) -> str:
-    """
-    Convert raw chat messages into a compact episodic summary.
-    """
-    if not messages:
-        return ""
-
+def episodic_summary_messages(messages: list[str]) -> list[dict]:
     prompt = f"""
 You are a conversation summarization engine.
 
@@ -504,15 +549,23 @@ Conversation:
 
 Summary:
 """
+    return [
+        {"role": "system", "content": "You summarize conversations."},
+        {"role": "user", "content": prompt}
+    ]
 
-    model = get_user_llm_model(user_email) if user_email else None
 
-    summary = call_openrouter(
-        [
-            {"role": "system", "content": "You summarize conversations."},
-            {"role": "user", "content": prompt}
-        ],
-        model=model,
+def generate_episodic_summary(messages: list[str], user_email: str = None) -> str:
+    """
+    Convert raw chat messages into a compact episodic summary.
+    """
+    if not messages:
+        return ""
+
+    summary = call_llm_for_task(
+        "episodic_summary",
+        episodic_summary_messages(messages),
+        user_email=user_email,
         temperature=0.2,
         max_tokens=250
     )
@@ -521,6 +574,17 @@ Summary:
 
 # -----------------------------------------------------------------------------------------------
 
+def episodic_memory_row(episodic_user_id, project_id, chat_id, summary, msg_count) -> dict:
+    return {
+        "user_id": episodic_user_id,
+        "project_id": project_id,
+        "chat_id": chat_id,
+        "summary": summary,
+        "message_count": msg_count,
+        "importance_score": min(1.0, 0.4 + msg_count / 50)
+    }
+
+
 def store_episodic_memory(user_email, project_id, chat_id, summary, msg_count):
     try:
         if not user_email or not summary:
@@ -537,14 +601,9 @@ def store_episodic_memory(user_email, project_id, chat_id, summary, msg_count):
             print("⚠ Skipping episodic store — invalid chat_id UUID:", chat_id)
             return
 
-        supabase.table("episodic_memory").insert({
-            "user_id": episodic_user_id,
-            "project_id": project_id,
-            "chat_id": chat_id,
-            "summary": summary,
-            "message_count": msg_count,
-            "importance_score": min(1.0, 0.4 + msg_count / 50)
-        }).execute()
+        supabase.table("episodic_memory").insert(
+            episodic_memory_row(episodic_user_id, project_id, chat_id, summary, msg_count)
+        ).execute()
 
     except Exception as e:
         print("⚠ Episodic memory store error:", e)
@@ -651,15 +710,13 @@ def detect_intent(user_query: str, user_email: str = None) -> str:
         Reply ONLY with one category name.
         """
 
-        model = get_user_llm_model(user_email) if user_email else None
-
-        result = call_openrouter([
+        result = call_llm_for_task("intent", [
             {"role": "system", "content": "You are an intent classification engine."},
             {"role": "user", "content": intent_prompt},
            { "role": "system",
             "content": "Never repeat the exact same answer from history. Always generate a fresh response using updated info."
            }
-        ], model=model, temperature=0)
+        ], user_email=user_email, temperature=0, dedupe=True)
 
         if result:
             return result.strip().lower()
@@ -1763,16 +1820,16 @@ Example output:
 """
 # Context: {context} Siddharth
 
-        model = get_user_llm_model(user_email) if user_email else None
-
-        raw = call_openrouter(
+        raw = call_llm_for_task(
+            "json_table",
             [
                 {"role": "system", "content": "You are a strict JSON generator. Output ONLY valid JSON."},
                 {"role": "user", "content": prompt}
             ],
-            model=model,
+            user_email=user_email,
             temperature=0,
-            max_tokens=1200
+            max_tokens=1200,
+            dedupe=True
         )
 
         if not raw:
@@ -1884,8 +1941,19 @@ def safe_json_load(text: str):
 #         print("Groq API Error:", str(e))
 #         return None
 
+# Collapses concurrent identical non-streaming calls (opt-in via dedupe=True)
+LLM_SINGLE_FLIGHT = SingleFlight("openrouter")
+
 # // KIRTAN START 05-03
-def call_openrouter(messages, model="openai/gpt-4o-mini", temperature=0.6, max_tokens=1500, stream=False):
+def call_openrouter(messages, model="openai/gpt-4o-mini", temperature=0.6, max_tokens=1500, stream=False, dedupe=False, timeout=None, hedge=False):
+    """
+    dedupe=True: identical calls (model, messages, temperature, max_tokens)
+    that are already in flight wait for that call's result instead of
+    sending another request. Use it for deterministic prompts only.
+    timeout: overall deadline in seconds (default LLM_CALL_TIMEOUT_SECONDS);
+    non-streaming calls retry and respect the circuit breaker.
+    hedge=True: allow a hedged duplicate request (auxiliary calls only).
+    """
 
 #JONCY START
 # def call_openrouter(messages, model="meta-llama/llama-3.1-8b-instruct", temperature=0.6, max_tokens=1500, stream=False):
@@ -1918,67 +1986,173 @@ def call_openrouter(messages, model="openai/gpt-4o-mini", temperature=0.6, max_t
                 "messages": messages,
                 "temperature": temperature,
                 "max_tokens": max_tokens,
-                "stream": True
+                "stream": True,
+                "usage": {"include": True}   # token counts in the final chunk
             }
+            usage_tags = current_usage_tags()
             
-            response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=data,
-                stream=True
-            )
+            # The request and every line read run in a worker thread so a slow
+            # upstream never blocks the event loop. Closing the generator (e.g.
+            # when a websocket request is cancelled) closes the HTTP response,
+            # which aborts the upstream generation.
+            breaker = LLM_RESILIENCE.breaker(model)
 
             async def generator():
-                for line in response.iter_lines():
-                    if line:
-                        line_str = line.decode('utf-8')
-                        if line_str.startswith("data: "):
-                            if line_str == "data: [DONE]":
-                                break
-                            try:
-                                chunk = json.loads(line_str[6:])
-                                if 'choices' in chunk and chunk['choices']:
-                                    delta = chunk['choices'][0].get('delta', {})
-                                    if delta and 'content' in delta:
-                                        yield delta['content']
-                                        await asyncio.sleep(0.02)
-                            except:
-                                continue
+                response = None
+                if not breaker.allow():
+                    print(f"🔴 OpenRouter circuit open for {model}, stream not started")
+                    return
+                started = time.perf_counter()
+                first_token_at = None
+                completion_chars = 0
+                usage = None
+                ok = False
+                try:
+                    # (connect, read) timeouts: a stalled stream fails instead of hanging
+                    response = await asyncio.to_thread(
+                        requests.post,
+                        f"{OPENROUTER_BASE_URL}/chat/completions",
+                        headers=headers,
+                        json=data,
+                        stream=True,
+                        timeout=(10, timeout or LLM_CALL_TIMEOUT_SECONDS)
+                    )
+                    if response.status_code == 429 or response.status_code >= 500:
+                        breaker.record_failure()
+                    if response.status_code != 200:
+                        print(f"❌ OpenRouter stream error: {response.status_code} - {response.text}")
+                        return
+                    breaker.record_success()
+                    ok = True
+                    lines = response.iter_lines()
+
+                    while True:
+                        line = await asyncio.to_thread(next, lines, None)
+                        if line is None:
+                            break
+                        if line:
+                            line_str = line.decode('utf-8')
+                            if line_str.startswith("data: "):
+                                if line_str == "data: [DONE]":
+                                    break
+                                try:
+                                    chunk = json.loads(line_str[6:])
+                                    usage = chunk.get('usage') or usage
+                                    if 'choices' in chunk and chunk['choices']:
+                                        delta = chunk['choices'][0].get('delta', {})
+                                        if delta and 'content' in delta:
+                                            if first_token_at is None:
+                                                first_token_at = time.perf_counter()
+                                            completion_chars += len(delta['content'] or "")
+                                            yield delta['content']
+                                except:
+                                    continue
+                except requests.RequestException as e:
+                    breaker.record_failure()
+                    print("OpenRouter stream error:", str(e))
+                finally:
+                    breaker.release_probe()
+                    if response is not None:
+                        response.close()
+                    LLM_METER.record(
+                        model, usage_tags, (time.perf_counter() - started) * 1000, usage=usage,
+                        prompt_chars=_prompt_chars(messages), completion_chars=completion_chars, ok=ok, stream=True,
+                        ttft_ms=(first_token_at - started) * 1000 if first_token_at else None
+                    )
             return generator()
 
-        # Non-streaming
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-        }
-        data = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature,
-            "max_tokens": max_tokens
-        }
-        
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=data
-        )
-        
-        if response.status_code != 200:
-            print(f"❌ OpenRouter Error: {response.status_code} - {response.text}")
-            return None
-            
-        result = response.json()
-        if 'choices' in result and result['choices']:
-            return result['choices'][0]['message']['content']
-        else:
-            print("❌ OpenRouter Error: No choices in response")
-            return None
+        # Non-streaming (tags captured here: requests are sent from worker threads)
+        usage_tags = current_usage_tags()
+        if dedupe:
+            key = request_key(model, messages, temperature, max_tokens)
+            return LLM_SINGLE_FLIGHT.do(
+                key,
+                lambda: _openrouter_complete(messages, model, temperature, max_tokens, timeout, usage_tags, hedge)
+            )
+        return _openrouter_complete(messages, model, temperature, max_tokens, timeout, usage_tags, hedge)
+
+    except Exception as e:
+        print("OpenRouter API Error:", str(e))
+        return None
+
+
+def _prompt_chars(messages) -> int:
+    return sum(len(str(m.get("content", ""))) for m in messages or [])
 
+
+def _openrouter_complete(messages, model, temperature, max_tokens, timeout=None, usage_tags=None, hedge=False):
+    try:
+        return LLM_RESILIENCE.call(
+            model,
+            lambda use_model, remaining: _openrouter_send(messages, use_model, temperature, max_tokens, remaining, usage_tags),
+            timeout=timeout,
+            hedge=hedge,
+            call_site=(usage_tags or {}).get("call_site")
+        )
     except Exception as e:
         print("OpenRouter API Error:", str(e))
         return None
+
+
+def _openrouter_send(messages, model, temperature, max_tokens, timeout, usage_tags=None):
+    """One HTTP attempt; raises UpstreamError so the resilience layer can retry."""
+    headers = {
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Content-Type": "application/json",
+    }
+    data = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+
+    started = time.perf_counter()
+    elapsed_ms = lambda: (time.perf_counter() - started) * 1000
+    try:
+        response = requests.post(
+            f"{OPENROUTER_BASE_URL}/chat/completions",
+            headers=headers,
+            json=data,
+            timeout=(min(10, timeout), timeout)
+        )
+    except requests.RequestException as e:
+        LLM_METER.record(model, usage_tags or {}, elapsed_ms(), ok=False)
+        raise UpstreamError(f"{type(e).__name__}: {e}")
+
+    if response.status_code != 200:
+        LLM_METER.record(model, usage_tags or {}, elapsed_ms(), ok=False)
+        print(f"❌ OpenRouter Error: {response.status_code} - {response.text}")
+        raise UpstreamError(f"HTTP {response.status_code}", status=response.status_code)
+
+    result = response.json()
+    content = result['choices'][0]['message']['content'] if result.get('choices') else None
+    LLM_METER.record(
+        model, usage_tags or {}, elapsed_ms(), usage=result.get('usage'),
+        prompt_chars=_prompt_chars(messages), completion_chars=len(content or "")
+    )
+    if content is not None:
+        return content
+    print("❌ OpenRouter Error: No choices in response")
+    return None
 # // KIRTAN STOP 05-03
+
+
+def call_llm_for_task(task, messages, user_email=None, temperature=0.6, max_tokens=1500, dedupe=False):
+    """
+    Auxiliary (non-streaming) LLM call routed by task: the model tier,
+    token cap, concurrency cap and fallback chain come from MODEL_ROUTER.
+    """
+    with usage_context(call_site=task, user_email=user_email):
+        return MODEL_ROUTER.call(
+            task,
+            lambda model, tokens, timeout, fitted: call_openrouter(
+                fitted, model=model, temperature=temperature, max_tokens=tokens, dedupe=dedupe, timeout=timeout, hedge=True
+            ),
+            messages,
+            user_model=lambda: get_user_llm_model(user_email) if user_email else None,
+            max_tokens=max_tokens
+        )
 # krishi ws over 
 # -----------------------------------------------------------------------------------------------
 # --- Tanmey Added Functions ---
@@ -2031,11 +2205,10 @@ def handle_multi_question_self_asking(session, user_input, selected_index=None,
     """
     
     try:
-        model = get_user_llm_model(user_email) if user_email else None
-        response = call_openrouter([
+        response = call_llm_for_task("clarification", [
             {"role": "system", "content": "You are a query clarification assistant. Reply ONLY with JSON."},
             {"role": "user", "content": prompt}
-        ], model=model, temperature=0, max_tokens=300)
+        ], user_email=user_email, temperature=0, max_tokens=300)
         
         if response:
             # Basic JSON extraction
@@ -2117,11 +2290,10 @@ Project Context:
     """
     
     try:
-        model = get_user_llm_model(user_email) if user_email else None
-        response = call_openrouter([
+        response = call_llm_for_task("followups", [
             {"role": "system", "content": "You are a helpful assistant that suggests contextual follow-up questions. Reply ONLY with a valid JSON array of strings."},
             {"role": "user", "content": prompt}
-        ], model=model, temperature=0.7, max_tokens=250) #Tanmey Added
+        ], user_email=user_email, temperature=0.7, max_tokens=250, dedupe=True) #Tanmey Added
         
         if response:
             # Extract JSON array from response
@@ -2215,26 +2387,47 @@ def set_active_llm(user_id: str, model: str, provider: str = None) -> bool:
         save_legacy_settings({user_id: data})
         success = True
 
-    # Update Cache and return
-    USER_LLM_CACHE[user_id] = data
+    # Write-through so every worker sees the new model
+    USER_LLM_CACHE.set(user_id, data)
     return success
 
 # -----------------------------------------------------------------------------------------------
 
 def save_legacy_settings(data):
+    # Appends only the changed users instead of rewriting the whole file
     try:
-        existing = load_legacy_settings()
-        existing.update(data)
-        with open(LEGACY_SETTINGS_FILE, 'w') as f:
-            json.dump(existing, f, indent=2)
+        _legacy_store().put_many(data)
     except Exception as e:
         print(f"❌ Failed to save legacy settings: {e}")
 
 # // KIRTAN START 05-03
 def get_active_llm(user_id: str) -> dict:
-    """Fetch active LLM settings."""
+    """Fetch active LLM settings (read-through USER_LLM_CACHE)."""
     user_id = str(user_id)
-    
+
+    settings = USER_LLM_CACHE.get(user_id, loader=_load_active_llm)
+    if settings:
+        return settings
+
+    # 3. DB unreachable (nothing cached): settings saved while it was down
+    legacy = load_legacy_settings(user_id)
+    if legacy:
+        return legacy
+
+    # 4. Default fallback if absolutely nothing works
+    return _default_llm_settings(user_id)
+
+
+def _default_llm_settings(user_id: str) -> dict:
+    return {
+        "user_id": user_id,
+        "llm_model": "openai/gpt-4o-mini",
+        "provider": "openai"
+    }
+
+
+def _load_active_llm(user_id: str) -> dict | None:
+    """Load settings from Supabase. None (= don't cache) if the lookup failed."""
     try:
         # 1. Attempt to fetch settings using whatever ID we have
         res = supabase.table("user_llm_settings").select("*").eq("user_id", user_id).execute()
@@ -2242,6 +2435,7 @@ def get_active_llm(user_id: str) -> dict:
             return res.data[0]
     except Exception as e:
         print(f"⚠ DB fetch error in get_active_llm: {e}")
+        return None
 
     # 2. EMERGENCY FALLBACK: If user_id is an email, try looking up their UUID directly here
     if "@" in user_id:
@@ -2253,14 +2447,11 @@ def get_active_llm(user_id: str) -> dict:
                 if res2.data: 
                     return res2.data[0]
         except Exception:
-            pass
+            return None
 
-    # 3. Default fallback if absolutely nothing works
-    return {
-        "user_id": user_id,
-        "llm_model": "openai/gpt-4o-mini",
-        "provider": "openai"
-    }
+    # No settings row: the upsert may have failed and gone to the legacy log
+    # instead; otherwise cache the default until set_active_llm writes one
+    return load_legacy_settings(user_id) or _default_llm_settings(user_id)
 # // KIRTAN STOP 05-03
 
 
@@ -2726,6 +2917,91 @@ def _is_meaningful_db_answer(db_answer: str) -> bool:
 
 
 # Sujal_Start
+# ======================================================
+# 🔐 ROLE-BASED TONE ADAPTATION
+# ======================================================
+# Static instructions come first so the prompt prefix is identical for every
+# user with the same role tone (provider prompt caching); user data goes last.
+
+ROLE_TONE_INSTRUCTIONS = {
+    "admin": (
+        "📋 **Tone for Admin:** Professional and comprehensive.\n"
+        "- Use formal business language\n"
+        "- Provide detailed, technical explanations\n"
+        "- Include data-driven insights and metrics\n"
+        "- Use industry terminology appropriately\n"
+        "- Structure responses with clear sections and bullet points\n"
+        "- Maintain executive-level professionalism\n"
+    ),
+    "manager": (
+        "📊 **Tone for Manager:** Minimal professional - balanced and efficient.\n"
+        "- Use clear, direct business language\n"
+        "- Focus on actionable information\n"
+        "- Provide concise explanations without excessive detail\n"
+        "- Balance professionalism with readability\n"
+        "- Use bullet points for quick scanning\n"
+        "- Avoid overly technical jargon unless necessary\n"
+    ),
+    "project_manager": (
+        "📊 **Tone for Project Manager:** Clear and task-focused.\n"
+        "- Use straightforward, practical language\n"
+        "- Focus on project-relevant information\n"
+        "- Keep explanations clear and concise\n"
+        "- Use simple structures for easy understanding\n"
+        "- Prioritize actionable steps and next actions\n"
+    ),
+    "hr": (
+        "👥 **Tone for HR:** Professional and people-focused.\n"
+        "- Use professional but approachable language\n"
+        "- Focus on people-related insights\n"
+        "- Provide clear, policy-aware explanations\n"
+        "- Balance formality with accessibility\n"
+    ),
+    "employee": (  # Employee, Other
+        "💬 **Tone for Employee:** Simple and easy to understand.\n"
+        "- Use plain, everyday language\n"
+        "- Avoid technical jargon and complex terms\n"
+        "- Explain concepts in simple, clear terms\n"
+        "- Use friendly, approachable tone\n"
+        "- Break down complex information into easy steps\n"
+        "- Focus on practical, actionable guidance\n"
+        "- Keep responses concise and to-the-point\n"
+    )
+}
+
+
+def _role_tone_key(user_role: str | None) -> str:
+    role_normalized = (user_role or "employee").lower().strip()
+    if role_normalized in ["project manager", "projectmanager", "project_manager"]:
+        return "project_manager"
+    return role_normalized if role_normalized in ROLE_TONE_INSTRUCTIONS else "employee"
+
+
+FACT_MEMORY_TEMPLATES = {
+    key: PromptTemplate(
+        f"fact_memory:{key}",
+        [
+            "You are a helpful AI assistant for We3Vision.\n"
+            "You must follow strict reliability:\n"
+            "- Prefer DB facts first.\n"
+            "- Use document context only if relevant.\n"
+            "- Do not hallucinate.",
+            tone,
+            "Response rules:\n"
+            "- Keep response short, structured, professional.\n"
+            "- Be role-aware and adapt tone accordingly.\n"
+            "- If uncertain, say so clearly.",
+        ],
+        "User: {user_name} ({user_email})\n"
+        "Role: {user_role}\n\n"
+        "User Facts (stored):\n{facts_text}\n"
+        "{episodic_text}\n"
+        "{rag_text}\n"
+    )
+    for key, tone in ROLE_TONE_INSTRUCTIONS.items()
+}
+
+
 def build_fact_memory_system_prompt(
     user_name: str,
     user_email: str,
@@ -2751,87 +3027,13 @@ def build_fact_memory_system_prompt(
     if doc_context and isinstance(doc_context, str) and doc_context.strip():
         rag_text = f"\nRelevant document context:\n{doc_context}\n"
 
-    # ======================================================
-    # 🔐 ROLE-BASED TONE ADAPTATION
-    # ======================================================
-    
-    # Normalize role
-    role_normalized = (user_role or "employee").lower().strip()
-    
-    # Define tone instructions based on role
-    if role_normalized == "admin":
-        tone_instruction = (
-            "📋 **Tone for Admin:** Professional and comprehensive.\n"
-            "- Use formal business language\n"
-            "- Provide detailed, technical explanations\n"
-            "- Include data-driven insights and metrics\n"
-            "- Use industry terminology appropriately\n"
-            "- Structure responses with clear sections and bullet points\n"
-            "- Maintain executive-level professionalism\n"
-        )
-    
-    elif role_normalized == "manager":
-        tone_instruction = (
-            "📊 **Tone for Manager:** Minimal professional - balanced and efficient.\n"
-            "- Use clear, direct business language\n"
-            "- Focus on actionable information\n"
-            "- Provide concise explanations without excessive detail\n"
-            "- Balance professionalism with readability\n"
-            "- Use bullet points for quick scanning\n"
-            "- Avoid overly technical jargon unless necessary\n"
-        )
-    
-    elif role_normalized in ["project manager", "projectmanager", "project_manager"]:
-        tone_instruction = (
-            "📊 **Tone for Project Manager:** Clear and task-focused.\n"
-            "- Use straightforward, practical language\n"
-            "- Focus on project-relevant information\n"
-            "- Keep explanations clear and concise\n"
-            "- Use simple structures for easy understanding\n"
-            "- Prioritize actionable steps and next actions\n"
-        )
-    
-    elif role_normalized == "hr":
-        tone_instruction = (
-            "👥 **Tone for HR:** Professional and people-focused.\n"
-            "- Use professional but approachable language\n"
-            "- Focus on people-related insights\n"
-            "- Provide clear, policy-aware explanations\n"
-            "- Balance formality with accessibility\n"
-        )
-    
-    else:  # Employee, Other
-        tone_instruction = (
-            "💬 **Tone for Employee:** Simple and easy to understand.\n"
-            "- Use plain, everyday language\n"
-            "- Avoid technical jargon and complex terms\n"
-            "- Explain concepts in simple, clear terms\n"
-            "- Use friendly, approachable tone\n"
-            "- Break down complex information into easy steps\n"
-            "- Focus on practical, actionable guidance\n"
-            "- Keep responses concise and to-the-point\n"
-        )
-    
-    # ======================================================
-    # BUILD COMPLETE SYSTEM PROMPT
-    # ======================================================
-    
-    return (
-        "You are a helpful AI assistant for We3Vision.\n"
-        "You must follow strict reliability:\n"
-        "- Prefer DB facts first.\n"
-        "- Use document context only if relevant.\n"
-        "- Do not hallucinate.\n\n"
-        f"User: {user_name} ({user_email})\n"
-        f"Role: {user_role}\n\n"
-        f"{tone_instruction}\n"  # ✅ ADDED: Role-based tone
-        f"User Facts (stored):\n{facts_text}\n"
-        f"{episodic_text}\n"
-        f"{rag_text}\n"
-        "Response rules:\n"
-        "- Keep response short, structured, professional.\n"
-        "- Be role-aware and adapt tone accordingly.\n"  # ✅ UPDATED
-        "- If uncertain, say so clearly.\n"
+    return FACT_MEMORY_TEMPLATES[_role_tone_key(user_role)].render(
+        user_name=user_name,
+        user_email=user_email,
+        user_role=user_role,
+        facts_text=facts_text,
+        episodic_text=episodic_text,
+        rag_text=rag_text
     )
 # Sujal_Over
 
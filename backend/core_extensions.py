@@ -3,7 +3,7 @@
 # core_extensions.py - Tanmey_Start: Self-Asking Extensions
 # -----------------------------------------------------------------------------------------------
 import json
-from core import build_fact_memory_system_prompt, call_openrouter, get_user_llm_model
+from core import build_fact_memory_system_prompt, call_llm_for_task
 
 def build_fact_memory_system_prompt_322(
     user_name: str,
@@ -47,8 +47,7 @@ def generate_followup_suggestions(user_input: str, system_reply: str, project_id
         messages = [{"role": "user", "content": prompt}]
         # Use a faster/cheaper model if possible, or standard fallback
         # // KIRTAN START 05-03
-        model = get_user_llm_model(user_email) if user_email else None
-        response = call_openrouter(messages, model=model, temperature=0.7, max_tokens=150)
+        response = call_llm_for_task("followups", messages, user_email=user_email, temperature=0.7, max_tokens=150, dedupe=True)
         # // KIRTAN STOP 05-03
         
         if response:
@@ -1,33 +1,46 @@
 # routers/announcement_routes.py
 
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from pydantic import BaseModel
 from datetime import datetime, timezone
 from core import supabase
 from security.auth_utils import get_current_user
 from security.rbac_utils import require_permission
+from services.listing import list_rows, parse_fields, conditional_response
 
 router = APIRouter(prefix="/announcements", tags=["Announcements"])
 
+ANNOUNCEMENT_FIELDS = {"id", "sender_email", "recipient_email", "message", "timestamp", "status", "user_id"}
+
 
 # -------- Get Announcements --------
 @router.get("/get")
 def get_announcements(
+    request: Request,
+    response: Response,
+    cursor: str | None = Query(None),
+    since: str | None = Query(None),
+    limit: int | None = Query(None, ge=1, le=500),
+    fields: str | None = Query(None),
     current_user=Depends(require_permission("Announcements", "View")),
 ):
     user_email = current_user.get("email")
 
     try:
-        res = (
-            supabase.table("announcements")
-            .select("*")
-            .or_(f"sender_email.eq.{user_email},recipient_email.eq.{user_email}")
-            .order("timestamp", desc=True)
-            .execute()
+        rows, next_page = list_rows(
+            "announcements",
+            sort_col="timestamp",
+            select=parse_fields(fields, ANNOUNCEMENT_FIELDS, required=("timestamp", "id")),
+            filters=lambda q: q.or_(f"sender_email.eq.{user_email},recipient_email.eq.{user_email}"),
+            cursor=cursor,
+            since=since,
+            limit=limit
         )
 
-        return res.data or []
+        return conditional_response(request, response, rows, next_page)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 # Tanmey and Kirtan Start
 from fastapi.responses import JSONResponse
 # Tanmey and Kirtan Stop
 from core import supabase
 from security.auth_utils import get_current_user
 from security.rbac_utils import require_permission
+from services.task_read_model import extract_project_tag, parse_task_description
+from services import dashboard_stats
+from services.listing import list_rows, parse_fields, conditional_response
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime, timezone
@@ -12,21 +15,35 @@ import uuid
 
 router = APIRouter(prefix="/api", tags=["Project Broadcasts"])
 
+BROADCAST_FIELDS = {
+    "id", "title", "description", "type", "organization_id",
+    "created_by_email", "created_at", "broadcast_code"
+}
+
 @router.get("/project-broadcast")
 async def get_project_broadcasts(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    since: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    fields: Optional[str] = Query(None),
     current_user=Depends(require_permission("Communication", "View"))
 ):
     try:
-        res = (
-            supabase
-            .table("project_broadcasts")
-            .select("*")
-            .order("created_at", desc=True)
-            .execute()
+        rows, next_page = list_rows(
+            "project_broadcasts",
+            sort_col="created_at",
+            select=parse_fields(fields, BROADCAST_FIELDS, required=("created_at", "id")),
+            cursor=cursor,
+            since=since,
+            limit=limit
         )
 
-        return res.data or []
+        return conditional_response(request, response, rows, next_page)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -92,6 +109,9 @@ async def create_project_broadcast(
             .execute()
         )
 
+        if res.data:
+            dashboard_stats.record_broadcast_created(res.data[0].get("id"), org_id)
+
         return res.data[0] if res.data else {}
 
     except Exception as e:
@@ -113,6 +133,12 @@ async def create_broadcast_task(
 ):
     try:
         desc = (data.description or "").strip()
+
+        # Extract the legacy [Project:...] tag once at write time so reads
+        # can use the project_id column instead of re-parsing descriptions.
+        project_id = data.project_id
+        if not project_id and "[Project:" in desc:
+            _, project_id = extract_project_tag(desc)
         
         new_task = {
             "broadcast_id": broadcast_id,
@@ -127,13 +153,16 @@ async def create_broadcast_task(
         try:
             # First attempt with project_id
             temp_task = new_task.copy()
-            if data.project_id:
-                temp_task["project_id"] = data.project_id
+            if project_id:
+                temp_task["project_id"] = project_id
             res = supabase.table("broadcast_tasks").insert(temp_task).execute()
         except Exception:
             # Fallback: Just save without the column
             res = supabase.table("broadcast_tasks").insert(new_task).execute()
 
+        if res.data:
+            dashboard_stats.record_task_created(res.data[0].get("id"), broadcast_id)
+
         return res.data[0] if res.data else {}
 
     except Exception as e:
@@ -160,18 +189,10 @@ async def get_broadcast_tasks(
 
 # Tanmey and Kirtan Start
         tasks = res.data or []
-        import re
         for task in tasks:
-            d = task.get("description") or ""
-            
-            # 1. Extract project_id from tag if not already present as a column
-            if not task.get("project_id"):
-                match = re.search(r"\[Project:([a-f0-9-]+)\]", d)
-                if match:
-                    task["project_id"] = match.group(1)
-            
-            # 2. Clean the description for clean UI display
-            task["description"] = re.sub(r"\[Project:[^\]]+\]", "", d).strip()
+            # project_id column first, legacy [Project:...] tag as fallback;
+            # description is returned without the tag for clean UI display
+            task["description"], task["project_id"] = parse_task_description(task)
             
         return tasks
 # Tanmey and Kirtan Stop
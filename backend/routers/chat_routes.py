@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from services.chat_service import handle_common_chat
 from security.auth_utils import get_current_user
 from services.work_service import handle_work_chat
@@ -6,8 +6,11 @@ from pydantic import BaseModel
 from typing import Optional
 from fastapi import WebSocket, WebSocketDisconnect
 from security.auth_utils import get_current_user_from_token
-import json
-from services.ws_utils import stream_response
+from services.ws_session import ChatSession
+from services.ws_protocol import ChatConnection
+from services.sse_utils import sse_response
+from services.ws_utils import get_frame_stats
+from services.session_store import get_session_store_stats
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
 class CommonChatRequest(BaseModel):
@@ -24,12 +27,25 @@ async def common_chat(
 ):
     return await handle_common_chat(data, current_user)
 
+
+@router.post("/common/stream")
+async def common_chat_stream(
+    data: CommonChatRequest,
+    request: Request,
+    current_user=Depends(get_current_user)
+):
+    # Same generator the websocket uses, delivered as Server-Sent Events
+    stream = await handle_common_chat(data, current_user, stream=True)
+    return sse_response(request, stream)
+
 @router.websocket("/common/ws/{project_id}")
 async def common_chat_ws(
     websocket: WebSocket,
     project_id: str
 ):
     await websocket.accept()
+    ws_session = None
+    connection = None
 
     try:
         # 🔐 Extract token from query params
@@ -44,30 +60,19 @@ async def common_chat_ws(
             await websocket.close(code=1008)
             return
 
-        current_user = {
-            "email": user_email,
-            "name": "User"
-        }
+        # Identity, role, permissions and model are resolved once per connection
+        ws_session = await ChatSession.open(user_email, "User")
+        current_user = ws_session.current_user
 
         print("🔎 COMMON WEBSOCKET CURRENT USER:", current_user)
 
-        while True:
-            raw_data = await websocket.receive_text()
-            data_dict = json.loads(raw_data)
-
+        def build_request(frame: dict):
             # Inject project_id from URL
-            data_dict["project_id"] = project_id
-
-            # Convert to your existing Pydantic model
-            data = CommonChatRequest(**data_dict)
+            return CommonChatRequest(**{**frame, "project_id": project_id})
 
-            stream = await handle_common_chat(
-                data,
-                current_user,
-                stream=True
-            )
-
-            await stream_response(websocket, stream)
+        # One socket can run several generations, each tagged with its request_id
+        connection = ChatConnection(websocket, handle_common_chat, build_request, ws_session, label="Common")
+        await connection.serve()
 
     except WebSocketDisconnect:
         print("🔌 Common WebSocket disconnected")
@@ -78,4 +83,22 @@ async def common_chat_ws(
             "type": "error",
             "message": "Something went wrong."
         })
-        await websocket.close()
\ No newline at end of file
+        await websocket.close()
+
+    finally:
+        if connection:
+            await connection.close()
+        if ws_session:
+            ws_session.close()
+
+
+@router.get("/ws/stats")
+def chat_ws_stats(current_user=Depends(get_current_user)):
+    """Frame counters for the chat websockets (frames/s, bytes/s, tokens per frame)."""
+    return get_frame_stats()
+
+
+@router.get("/sessions/stats")
+def chat_session_stats(current_user=Depends(get_current_user)):
+    """Entries, bytes, hit/miss and eviction counters of the chat session store."""
+    return get_session_store_stats()
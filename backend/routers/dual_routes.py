@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 from security.auth_utils import get_current_user,get_current_user_from_token
 from security.rbac_utils import require_permission
 from services.dual_service import handle_dual_chat
 from fastapi import WebSocket, WebSocketDisconnect
-import json
-from services.ws_utils import stream_response
+from services.ws_session import ChatSession
+from services.ws_protocol import ChatConnection
+from services.sse_utils import sse_response
 router = APIRouter(prefix="/chat", tags=["Dual Chat"])
 
 class DualChatRequest(BaseModel):
@@ -25,11 +26,24 @@ async def dual_chat(
 ):
     return await handle_dual_chat(data, current_user)
 
+
+@router.post("/dual/stream")
+async def dual_chat_stream(
+    data: DualChatRequest,
+    request: Request,
+    current_user=Depends(require_permission("ChatDual", "View"))
+):
+    # Same generator the websocket uses, delivered as Server-Sent Events
+    stream = await handle_dual_chat(data, current_user, stream=True)
+    return sse_response(request, stream)
+
 @router.websocket("/dual/ws")
 async def dual_chat_ws(
     websocket: WebSocket
 ):
     await websocket.accept()
+    ws_session = None
+    connection = None
 
     try:
         # 🔐 Extract token from query params
@@ -44,33 +58,26 @@ async def dual_chat_ws(
             await websocket.close(code=1008)
             return
 
-        current_user = {
-            "email": user_email,
-            "name": "User"
-        }
+        # Identity, role, permissions and model are resolved once per connection
+        ws_session = await ChatSession.open(user_email, "User")
+        current_user = ws_session.current_user
 
         print("🔎 DUAL WEBSOCKET CURRENT USER:", current_user)
 
-        while True:
-            # Receive message from frontend
-            raw_data = await websocket.receive_text()
-            data_dict = json.loads(raw_data)
-
-            # Convert to Pydantic model
-            data = DualChatRequest(**data_dict)
-
-            stream = await handle_dual_chat(
-                data,
-                current_user,
-                stream=True
-            )
-
-            await stream_response(websocket, stream)
-
-            # Signal completion
+        if not ws_session.can("ChatDual", "View"):
             await websocket.send_json({
-                "type": "done"
+                "type": "error",
+                "message": "Forbidden: Access to ChatDual denied."
             })
+            await websocket.close(code=1008)
+            return
+
+        def build_request(frame: dict):
+            return DualChatRequest(**frame)
+
+        # One socket can run several generations, each tagged with its request_id
+        connection = ChatConnection(websocket, handle_dual_chat, build_request, ws_session, label="Dual")
+        await connection.serve()
 
     except WebSocketDisconnect:
         print("🔌 Dual WebSocket disconnected")
@@ -81,4 +88,10 @@ async def dual_chat_ws(
             "type": "error",
             "message": "Something went wrong while processing your request."
         })
-        await websocket.close()
\ No newline at end of file
+        await websocket.close()
+
+    finally:
+        if connection:
+            await connection.close()
+        if ws_session:
+            ws_session.close()
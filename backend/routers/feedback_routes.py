@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from pydantic import BaseModel
 from typing import Optional, Union, Dict, Any
 from datetime import datetime, timezone
-from core import supabase, get_user_perms_id, get_user_preference_summary
+from core import supabase, get_user_perms_id
 from security.auth_utils import get_current_user
 from security.rbac_utils import require_permission
+from services import preference_stats
+from services.listing import list_rows, parse_fields, conditional_response
 import uuid
 
 
@@ -59,43 +61,43 @@ async def chat_feedback(
             # Instead of crashing, just return a friendly error or ignore
             raise HTTPException(status_code=400, detail="Invalid message_id format (must be UUID)")
 
-        # Fetch message
-        res = supabase.table("user_memorys") \
-            .select("role, context_feedback, user_id") \
+        if not user_id:
+            raise HTTPException(status_code=403, detail="Unauthorized access to message")
+
+        # Ownership + assistant-only check and update in one conditional write
+        updated = supabase.table("user_memorys") \
+            .update({"context_feedback": context_feedback}) \
             .eq("id", message_id) \
+            .eq("user_id", user_id) \
+            .eq("role", "assistant") \
             .execute()
 
-        if not res.data:
-            raise HTTPException(status_code=404, detail="Message not found")
+        if not updated.data:
+            # Nothing matched — look the row up only to report the right error
+            res = supabase.table("user_memorys") \
+                .select("role, user_id") \
+                .eq("id", message_id) \
+                .execute()
 
-        msg = res.data[0]
+            if not res.data:
+                raise HTTPException(status_code=404, detail="Message not found")
 
-        # Ownership check
-        if str(msg.get("user_id")) != str(user_id):
-            raise HTTPException(status_code=403, detail="Unauthorized access to message")
+            if str(res.data[0].get("user_id")) != str(user_id):
+                raise HTTPException(status_code=403, detail="Unauthorized access to message")
 
-        # Assistant only
-        if msg.get("role") != "assistant":
             raise HTTPException(status_code=400, detail="Feedback only allowed on assistant messages")
 
-        # Update feedback
-        supabase.table("user_memorys") \
-            .update({"context_feedback": context_feedback}) \
-            .eq("id", message_id) \
-            .execute()
-
-        # Re-fetch
-        after = supabase.table("user_memorys") \
-            .select("id, context_feedback, role, user_id") \
-            .eq("id", message_id) \
-            .execute()
-
-        after_row = after.data[0] if after.data else None
+        after_row = updated.data[0]
 
         try:
-            get_user_preference_summary(user_id)
-        except Exception:
-            pass
+            preference_stats.apply_feedback(
+                user_id,
+                message_id,
+                after_row.get("response_category"),
+                context_feedback
+            )
+        except Exception as e:
+            print("⚠ Preference stats update failed:", e)
 
         return {
             "message": "✅ Feedback stored successfully",
@@ -114,6 +116,8 @@ async def chat_feedback(
 
 general_feedback_router = APIRouter(prefix="/api", tags=["General Feedback"])
 
+FEEDBACK_FIELDS = {"id", "rating", "comment", "metadata", "created_at"}
+
 class GeneralFeedbackRequest(BaseModel):
     rating: int
     comment: Optional[str] = None
@@ -160,6 +164,12 @@ async def submit_general_feedback(
 #kirtan start
 @general_feedback_router.get("/feedback/all")
 async def get_all_feedback(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    since: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    fields: Optional[str] = Query(None),
     current_user=Depends(require_permission("Feedback", "View"))
 ):
     try:
@@ -167,19 +177,22 @@ async def get_all_feedback(
         if current_user.get("role").lower() != "admin":
             raise HTTPException(status_code=403, detail="Admin access required")
 
-        res = (
-            supabase
-            .table("feedback")
-            .select("*")
-            .order("created_at", desc=True)
-            .execute()
+        rows, next_page = list_rows(
+            "feedback",
+            sort_col="created_at",
+            select=parse_fields(fields, FEEDBACK_FIELDS, required=("created_at", "id")),
+            cursor=cursor,
+            since=since,
+            limit=limit
         )
 
-        return {
+        return conditional_response(request, response, {
             "success": True,
-            "data": res.data if res.data else []
-        }
+            "data": rows
+        }, next_page)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
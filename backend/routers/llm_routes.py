@@ -1,10 +1,17 @@
-from fastapi import APIRouter,HTTPException, Depends, Query
+from fastapi import APIRouter,HTTPException, Depends, Query, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from security.auth_utils import get_current_user
 from security.rbac_utils import require_permission
 from pydantic import BaseModel
 from typing import Optional
-from datetime import datetime, timezone
 from core import get_user_llm_model,update_user_llm_model, get_user_role, get_active_llm, set_active_llm, get_user_id,supabase 
+from core import USER_LLM_CACHE, USER_IDENTITY_CACHE, LLM_SINGLE_FLIGHT
+from services.model_router import MODEL_ROUTER
+from services.llm_resilience import LLM_RESILIENCE
+from utils.prompt_templates import get_prompt_stats
+from services.suggestion_engine import get_suggestion_stats
+from services.llm_metering import LLM_METER
+from services import llm_sync, llm_batch, ws_session
 
 router = APIRouter(prefix="/api", tags=["LLM"])
 
@@ -42,6 +49,8 @@ async def update_user_llm(
     if not success:
         raise HTTPException(status_code=500, detail="Update failed")
 
+    ws_session.mark_stale(data.target_email or user_email)
+
     return {
         "success": True,
         "llm_model": data.llm_model
@@ -131,74 +140,163 @@ async def select_llm_route(
     if not success:
         raise HTTPException(status_code=500, detail="Failed to save settings")
 
+    ws_session.mark_stale(target_email)
+
     return {
         "message": "✅ Model updated",
         "model": data.model
     }
 @router.post("/llm/sync_users")
-async def sync_users_route(current_user=Depends(require_permission("API Management", "Update"))):
+async def sync_users_route(
+    background_tasks: BackgroundTasks,
+    dry_run: bool = Query(False),
+    background: bool = Query(False),
+    current_user=Depends(require_permission("API Management", "Update"))
+):
     logged_in_email = current_user["email"]
     role = get_user_role(logged_in_email)
 
     if role.lower() != "admin":
         raise HTTPException(status_code=403, detail="Admin only")
 
+    # Large orgs: run as a background job and poll /llm/sync_users/{job_id}
+    if background:
+        job = llm_sync.create_sync_job(dry_run=dry_run, requested_by=logged_in_email)
+        background_tasks.add_task(llm_sync.run_sync_job, job["job_id"])
+        return job
+
     try:
-        # 1️⃣ Fetch all users from user_profiles
-        res = supabase.table("user_profiles") \
-            .select("user_id, email") \
-            .execute()
+        return await run_in_threadpool(llm_sync.reconcile_llm_settings, dry_run)
+
+    except Exception as grand_e:
+        raise HTTPException(status_code=500, detail=f"Sync failed: {str(grand_e)}")
+
+
+@router.get("/llm/sync_users/{job_id}")
+async def sync_users_status_route(
+    job_id: str,
+    current_user=Depends(require_permission("API Management", "View"))
+):
+    if get_user_role(current_user["email"]).lower() != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
 
-        users = res.data or []
+    job = llm_sync.get_sync_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
 
-        synced_count = 0
-        errors = []
+    return job
 
-        for u in users:
-            uid = u.get("user_id")
-            email = u.get("email")
 
-            if not uid or not email:
-                continue
+class BatchJobRequest(BaseModel):
+    emails: Optional[list[str]] = None     # default: every user
+    resume_job_id: Optional[str] = None
 
-            try:
-                # 2️⃣ Check if settings exist
-                exist = supabase.table("user_llm_settings") \
-                    .select("user_id") \
-                    .eq("user_id", uid) \
-                    .execute()
 
-                if exist.data:
-                    continue
+@router.post("/llm/batch/{kind}")
+async def start_batch_job_route(
+    kind: str,
+    data: BatchJobRequest,
+    background_tasks: BackgroundTasks,
+    current_user=Depends(require_permission("API Management", "Update"))
+):
+    """Start (or resume) an offline LLM job: episodic_resummarize | fact_reextract."""
+    if get_user_role(current_user["email"]).lower() != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
 
-                # 3️⃣ Insert default settings
-                default_settings = {
-                    "user_id": uid,
+    try:
+        job = llm_batch.create_batch_job(
+            kind, emails=data.emails, requested_by=current_user["email"], job_id=data.resume_job_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-                    "llm_model": "openai/gpt-4o-mini",
-                    "provider": "openai",
-                    #JONCY START
-                    # "llm_model": "meta-llama/llama-3.1-8b-instruct",
-                    # "provider": "openrouter",
-                    #JONCY END
-                    "updated_at": datetime.now(timezone.utc).isoformat()
-                }
+    background_tasks.add_task(llm_batch.run_batch_job, job["job_id"])
+    return job
 
-                supabase.table("user_llm_settings") \
-                    .insert(default_settings) \
-                    .execute()
 
-                synced_count += 1
+@router.get("/llm/batch/{job_id}")
+async def batch_job_status_route(
+    job_id: str,
+    current_user=Depends(require_permission("API Management", "View"))
+):
+    if get_user_role(current_user["email"]).lower() != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
 
-            except Exception as e:
-                errors.append(f"Failed to sync {email}: {str(e)}")
+    job = llm_batch.get_batch_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
 
-        return {
-            "message": f"Synced {synced_count} new users.",
-            "total_checked": len(users),
-            "errors": errors
-        }
+    return job
+
+
+@router.post("/llm/batch/{job_id}/cancel")
+async def cancel_batch_job_route(
+    job_id: str,
+    current_user=Depends(require_permission("API Management", "Update"))
+):
+    if get_user_role(current_user["email"]).lower() != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+
+    if not llm_batch.cancel_batch_job(job_id):
+        raise HTTPException(status_code=404, detail="No running job with this id")
+
+    return {"success": True, "job_id": job_id}
+
+
+@router.get("/llm/cache/stats")
+def llm_cache_stats(current_user=Depends(require_permission("Profile Setting", "View"))):
+    """Hit/miss and invalidation counters of the LLM settings and identity caches."""
+    return {
+        "llm_settings": USER_LLM_CACHE.stats(),
+        "identity": USER_IDENTITY_CACHE.stats()
+    }
+
+
+@router.get("/llm/dedupe/stats")
+def llm_dedupe_stats(current_user=Depends(require_permission("Profile Setting", "View"))):
+    """How many concurrent identical LLM calls were served by one upstream request."""
+    return LLM_SINGLE_FLIGHT.stats()
+
+
+@router.get("/llm/health")
+def llm_health(current_user=Depends(require_permission("Profile Setting", "View"))):
+    """Upstream LLM health: per-model circuit breaker state, latency and retry / hedge counters."""
+    return LLM_RESILIENCE.health()
+
+
+@router.get("/llm/prompts/stats")
+def llm_prompt_stats(current_user=Depends(require_permission("Profile Setting", "View"))):
+    """Static prefix size and shared-prefix ratio of each system prompt template."""
+    return get_prompt_stats()
+
+
+@router.get("/llm/suggestions/stats")
+def llm_suggestion_stats(current_user=Depends(require_permission("Profile Setting", "View"))):
+    """How follow-up suggestions were produced: inline, speculative LLM or project templates."""
+    return get_suggestion_stats()
+
+
+@router.get("/llm/usage")
+def llm_usage_report(
+    top: int = Query(10, ge=1, le=100),
+    current_user=Depends(require_permission("API Management", "View"))
+):
+    """Token usage and estimated cost by call site, user, model and project; p95 latency per call site."""
+    # Reports other users' emails and spend
+    if get_user_role(current_user["email"]).lower() != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+
+    return LLM_METER.report(top=top)
+
+
+@router.get("/llm/router/stats")
+def llm_router_stats(current_user=Depends(require_permission("Profile Setting", "View"))):
+    """Task -> tier configuration and per-task latency / token / fallback counters."""
+    return MODEL_ROUTER.stats()
 
-    except Exception as grand_e:
-        raise HTTPException(status_code=500, detail=f"Sync failed: {str(grand_e)}")
 
+@router.post("/llm/router/reload")
+def llm_router_reload(current_user=Depends(require_permission("API Management", "Update"))):
+    """Re-read the router config now instead of waiting for the file-change check."""
+    MODEL_ROUTER.reload()
+    return {"success": True, "config": MODEL_ROUTER.stats()["config"]}
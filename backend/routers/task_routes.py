@@ -1,14 +1,15 @@
 # This file defines API routes for task assignments and manager dashboard
-# Tanmey and Kirtan Start
-import re
-# Tanmey and Kirtan Stop
-from fastapi import APIRouter,HTTPException,Depends, Query
+import asyncio
+from fastapi import APIRouter,HTTPException,Depends, Query, Response
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timezone
 from core import supabase
 from security.auth_utils import get_current_user
 from security.rbac_utils import require_permission
+from services.task_read_model import load_user_tasks
+from utils.pagination import InvalidCursor
+from services import dashboard_stats
 
 router = APIRouter(prefix="/api", tags=["Tasks"])
 
@@ -56,6 +57,8 @@ async def assign_task(
 
         supabase.table("task_assignments").insert(assignments).execute()
 
+        dashboard_stats.record_assignments(task_id, len(assignments), status="pending")
+
         return {
             "success": True,
             "count": len(assignments)
@@ -66,7 +69,11 @@ async def assign_task(
 
 @router.get("/my-tasks")
 async def get_my_tasks(
+    response: Response,
     user_email: str = Query(None),
+    status: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=200),
     current_user=Depends(require_permission("Dashboard", "View"))
 ):
     if not user_email:
@@ -87,75 +94,21 @@ async def get_my_tasks(
 
         user_id = user_res.data[0]["id"]
 
-        # STEP 2 — get task assignments
-        assignments = (
-            supabase
-            .table("task_assignments")
-            .select("*")
-            .eq("user_id", user_id)
-            .eq("is_active", True)
-            .execute()
+        # STEP 2 — assignments + tasks + broadcasts (batched)
+        tasks, next_page = load_user_tasks(
+            user_id,
+            status=status,
+            cursor=cursor,
+            limit=limit
         )
 
-        if not assignments.data:
-            return []
-
-        tasks = []
-        # STEP 3 — fetch task details
-        for a in assignments.data:
-            # Fetch task info
-            task_res = (
-                supabase
-                .table("broadcast_tasks")
-                .select("*")
-                .eq("id", a["task_id"])
-                .execute()
-            )
-            
-            task_data = task_res.data[0] if task_res.data else None
-            broadcast_title = "N/A"
-
-            if task_data:
-                # Fetch broadcast info
-                broadcast_res = (
-                    supabase
-                    .table("project_broadcasts")
-                    .select("title")
-                    .eq("id", task_data["broadcast_id"])
-                    .execute()
-                )
-                if broadcast_res.data:
-                    broadcast_title = broadcast_res.data[0].get("title", "N/A")
-
-            desc = task_data["description"] or "" if task_data else ""
-            
-            # Start with project_id from task_data (if it exists as a column)
-            extracted_project_id = task_data.get("project_id") if task_data else None
-            
-            if desc:
-                # Also try matching in description for backward compatibility
-                match = re.search(r"\[Project:([a-f0-9-]+)\]", desc)
-                if match:
-                    if not extracted_project_id:
-                        extracted_project_id = match.group(1)
-                    # Always clean the description
-                    desc = re.sub(r'\[Project:[^\]]+\]', '', desc).strip()
-
-            tasks.append({
-                "assignment_id": a["id"],
-                "status": a["status"],
-                "assigned_at": a["assigned_at"],
-                "task_title": task_data["title"] if task_data else "Unnamed Task",
-                "description": desc,
-                "project_id": extracted_project_id,
-                "priority": task_data["priority"] if task_data else "low",
-                "deadline": task_data["deadline"] if task_data else None,
-                "broadcast_title": broadcast_title
-            })
-# Tanmey and Kirtan Stop
+        if next_page:
+            response.headers["X-Next-Cursor"] = next_page
 
         return tasks
 
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print("MY TASK ERROR:", e)
         return []
@@ -170,11 +123,27 @@ async def update_assignment_status(
     current_user=Depends(require_permission("Dashboard", "Update")) 
 ):
     try:
+        previous = (
+            supabase
+            .table("task_assignments")
+            .select("status, task_id")
+            .eq("id", assignment_id)
+            .limit(1)
+            .execute()
+        )
+
         supabase.table("task_assignments") \
             .update({"status": data.status}) \
             .eq("id", assignment_id) \
             .execute()
 
+        if previous.data:
+            dashboard_stats.record_status_change(
+                previous.data[0].get("task_id"),
+                previous.data[0].get("status"),
+                data.status
+            )
+
         return {"success": True}
 
     except Exception as e:
@@ -182,44 +151,12 @@ async def update_assignment_status(
 
 @router.get("/manager/dashboard")
 async def get_manager_dashboard(
+    breakdown: Optional[str] = Query(None, pattern="^(broadcast|organization)$"),
     current_user=Depends(require_permission("Dashboard", "View"))
 ):
     try:
-        total_broadcasts = (
-            supabase
-            .table("project_broadcasts")
-            .select("id", count="exact")
-            .execute()
-            .count
-        )
-
-        total_tasks = (
-            supabase
-            .table("broadcast_tasks")
-            .select("id", count="exact")
-            .execute()
-            .count
-        )
-
-        assignments = (
-            supabase
-            .table("task_assignments")
-            .select("status")
-            .execute()
-        )
-
-        status_counts = {}
-
-        for a in (assignments.data or []):
-            s = a.get("status", "unknown")
-            status_counts[s] = status_counts.get(s, 0) + 1
-
-        return {
-            "total_broadcasts": total_broadcasts,
-            "total_tasks": total_tasks,
-            "total_assignments": len(assignments.data or []),
-            "status_breakdown": status_counts
-        }
+        # May run a full reconciliation against Supabase
+        return await asyncio.to_thread(dashboard_stats.get_dashboard, breakdown)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,15 +1,18 @@
 # routers/user_routes.py
 
-from fastapi import APIRouter, HTTPException, Depends, Body
+from fastapi import APIRouter, HTTPException, Depends, Body, Query, Request, Response
 from pydantic import BaseModel
 from core import get_user_llm_model, update_user_llm_model, get_user_role, supabase
 from security.auth_utils import get_current_user
 from security.rbac_utils import require_permission
 from security.api_key import verify_api_key_dependency
+from services.listing import list_rows, parse_fields, conditional_response
 
 
 router = APIRouter(prefix="/api", tags=["Users"])
 
+USER_LIST_FIELDS = {"id", "email", "role", "name"}
+
 
 # -------- Get User LLM --------
 @router.get("/user/llm")
@@ -64,26 +67,37 @@ def update_user_llm(
 # -------- Users List --------
 @router.get("/users-list")
 def get_users_list_route(
+    request: Request,
+    response: Response,
+    cursor: str | None = Query(None),
+    limit: int | None = Query(None, ge=1, le=500),
+    fields: str | None = Query(None),
     _: None = Depends(verify_api_key_dependency)
 ):
+    # user_perms has no timestamp column: keyset on id (ascending)
+    select = parse_fields(fields, USER_LIST_FIELDS, required=("id",)) if fields else "id, email, role, name"
+
     try:
-        res = (
-            supabase
-            .table("user_perms")
-            .select("id, email, role, name")
-            .execute()
+        rows, next_page = list_rows(
+            "user_perms",
+            sort_col="id",
+            tie_col=None,
+            select=select,
+            cursor=cursor,
+            limit=limit,
+            desc=False
         )
 
-        return [
-            {
-                "user_id": u["id"],
-                "email": u["email"],
-                "role": u["role"],
-                "name": u["name"]
-            }
-            for u in (res.data or [])
-        ]
+        users = []
+        for u in rows:
+            item = {"user_id": u["id"]}
+            item.update({k: u.get(k) for k in ("email", "role", "name") if k in u})
+            users.append(item)
+
+        return conditional_response(request, response, users, next_page)
 
+    except HTTPException:
+        raise
     except Exception:
         return []
 
@@ -5,8 +5,9 @@ from security.auth_utils import get_current_user_from_token
 from pydantic import BaseModel
 from typing import Optional
 from fastapi import WebSocket, WebSocketDisconnect
-import json
-from services.ws_utils import stream_response
+from services.ws_session import ChatSession
+from services.ws_protocol import ChatConnection
+from services.sse_utils import sse_response
 router = APIRouter(prefix="/chat", tags=["Work Chat"])
 
 class WorkChatRequest(BaseModel):
@@ -24,12 +25,25 @@ async def work_chat(
 ):
     return await handle_work_chat(data, current_user)
 
+
+@router.post("/work/stream")
+async def work_chat_stream(
+    data: WorkChatRequest,
+    request: Request,
+    current_user=Depends(get_current_user)
+):
+    # Same generator the websocket uses, delivered as Server-Sent Events
+    stream = await handle_work_chat(data, current_user, stream=True)
+    return sse_response(request, stream)
+
 @router.websocket("/work/ws/{project_id}")
 async def work_chat_ws(
     websocket: WebSocket,
     project_id: str
 ):
     await websocket.accept()
+    ws_session = None
+    connection = None
 
     try:
         # 🔐 Extract token from query params
@@ -44,10 +58,9 @@ async def work_chat_ws(
             await websocket.close(code=1008)    
             return
 
-        current_user = {
-            "email": user_email,
-            "name": "User"
-        }
+        # Identity, role, permissions and model are resolved once per connection
+        ws_session = await ChatSession.open(user_email, "User")
+        current_user = ws_session.current_user
 
         print("🔎 WEBSOCKET CURRENT USER:", current_user)
 
@@ -67,30 +80,13 @@ async def work_chat_ws(
         # print("🔎 WEBSOCKET CURRENT USER:", current_user)
 # JONCY END
         
-        while True:
-            # Receive message from frontend
-            raw_data = await websocket.receive_text()
-            data_dict = json.loads(raw_data)
-
+        def build_request(frame: dict):
             # Inject project_id from URL
-            data_dict["project_id"] = project_id
-
-            # Convert to Pydantic model
-            data = WorkChatRequest(**data_dict)
+            return WorkChatRequest(**{**frame, "project_id": project_id})
 
-            stream = await handle_work_chat(
-                data,
-                current_user,
-                stream=True
-            )
-
-            await stream_response(websocket, stream)
-
-    
-            # Signal completion
-            await websocket.send_json({
-                "type": "done"
-            })
+        # One socket can run several generations, each tagged with its request_id
+        connection = ChatConnection(websocket, handle_work_chat, build_request, ws_session, label="Work")
+        await connection.serve()
 
     except WebSocketDisconnect:
         print("🔌 WebSocket disconnected")
@@ -106,4 +102,10 @@ async def work_chat_ws(
         except:
             pass
 
-        await websocket.close()
\ No newline at end of file
+        await websocket.close()
+
+    finally:
+        if connection:
+            await connection.close()
+        if ws_session:
+            ws_session.close()
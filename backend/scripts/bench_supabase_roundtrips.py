@@ -0,0 +1,246 @@
+"""
+Supabase round-trip benchmark for one chat turn per service.
+
+    python scripts/bench_supabase_roundtrips.py --latency-ms 20
+    python scripts/bench_supabase_roundtrips.py --write-budgets      # record the current numbers
+    python scripts/bench_supabase_roundtrips.py --check              # CI: exit 1 on regression
+
+Runs handle_common_chat / handle_work_chat / handle_dual_chat in-process
+against scripts/fake_supabase.py (seeded tables, simulated per-call latency)
+and scripts/mock_openrouter.py (zero latency), so the only cost measured is
+our own code plus Supabase round trips. Each service is run for a cold turn
+(first message, empty caches) and a warm turn (same user, same project).
+
+Per turn it reports the number of Supabase calls, broken down by table, and
+the wall time. With --check, the numbers are compared to the budgets file
+(scripts/supabase_budgets.json by default): more calls than budgeted, or
+wall time above budget * (1 + --wall-slack), fails the run.
+"""
+import os
+import sys
+import base64
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+import threading
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(SCRIPTS_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, SCRIPTS_DIR)
+
+from fake_supabase import FakeSupabase
+
+DEFAULT_BUDGETS = os.path.join(SCRIPTS_DIR, "supabase_budgets.json")
+
+USER_EMAIL = "bench@example.com"
+PROJECT_ID = str(uuid.UUID(int=1))
+
+MESSAGES = {
+    "common": "What can you help me with today?",
+    "work": "What is the status of my project?",
+    "dual": "Summarise the open tasks on my project"
+}
+
+
+def seed_tables() -> dict:
+    now = "2024-01-01T00:00:00+00:00"
+    return {
+        "user_perms": [{
+            "id": 1, "user_id": "user-1", "name": "Bench User", "email": USER_EMAIL,
+            "role": "Admin", "permission_roles": ["Admin"], "password": "x"
+        }],
+        "profiles": [{"id": "user-1", "email": USER_EMAIL, "full_name": "Bench User"}],
+        "user_profiles": [],
+        "user_llm_settings": [],
+        "projects": [{
+            "id": PROJECT_ID, "uuid": PROJECT_ID, "project_name": "Apollo",
+            "project_description": "Benchmark project", "status": "Active",
+            "assigned_to_emails": [USER_EMAIL], "created_at": now,
+            "start_date": "2024-01-01", "end_date": "2024-12-31"
+        }],
+        "user_memorys": [],
+        "chat_id_counters": [],
+        "episodic_memory": [],
+        "user_fact": [],
+        "task_assignments": [],
+        "announcements": []
+    }
+
+
+# ============================================================
+# ===================== MOCK OPENROUTER ======================
+# ============================================================
+
+def start_mock_openrouter(port: int):
+    import uvicorn
+    import mock_openrouter
+
+    mock_openrouter.CONFIG.update({"latency_ms": 0, "jitter_ms": 0, "tokens_per_second": 100000})
+    server = uvicorn.Server(uvicorn.Config(mock_openrouter.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started and time.time() < deadline:
+        time.sleep(0.05)
+    if not server.started:
+        raise RuntimeError("mock OpenRouter did not start")
+    return server
+
+
+# ============================================================
+# ======================== SCENARIOS =========================
+# ============================================================
+
+def _requests():
+    # Imported after FakeSupabase.install(): core creates its client at import time
+    from routers.chat_routes import CommonChatRequest
+    from routers.work_routes import WorkChatRequest
+    from routers.dual_routes import DualChatRequest
+    from services.chat_service import handle_common_chat
+    from services.work_service import handle_work_chat
+    from services.dual_service import handle_dual_chat
+
+    return {
+        "common": (handle_common_chat, CommonChatRequest),
+        "work": (handle_work_chat, WorkChatRequest),
+        "dual": (handle_dual_chat, DualChatRequest)
+    }
+
+
+async def run_turn(fake: FakeSupabase, handler, request_cls, service: str, chat_id):
+    data = request_cls(query=MESSAGES[service], project_id=PROJECT_ID, chat_id=chat_id)
+    current_user = {"email": USER_EMAIL, "name": "Bench User", "role": "Admin"}
+
+    fake.reset_counters()
+    started = time.perf_counter()
+    reply = await handler(data, current_user)
+    wall_ms = (time.perf_counter() - started) * 1000
+    snapshot = fake.snapshot()
+
+    return {
+        "calls": snapshot["calls"],
+        "wall_ms": round(wall_ms, 1),
+        "by_table": snapshot["by_table"],
+        "by_op": snapshot["by_op"]
+    }, reply.get("chat_id") if isinstance(reply, dict) else None
+
+
+async def run_all(fake: FakeSupabase, services: list) -> dict:
+    handlers = _requests()
+    results = {}
+    for service in services:
+        handler, request_cls = handlers[service]
+        cold, chat_id = await run_turn(fake, handler, request_cls, service, None)
+        warm, _ = await run_turn(fake, handler, request_cls, service, chat_id)
+        results[service] = {"cold": cold, "warm": warm}
+    return results
+
+
+# ============================================================
+# ========================= BUDGETS ==========================
+# ============================================================
+
+def check_budgets(results: dict, budgets: dict, wall_slack: float) -> list:
+    failures = []
+    for service, turns in results.items():
+        for turn, measured in turns.items():
+            budget = (budgets.get(service) or {}).get(turn)
+            if not budget:
+                continue
+            if measured["calls"] > budget["calls"]:
+                failures.append(
+                    f"{service}/{turn}: {measured['calls']} Supabase calls, budget {budget['calls']} "
+                    f"(by table: {measured['by_table']})"
+                )
+            wall_limit = budget["wall_ms"] * (1 + wall_slack)
+            if measured["wall_ms"] > wall_limit:
+                failures.append(
+                    f"{service}/{turn}: {measured['wall_ms']} ms, budget {budget['wall_ms']} ms "
+                    f"(+{int(wall_slack * 100)}%)"
+                )
+    return failures
+
+
+def to_budgets(results: dict) -> dict:
+    return {
+        service: {
+            turn: {"calls": measured["calls"], "wall_ms": round(measured["wall_ms"] + 1)}
+            for turn, measured in turns.items()
+        }
+        for service, turns in results.items()
+    }
+
+
+def print_results(results: dict):
+    print(f"{'service':8}  {'turn':5}  {'calls':>5}  {'wall_ms':>8}  by table")
+    for service, turns in results.items():
+        for turn, measured in turns.items():
+            tables = ", ".join(f"{t}={n}" for t, n in sorted(measured["by_table"].items()))
+            print(f"{service:8}  {turn:5}  {measured['calls']:>5}  {measured['wall_ms']:>8}  {tables}")
+
+
+def main(args) -> int:
+    fake = FakeSupabase(seed_tables(), latency_ms=args.latency_ms)
+    fake.install()
+
+    server = start_mock_openrouter(args.mock_port)
+    # Set before core is imported; load_dotenv() does not override these
+    os.environ["OPENROUTER_BASE_URL"] = f"http://127.0.0.1:{args.mock_port}/api/v1"
+    os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+    os.environ.setdefault("SUPABASE_URL", "http://fake-supabase.local")
+    os.environ.setdefault("SUPABASE_KEY", "bench")
+    os.environ.setdefault("MASTER_CHAT_KEY", base64.b64encode(b"b" * 32).decode())
+
+    # core opens ./chroma_db and the services write logs relative to the
+    # working directory: run from a scratch directory so the tree is untouched
+    args.budgets = os.path.abspath(args.budgets)
+    args.json = os.path.abspath(args.json) if args.json else None
+    os.chdir(tempfile.mkdtemp(prefix="bench-supabase-"))
+
+    try:
+        results = asyncio.run(run_all(fake, [s.strip() for s in args.services.split(",")]))
+    finally:
+        server.should_exit = True
+
+    print()
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📄 Results written to {args.json}")
+
+    if args.write_budgets:
+        with open(args.budgets, "w") as f:
+            json.dump(to_budgets(results), f, indent=2)
+        print(f"\n📄 Budgets written to {args.budgets}")
+        return 0
+
+    if args.check:
+        if not os.path.exists(args.budgets):
+            print(f"❌ No budgets file at {args.budgets} (run with --write-budgets first)")
+            return 1
+        with open(args.budgets) as f:
+            failures = check_budgets(results, json.load(f), args.wall_slack)
+        for failure in failures:
+            print("❌", failure)
+        if failures:
+            return 1
+        print("\n✅ Within Supabase round-trip budgets")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count Supabase round trips per chat turn")
+    parser.add_argument("--services", default="common,work,dual")
+    parser.add_argument("--latency-ms", type=float, default=20, help="simulated latency per Supabase call")
+    parser.add_argument("--mock-port", type=int, default=8899)
+    parser.add_argument("--budgets", default=DEFAULT_BUDGETS)
+    parser.add_argument("--check", action="store_true", help="fail when a budget is exceeded")
+    parser.add_argument("--write-budgets", action="store_true", help="record the measured numbers as budgets")
+    parser.add_argument("--wall-slack", type=float, default=0.5, help="allowed wall-time overshoot, 0.5 = +50%%")
+    parser.add_argument("--json", help="also write the results to this file")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,446 @@
+"""
+In-process fake of the supabase-py client, backed by in-memory tables.
+
+Covers the PostgREST query-builder surface this project uses:
+    table().select(cols, count="exact") / insert / upsert(on_conflict=, ignore_duplicates=) / update / delete
+    eq neq gt gte lt lte like ilike is_ in_ contains overlaps match filter not_
+    or_("a.eq.x,and(b.gt.1,c.ilike.%y%)")   order  limit  range  single  maybe_single
+    execute()  ->  .data / .count
+
+Every execute() is one simulated round trip: it sleeps `latency_ms` and is
+counted (total, per table, per operation), so benchmarks can assert how many
+Supabase calls a code path makes.
+
+    fake = FakeSupabase({"user_perms": [{"id": 1, "email": "a@b.c", "role": "Admin"}]}, latency_ms=20)
+    fake.install()          # before `import core`: supabase.create_client() returns the fake
+"""
+import re
+import copy
+import operator
+import time
+import uuid
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+
+class FakeResponse:
+
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+    def __repr__(self):
+        return f"FakeResponse(data={self.data!r}, count={self.count!r})"
+
+
+# ============================================================
+# ================== VALUE / FILTER HELPERS ==================
+# ============================================================
+
+def _coerce(raw, sample):
+    """Convert a PostgREST string value to the type of the stored value."""
+    if not isinstance(raw, str):
+        return raw
+    value = raw[1:-1] if len(raw) >= 2 and raw[0] == raw[-1] == '"' else raw
+    if value == "null":
+        return None
+    if isinstance(sample, bool):
+        return value.lower() == "true"
+    if isinstance(sample, (int, float)):
+        for cast in ((int, float) if isinstance(sample, int) else (float,)):
+            try:
+                return cast(value)
+            except ValueError:
+                continue
+    return value
+
+
+def _like(pattern: str, value, case_insensitive: bool) -> bool:
+    if value is None:
+        return False
+    regex = "^" + "".join(
+        ".*" if ch in "%*" else "." if ch == "_" else re.escape(ch) for ch in str(pattern)
+    ) + "$"
+    return re.match(regex, str(value), re.I if case_insensitive else 0) is not None
+
+
+def _as_list(value):
+    if isinstance(value, str) and value.startswith("{") and value.endswith("}"):
+        return [v.strip().strip('"') for v in value[1:-1].split(",") if v.strip()]
+    if isinstance(value, str) and value.startswith("(") and value.endswith(")"):
+        return [v.strip().strip('"') for v in value[1:-1].split(",") if v.strip()]
+    return value if isinstance(value, (list, tuple, set)) else [value]
+
+
+_OPERATORS = {
+    "eq": operator.eq, "neq": operator.ne,
+    "gt": operator.gt, "gte": operator.ge,
+    "lt": operator.lt, "lte": operator.le
+}
+
+
+def _compare(op: str, actual, expected) -> bool:
+    if op in ("like", "ilike"):
+        return _like(expected, actual, op == "ilike")
+    if op == "is":
+        expected = None if expected in (None, "null") else expected
+        if isinstance(expected, str) and expected in ("true", "false"):
+            expected = expected == "true"
+        return actual is expected or actual == expected
+    if op == "in":
+        return any(actual == _coerce(v, actual) for v in _as_list(expected))
+    if op == "cs":
+        if isinstance(actual, dict):
+            return all(actual.get(k) == v for k, v in (expected or {}).items())
+        if isinstance(actual, str):
+            return all(str(v) in actual for v in _as_list(expected))
+        return all(v in (actual or []) for v in _as_list(expected))
+    if op == "ov":
+        return bool(set(actual or []) & set(_as_list(expected)))
+
+    if op not in _OPERATORS:
+        raise ValueError(f"Unsupported filter operator: {op}")
+    expected = _coerce(expected, actual)
+    if op in ("eq", "neq"):
+        return _OPERATORS[op](actual, expected)
+    if actual is None or expected is None:
+        return False
+    try:
+        return _OPERATORS[op](actual, expected)
+    except TypeError:
+        return _OPERATORS[op](str(actual), str(expected))
+
+
+def _split_top_level(text: str) -> list:
+    parts, depth, quoted, current = [], 0, False, ""
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += ch
+    if current:
+        parts.append(current)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _parse_logic(text: str):
+    """PostgREST or/and filter string -> predicate(row)."""
+    predicates = []
+    for part in _split_top_level(text):
+        for group in ("and", "or"):
+            if part.startswith(group + "(") and part.endswith(")"):
+                predicates.append(_parse_logic_group(group, part[len(group) + 1:-1]))
+                break
+        else:
+            column, rest = part.split(".", 1)
+            negate = rest.startswith("not.")
+            if negate:
+                rest = rest[4:]
+            op, value = rest.split(".", 1)
+            predicates.append(_make_predicate(column, op, value, negate))
+    return predicates
+
+
+def _parse_logic_group(group: str, inner: str):
+    predicates = _parse_logic(inner)
+    if group == "and":
+        return lambda row: all(p(row) for p in predicates)
+    return lambda row: any(p(row) for p in predicates)
+
+
+def _make_predicate(column: str, op: str, value, negate: bool = False):
+    def predicate(row):
+        result = _compare(op, row.get(column), value)
+        return not result if negate else result
+    return predicate
+
+
+# ============================================================
+# ======================= QUERY BUILDER ======================
+# ============================================================
+
+class _NotProxy:
+    """query.not_.is_(...) / query.not_.eq(...): negates the next filter."""
+
+    def __init__(self, query):
+        self._query = query
+
+    def __getattr__(self, name):
+        method = getattr(self._query, name)
+
+        def negated(*args, **kwargs):
+            self._query._negate_next = True
+            return method(*args, **kwargs)
+        return negated
+
+
+class FakeQuery:
+
+    def __init__(self, client, table: str):
+        self.client = client
+        self.table = table
+        self._op = "select"
+        self._columns = "*"
+        self._count = None
+        self._payload = None
+        self._on_conflict = None
+        self._ignore_duplicates = False
+        self._filters = []
+        self._orders = []
+        self._limit = None
+        self._offset = 0
+        self._single = None
+        self._negate_next = False
+
+    # ---------------- operations ----------------
+
+    def select(self, columns: str = "*", count: str | None = None, **_):
+        # select() after insert/update keeps the write (returning rows)
+        if self._op == "select":
+            self._columns = columns
+        self._count = count
+        return self
+
+    def insert(self, rows, **_):
+        self._op, self._payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: str = "id", ignore_duplicates: bool = False, **_):
+        self._op, self._payload, self._on_conflict = "upsert", rows, on_conflict
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, values: dict, **_):
+        self._op, self._payload = "update", values
+        return self
+
+    def delete(self, **_):
+        self._op = "delete"
+        return self
+
+    # ---------------- filters ----------------
+
+    def _add(self, column: str, op: str, value):
+        negate, self._negate_next = self._negate_next, False
+        self._filters.append(_make_predicate(column, op, value, negate))
+        return self
+
+    @property
+    def not_(self):
+        return _NotProxy(self)
+
+    def eq(self, column, value):
+        return self._add(column, "eq", value)
+
+    def neq(self, column, value):
+        return self._add(column, "neq", value)
+
+    def gt(self, column, value):
+        return self._add(column, "gt", value)
+
+    def gte(self, column, value):
+        return self._add(column, "gte", value)
+
+    def lt(self, column, value):
+        return self._add(column, "lt", value)
+
+    def lte(self, column, value):
+        return self._add(column, "lte", value)
+
+    def like(self, column, pattern):
+        return self._add(column, "like", pattern)
+
+    def ilike(self, column, pattern):
+        return self._add(column, "ilike", pattern)
+
+    def is_(self, column, value):
+        return self._add(column, "is", value)
+
+    def in_(self, column, values):
+        return self._add(column, "in", list(values))
+
+    def contains(self, column, value):
+        return self._add(column, "cs", value)
+
+    def overlaps(self, column, value):
+        return self._add(column, "ov", value)
+
+    def match(self, query: dict):
+        for column, value in query.items():
+            self._add(column, "eq", value)
+        return self
+
+    def filter(self, column, operator, value):
+        negate = operator.startswith("not.")
+        op = operator[4:] if negate else operator
+        self._negate_next = self._negate_next or negate
+        return self._add(column, op, value)
+
+    def or_(self, filters: str, **_):
+        predicates = _parse_logic(filters)
+        negate, self._negate_next = self._negate_next, False
+        self._filters.append(
+            (lambda row: not any(p(row) for p in predicates)) if negate
+            else (lambda row: any(p(row) for p in predicates))
+        )
+        return self
+
+    # ---------------- modifiers ----------------
+
+    def order(self, column, desc: bool = False, **_):
+        self._orders.append((column, desc))
+        return self
+
+    def limit(self, count: int, **_):
+        self._limit = count
+        return self
+
+    def range(self, start: int, end: int, **_):
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def single(self):
+        self._single = "single"
+        return self
+
+    def maybe_single(self):
+        self._single = "maybe"
+        return self
+
+    # ---------------- execution ----------------
+
+    def _matches(self, row: dict) -> bool:
+        return all(predicate(row) for predicate in self._filters)
+
+    def _project(self, row: dict) -> dict:
+        columns = [c.strip() for c in self._columns.split(",") if c.strip() and "(" not in c]
+        if not columns or "*" in columns:
+            return copy.deepcopy(row)
+        return {c: copy.deepcopy(row.get(c)) for c in columns}
+
+    def execute(self):
+        self.client._round_trip(self.table, self._op)
+        with self.client._lock:
+            data, count = self._run(self.client._tables.setdefault(self.table, []))
+
+        if self._single == "single":
+            if len(data) != 1:
+                raise Exception(f"JSON object requested, multiple (or no) rows returned ({len(data)})")
+            data = data[0]
+        elif self._single == "maybe":
+            data = data[0] if data else None
+        return FakeResponse(data, count)
+
+    def _run(self, rows: list):
+        if self._op == "insert":
+            new_rows = [self.client._with_defaults(r) for r in _rows(self._payload)]
+            rows.extend(new_rows)
+            return copy.deepcopy(new_rows), None
+
+        if self._op == "upsert":
+            keys = [k.strip() for k in (self._on_conflict or "id").split(",")]
+            result = []
+            for incoming in _rows(self._payload):
+                existing = next(
+                    (r for r in rows if all(k in incoming and r.get(k) == incoming[k] for k in keys)),
+                    None
+                )
+                if existing is not None:
+                    # ON CONFLICT DO NOTHING: the row is kept and not returned
+                    if self._ignore_duplicates:
+                        continue
+                    existing.update(copy.deepcopy(incoming))
+                    result.append(existing)
+                else:
+                    row = self.client._with_defaults(incoming)
+                    rows.append(row)
+                    result.append(row)
+            return copy.deepcopy(result), None
+
+        matched = [r for r in rows if self._matches(r)]
+
+        if self._op == "update":
+            for row in matched:
+                row.update(copy.deepcopy(self._payload))
+            return copy.deepcopy(matched), None
+
+        if self._op == "delete":
+            self.client._tables[self.table] = [r for r in rows if not self._matches(r)]
+            return copy.deepcopy(matched), None
+
+        total = len(matched) if self._count else None
+        for column, desc in reversed(self._orders):
+            matched.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+        end = self._offset + self._limit if self._limit is not None else None
+        page = matched[self._offset:end]
+        return [self._project(r) for r in page], total
+
+
+def _rows(payload) -> list:
+    return payload if isinstance(payload, list) else [payload]
+
+
+# ============================================================
+# ========================== CLIENT ==========================
+# ============================================================
+
+class FakeSupabase:
+
+    def __init__(self, tables: dict | None = None, latency_ms: float = 0):
+        self.latency_ms = latency_ms
+        self._tables = copy.deepcopy(tables or {})
+        self._lock = threading.Lock()
+        self.reset_counters()
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    # supabase-py also exposes .from_()
+    from_ = table
+
+    def _round_trip(self, table: str, op: str):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        with self._lock:
+            self.calls += 1
+            self.calls_by_table[table] += 1
+            self.calls_by_op[op] += 1
+            self.log.append((table, op))
+
+    def _with_defaults(self, row: dict) -> dict:
+        row = copy.deepcopy(row)
+        if "id" not in row:
+            row["id"] = str(uuid.uuid4())
+        row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        return row
+
+    def reset_counters(self):
+        self.calls = 0
+        self.calls_by_table = Counter()
+        self.calls_by_op = Counter()
+        self.log = []
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": self.calls,
+            "by_table": dict(self.calls_by_table),
+            "by_op": dict(self.calls_by_op)
+        }
+
+    def rows(self, table: str) -> list:
+        return copy.deepcopy(self._tables.get(table, []))
+
+    def install(self):
+        """Make supabase.create_client() return this fake (call before importing core)."""
+        import supabase as supabase_module
+
+        supabase_module.create_client = lambda *args, **kwargs: self
+        return self
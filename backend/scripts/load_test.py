@@ -0,0 +1,251 @@
+"""
+End-to-end load test for the chat endpoints.
+
+    python scripts/load_test.py --modes common,work,dual --transports http,sse,ws \
+        --concurrency 20 --requests 200 --project-id <uuid>
+
+Transports per mode:
+    http   POST /chat/<mode>           (time to first token == total latency)
+    sse    POST /chat/<mode>/stream    (first `event: token`)
+    ws     /chat/<mode>/ws/<project>   (first token frame; one socket per worker;
+                                        dual: /chat/dual/ws)
+
+Reports p50 / p95 / p99 time-to-first-token and total latency, plus
+throughput, per mode and transport. Run the API against
+scripts/mock_openrouter.py (OPENROUTER_BASE_URL) to benchmark without
+calling the real LLM. Needs httpx and websockets (requirements-dev.txt).
+"""
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import httpx
+import websockets
+
+
+def percentile(samples: list, pct: float):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Result:
+
+    def __init__(self, mode: str, transport: str):
+        self.mode = mode
+        self.transport = transport
+        self.ttft = []
+        self.total = []
+        self.errors = 0
+        self.error_samples = []
+        self.started = None
+        self.finished = None
+
+    def ok(self, ttft: float, total: float):
+        self.ttft.append(ttft * 1000)
+        self.total.append(total * 1000)
+
+    def fail(self, reason: str):
+        self.errors += 1
+        if len(self.error_samples) < 3:
+            self.error_samples.append(reason[:200])
+
+    def summary(self) -> dict:
+        elapsed = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        done = len(self.total)
+        fmt = lambda v: round(v, 1) if v is not None else None
+        return {
+            "mode": self.mode,
+            "transport": self.transport,
+            "ok": done,
+            "errors": self.errors,
+            "ttft_p50_ms": fmt(percentile(self.ttft, 50)),
+            "ttft_p95_ms": fmt(percentile(self.ttft, 95)),
+            "ttft_p99_ms": fmt(percentile(self.ttft, 99)),
+            "total_p50_ms": fmt(percentile(self.total, 50)),
+            "total_p95_ms": fmt(percentile(self.total, 95)),
+            "total_p99_ms": fmt(percentile(self.total, 99)),
+            "throughput_rps": round(done / elapsed, 2) if elapsed > 0 else None,
+            "error_samples": self.error_samples
+        }
+
+
+# ============================================================
+# ======================== TRANSPORTS ========================
+# ============================================================
+
+def _payload(args) -> dict:
+    return {"query": args.message, "project_id": args.project_id}
+
+
+def _headers(args) -> dict:
+    return {"Authorization": f"Bearer {args.token}", "user_email": args.email}
+
+
+async def run_http(client: httpx.AsyncClient, args, mode: str, result: Result):
+    started = time.perf_counter()
+    try:
+        response = await client.post(f"/chat/{mode}", json=_payload(args), headers=_headers(args))
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            result.fail(f"HTTP {response.status_code}: {response.text}")
+            return
+        result.ok(elapsed, elapsed)
+    except Exception as e:
+        result.fail(f"{type(e).__name__}: {e}")
+
+
+async def run_sse(client: httpx.AsyncClient, args, mode: str, result: Result):
+    started = time.perf_counter()
+    first_token = None
+    try:
+        async with client.stream("POST", f"/chat/{mode}/stream", json=_payload(args), headers=_headers(args)) as response:
+            if response.status_code != 200:
+                result.fail(f"HTTP {response.status_code}: {(await response.aread()).decode(errors='replace')}")
+                return
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    if event == "token" and first_token is None:
+                        first_token = time.perf_counter() - started
+                    elif event == "error":
+                        result.fail(line[5:].strip())
+                        return
+                    elif event == "done":
+                        break
+        total = time.perf_counter() - started
+        result.ok(first_token if first_token is not None else total, total)
+    except Exception as e:
+        result.fail(f"{type(e).__name__}: {e}")
+
+
+def ws_path(mode: str, project_id: str) -> str:
+    # The dual socket has no project in its path; it comes with each frame
+    if mode == "dual":
+        return "/chat/dual/ws"
+    return f"/chat/{mode}/ws/{project_id}"
+
+
+async def run_ws(socket, args, result: Result):
+    request_id = uuid.uuid4().hex[:8]
+    started = time.perf_counter()
+    first_token = None
+    try:
+        await socket.send(json.dumps({"request_id": request_id, **_payload(args)}))
+        while True:
+            frame = json.loads(await asyncio.wait_for(socket.recv(), timeout=args.timeout))
+            if frame.get("request_id") not in (None, request_id):
+                continue
+            frame_type = frame.get("type")
+            if frame_type == "token" and first_token is None:
+                first_token = time.perf_counter() - started
+            elif frame_type in ("error", "cancelled"):
+                result.fail(json.dumps(frame))
+                return
+            elif frame_type == "done":
+                break
+        total = time.perf_counter() - started
+        result.ok(first_token if first_token is not None else total, total)
+    except Exception as e:
+        result.fail(f"{type(e).__name__}: {e}")
+        raise
+
+
+# ============================================================
+# ========================= RUNNER ===========================
+# ============================================================
+
+async def run_scenario(args, mode: str, transport: str) -> Result:
+    result = Result(mode, transport)
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(i)
+
+    async def http_worker(client):
+        while not queue.empty():
+            queue.get_nowait()
+            if transport == "http":
+                await run_http(client, args, mode, result)
+            else:
+                await run_sse(client, args, mode, result)
+
+    async def ws_worker():
+        ws_base = args.base_url.replace("http://", "ws://").replace("https://", "wss://")
+        url = f"{ws_base}{ws_path(mode, args.project_id)}?token={args.token}&user_email={args.email}"
+        socket = None
+        while not queue.empty():
+            queue.get_nowait()
+            try:
+                if socket is None:
+                    socket = await websockets.connect(url, max_size=None)
+                await run_ws(socket, args, result)
+            except Exception:
+                # Reconnect on the next request
+                if socket is not None:
+                    await socket.close()
+                socket = None
+        if socket is not None:
+            await socket.close()
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        result.started = time.perf_counter()
+        if transport == "ws":
+            await asyncio.gather(*(ws_worker() for _ in range(args.concurrency)))
+        else:
+            await asyncio.gather(*(http_worker(client) for _ in range(args.concurrency)))
+        result.finished = time.perf_counter()
+
+    return result
+
+
+def print_table(rows: list):
+    columns = [
+        "mode", "transport", "ok", "errors",
+        "ttft_p50_ms", "ttft_p95_ms", "ttft_p99_ms",
+        "total_p50_ms", "total_p95_ms", "total_p99_ms", "throughput_rps"
+    ]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(widths[c]) for c in columns))
+    for row in rows:
+        for sample in row["error_samples"]:
+            print(f"⚠ {row['mode']}/{row['transport']}: {sample}")
+
+
+async def main(args):
+    rows = []
+    for mode in args.modes.split(","):
+        for transport in args.transports.split(","):
+            print(f"▶ {mode}/{transport}: {args.requests} requests at concurrency {args.concurrency}")
+            result = await run_scenario(args, mode.strip(), transport.strip())
+            rows.append(result.summary())
+
+    print()
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\n📄 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the chat endpoints")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--token", default="webugmate123", help="bearer token (dev bypass token by default)")
+    parser.add_argument("--email", default="loadtest@example.com")
+    parser.add_argument("--project-id", default="default")
+    parser.add_argument("--message", default="What is the status of my project?")
+    parser.add_argument("--modes", default="common,work,dual")
+    parser.add_argument("--transports", default="http,sse,ws")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=50, help="per mode and transport")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--json", help="also write the results to this file")
+    asyncio.run(main(parser.parse_args()))
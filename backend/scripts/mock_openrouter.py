@@ -0,0 +1,213 @@
+"""
+Local stand-in for the OpenRouter chat-completions API, for benchmarks and
+load tests that must not pay for (or depend on) the real service.
+
+    python scripts/mock_openrouter.py --port 8800 --latency-ms 300 --tokens-per-second 60
+    OPENROUTER_BASE_URL=http://127.0.0.1:8800/api/v1 uvicorn main:app
+
+Speaks POST /api/v1/chat/completions (plain JSON and `stream: true` SSE) and
+GET /api/v1/models. Replies are canned but shaped like what the callers
+parse: an intent name for intent classification, JSON arrays/objects when
+the prompt asks for JSON, "Answer: ... You Might Also Ask: ..." otherwise.
+GET /stats returns request / error counters.
+"""
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# ============================================================
+# ======================== CONFIG ============================
+# ============================================================
+
+CONFIG = {
+    "latency_ms": float(os.getenv("MOCK_LATENCY_MS", "300")),          # time to first token
+    "jitter_ms": float(os.getenv("MOCK_JITTER_MS", "100")),
+    "tokens_per_second": float(os.getenv("MOCK_TOKENS_PER_SECOND", "60")),
+    "reply_tokens": int(os.getenv("MOCK_REPLY_TOKENS", "120")),
+    "error_rate": float(os.getenv("MOCK_ERROR_RATE", "0")),            # 0..1
+    "error_status": int(os.getenv("MOCK_ERROR_STATUS", "503")),
+    "hang_rate": float(os.getenv("MOCK_HANG_RATE", "0")),              # 0..1, never answers
+}
+
+STATS = {"requests": 0, "streamed": 0, "errors_injected": 0, "hangs_injected": 0, "completion_tokens": 0}
+
+WORDS = (
+    "the project timeline is on track and the team has completed most of the planned "
+    "tasks for this sprint while a few items still need review before release"
+).split()
+
+app = FastAPI(title="Mock OpenRouter")
+
+
+# ============================================================
+# ======================== REPLIES ===========================
+# ============================================================
+
+def _prompt_text(messages: list) -> str:
+    return "\n".join(str(m.get("content", "")) for m in messages or [])
+
+
+def _canned_reply(messages: list, max_tokens: int) -> str:
+    prompt = _prompt_text(messages)
+    lowered = prompt.lower()
+
+    if "intent classification" in lowered:
+        return "general"
+    if "json array of strings" in lowered or "valid json array" in lowered:
+        return json.dumps(["What are the next milestones?", "Who is working on this?", "What is the deadline?"])
+    if "json array of objects" in lowered or "strict json generator" in lowered:
+        return json.dumps([{"name": "Task A", "status": "In Progress"}, {"name": "Task B", "status": "Done"}])
+    if "reply only with json" in lowered:
+        return json.dumps({"is_vague": False, "questions": []})
+    if "summarize conversations" in lowered:
+        return "User asked about project status; assistant summarised progress."
+
+    count = max(5, min(CONFIG["reply_tokens"], max_tokens or CONFIG["reply_tokens"]))
+    body = " ".join(random.choice(WORDS) for _ in range(count))
+    return (
+        f"Answer:\n{body.capitalize()}.\n\n"
+        "You Might Also Ask:\n"
+        "- What are the open tasks?\n"
+        "- When is the next release?"
+    )
+
+
+def _tokens(text: str) -> list:
+    # Word-ish pieces with their whitespace, like provider deltas
+    pieces, current = [], ""
+    for ch in text:
+        current += ch
+        if ch in " \n":
+            pieces.append(current)
+            current = ""
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+async def _first_token_delay():
+    delay = CONFIG["latency_ms"] + random.uniform(-CONFIG["jitter_ms"], CONFIG["jitter_ms"])
+    await asyncio.sleep(max(0.0, delay) / 1000)
+
+
+def _usage(messages: list, reply: str) -> dict:
+    prompt_tokens = len(_prompt_text(messages)) // 4
+    completion_tokens = len(_tokens(reply))
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+
+
+# ============================================================
+# ======================== ROUTES ============================
+# ============================================================
+
+@app.post("/api/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages") or []
+    model = body.get("model") or "openai/gpt-4o-mini"
+    STATS["requests"] += 1
+
+    if random.random() < CONFIG["hang_rate"]:
+        STATS["hangs_injected"] += 1
+        await asyncio.sleep(3600)
+
+    if random.random() < CONFIG["error_rate"]:
+        STATS["errors_injected"] += 1
+        await _first_token_delay()
+        return JSONResponse(
+            status_code=CONFIG["error_status"],
+            content={"error": {"code": CONFIG["error_status"], "message": "Injected upstream error"}}
+        )
+
+    reply = _canned_reply(messages, body.get("max_tokens"))
+    completion_id = f"gen-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+
+    if not body.get("stream"):
+        await _first_token_delay()
+        # Non-streaming still pays the generation time
+        await asyncio.sleep(len(_tokens(reply)) / max(CONFIG["tokens_per_second"], 1))
+        STATS["completion_tokens"] += len(_tokens(reply))
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": _usage(messages, reply)
+        }
+
+    STATS["streamed"] += 1
+
+    async def events():
+        await _first_token_delay()
+        interval = 1 / max(CONFIG["tokens_per_second"], 1)
+        for piece in _tokens(reply):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            STATS["completion_tokens"] += 1
+            await asyncio.sleep(interval)
+
+        final = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "usage": _usage(messages, reply)
+        }
+        yield f"data: {json.dumps(final)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/api/v1/models")
+def list_models():
+    return {"data": [
+        {"id": "openai/gpt-4o-mini", "name": "GPT-4o mini (mock)"},
+        {"id": "meta-llama/llama-3.1-8b-instruct", "name": "Llama 3.1 8B (mock)"}
+    ]}
+
+
+@app.get("/stats")
+def stats():
+    return {"config": CONFIG, **STATS}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock OpenRouter chat-completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency-ms", type=float, default=CONFIG["latency_ms"], help="time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=CONFIG["jitter_ms"])
+    parser.add_argument("--tokens-per-second", type=float, default=CONFIG["tokens_per_second"])
+    parser.add_argument("--reply-tokens", type=int, default=CONFIG["reply_tokens"])
+    parser.add_argument("--error-rate", type=float, default=CONFIG["error_rate"], help="0..1")
+    parser.add_argument("--error-status", type=int, default=CONFIG["error_status"])
+    parser.add_argument("--hang-rate", type=float, default=CONFIG["hang_rate"], help="0..1")
+    args = parser.parse_args()
+
+    for key in CONFIG:
+        CONFIG[key] = getattr(args, key)
+
+    print(f"🧪 Mock OpenRouter on http://{args.host}:{args.port}/api/v1  {CONFIG}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
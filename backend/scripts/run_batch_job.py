@@ -0,0 +1,56 @@
+"""
+Run an offline LLM batch job from the command line (cron / maintenance).
+
+    python scripts/run_batch_job.py episodic_resummarize
+    python scripts/run_batch_job.py fact_reextract --emails a@example.com,b@example.com
+    python scripts/run_batch_job.py fact_reextract --resume <job_id>
+
+Same jobs as POST /api/llm/batch/{kind} (services/llm_batch.py). Progress is
+checkpointed under BATCH_CHECKPOINT_DIR, so an interrupted run continues
+where it stopped when started again with --resume and the printed job id.
+"""
+import os
+import sys
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import llm_batch
+
+
+def main(args) -> int:
+    emails = [e.strip() for e in args.emails.split(",") if e.strip()] if args.emails else None
+    try:
+        job = llm_batch.create_batch_job(args.kind, emails=emails, requested_by="cli", job_id=args.resume)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    job_id = job["job_id"]
+    print(f"▶ {args.kind} job {job_id}{' (resumed)' if args.resume else ''}")
+
+    worker = threading.Thread(target=llm_batch.run_batch_job, args=(job_id,), daemon=True)
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(timeout=args.progress_seconds)
+            status = llm_batch.get_batch_job(job_id)
+            print(f"  {status['stage']}: {status['done']}/{status['total']}")
+    except KeyboardInterrupt:
+        print("⏹ Cancelling: in-flight items finish, the rest run on --resume")
+        llm_batch.cancel_batch_job(job_id)
+        worker.join()
+
+    status = llm_batch.get_batch_job(job_id)
+    print(f"\n{status['status']}: {status['result']}")
+    print(f"Resume with: --resume {job_id}")
+    return 0 if status["status"] == "completed" else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run an offline LLM batch job")
+    parser.add_argument("kind", choices=sorted(llm_batch.JOB_KINDS))
+    parser.add_argument("--emails", help="comma-separated users (default: everyone)")
+    parser.add_argument("--resume", help="job id of an earlier run to continue")
+    parser.add_argument("--progress-seconds", type=float, default=10)
+    sys.exit(main(parser.parse_args()))
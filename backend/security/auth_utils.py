@@ -1,8 +1,14 @@
 import os
 import jwt
+import time
+import hashlib
 import datetime
+import threading
+from collections import OrderedDict
 from functools import wraps
 from pathlib import Path
+from utils.kv_store import build_store
+from utils.tiered_cache import get_bus
 
 # Load keys
 KEY_DIR = os.path.join(os.path.dirname(__file__), '..', 'config', 'keys')
@@ -53,22 +59,205 @@ def create_refresh_token(user_id):
     }
     return jwt.encode(payload, PRIVATE_KEY, algorithm=JWT_ALGORITHM)
 
-def verify_token(token):
-    """Verify a JWT token and return the payload if valid"""
+# Verified-token cache
+# RS256 verification is expensive; verified payloads are cached by token
+# digest until the token's own `exp`. Revoked tokens are denied until `exp`.
+#
+# Revocations must reach every worker, or a logged-out token would keep
+# passing on workers that still have it cached. revoke_token() writes the
+# digest to the shared store (KV_STORE_BACKEND / CACHE_BACKEND) until the
+# token expires and announces it on the cache invalidation bus; workers drop
+# their cached payload on the message and check the store on every cache
+# miss. With the default memory backend both are per-process, which is only
+# correct for a single worker.
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('TOKEN_CACHE_MAX_ENTRIES', '10000'))
+TOKEN_REVOCATION_NAMESPACE = 'revoked_tokens'
+
+_token_cache = OrderedDict()   # digest -> (payload, exp)
+_revoked_tokens = {}           # digest -> exp (local mirror of the shared store)
+_token_cache_lock = threading.Lock()
+_token_cache_stats = {
+    'hits': 0,
+    'misses': 0,
+    'revoked_rejections': 0,
+    'decode_count': 0,
+    'decode_seconds': 0.0,
+}
+
+_revocation_store = build_store(
+    TOKEN_REVOCATION_NAMESPACE,
+    backend=os.getenv('CACHE_BACKEND') or os.getenv('KV_STORE_BACKEND')
+)
+_revocation_bus = get_bus()
+
+
+def _token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _decode_token(token):
+    """Verify signature/claims with the public key (uncached)."""
+    started = time.perf_counter()
     try:
-        payload = jwt.decode(
+        return jwt.decode(
             token,
             PUBLIC_KEY,
             algorithms=[JWT_ALGORITHM],
             issuer=JWT_ISSUER,
             audience=JWT_AUDIENCE
         )
-        return payload
+    finally:
+        with _token_cache_lock:
+            _token_cache_stats['decode_count'] += 1
+            _token_cache_stats['decode_seconds'] += time.perf_counter() - started
+
+
+def _remember_revoked(digest: str, exp: float, now: float):
+    """Record a revocation locally (caller holds _token_cache_lock)."""
+    for d in [d for d, e in _revoked_tokens.items() if e <= now]:
+        _revoked_tokens.pop(d, None)
+    _revoked_tokens[digest] = exp
+    _token_cache.pop(digest, None)
+
+
+def _on_token_revoked(namespace: str, key: str | None):
+    """Invalidation bus handler: another worker revoked a token."""
+    if namespace != TOKEN_REVOCATION_NAMESPACE or not key:
+        return
+    digest, _, exp = key.partition(':')
+    try:
+        exp = float(exp)
+    except ValueError:
+        return
+    with _token_cache_lock:
+        _remember_revoked(digest, exp, time.time())
+
+
+_revocation_bus.subscribe(_on_token_revoked)
+
+
+def _shared_revocation(digest: str):
+    """exp of a revocation recorded by any worker, or None."""
+    try:
+        exp = _revocation_store.get(digest)
+    except Exception as e:
+        print('⚠ Token revocation store read failed:', e)
+        return None
+    return float(exp) if isinstance(exp, (int, float)) else None
+
+
+def verify_token(token):
+    """Verify a JWT token and return the payload if valid"""
+    if not token:
+        return {'error': 'Invalid token: empty token'}
+
+    digest = _token_digest(token)
+    now = time.time()
+    _revocation_bus.poll()
+
+    with _token_cache_lock:
+        revoked_exp = _revoked_tokens.get(digest)
+        if revoked_exp is not None:
+            if revoked_exp > now:
+                _token_cache_stats['revoked_rejections'] += 1
+                return {'error': 'Token revoked'}
+            _revoked_tokens.pop(digest, None)
+
+        cached = _token_cache.get(digest)
+        if cached:
+            payload, exp = cached
+            if exp > now:
+                _token_cache.move_to_end(digest)
+                _token_cache_stats['hits'] += 1
+                return dict(payload)
+            # Never trust a cached token past its expiry
+            _token_cache.pop(digest, None)
+
+        _token_cache_stats['misses'] += 1
+
+    revoked_exp = _shared_revocation(digest)
+    if revoked_exp is not None and revoked_exp > now:
+        with _token_cache_lock:
+            _remember_revoked(digest, revoked_exp, now)
+            _token_cache_stats['revoked_rejections'] += 1
+        return {'error': 'Token revoked'}
+
+    try:
+        payload = _decode_token(token)
     except jwt.ExpiredSignatureError:
         return {'error': 'Token expired'}
     except jwt.InvalidTokenError as e:
         return {'error': f'Invalid token: {str(e)}'}
 
+    exp = payload.get('exp')
+    if isinstance(exp, (int, float)) and exp > now:
+        with _token_cache_lock:
+            # Revoked while it was being decoded
+            if digest in _revoked_tokens:
+                _token_cache_stats['revoked_rejections'] += 1
+                return {'error': 'Token revoked'}
+            _token_cache[digest] = (dict(payload), float(exp))
+            _token_cache.move_to_end(digest)
+            while len(_token_cache) > TOKEN_CACHE_MAX_ENTRIES:
+                _token_cache.popitem(last=False)
+
+    return payload
+
+
+def revoke_token(token):
+    """
+    Revocation hook (logout / refresh): drop the token from the cache and
+    reject it until it expires, even though its signature stays valid.
+    """
+    if not token:
+        return
+
+    digest = _token_digest(token)
+
+    with _token_cache_lock:
+        cached = _token_cache.pop(digest, None)
+
+    exp = cached[1] if cached else None
+    if exp is None:
+        try:
+            claims = jwt.decode(token, options={'verify_signature': False})
+            exp = claims.get('exp')
+        except jwt.InvalidTokenError:
+            return
+
+    now = time.time()
+    if not isinstance(exp, (int, float)) or exp <= now:
+        return
+
+    exp = float(exp)
+    with _token_cache_lock:
+        _remember_revoked(digest, exp, now)
+
+    try:
+        _revocation_store.set(digest, exp, ttl=exp - now)
+    except Exception as e:
+        print('⚠ Token revocation store write failed:', e)
+    try:
+        _revocation_bus.publish(TOKEN_REVOCATION_NAMESPACE, f'{digest}:{exp}')
+    except Exception as e:
+        print('⚠ Token revocation publish failed:', e)
+
+
+def get_token_cache_stats() -> dict:
+    with _token_cache_lock:
+        stats = dict(_token_cache_stats)
+        stats['entries'] = len(_token_cache)
+        stats['revoked_entries'] = len(_revoked_tokens)
+    stats['revocation_backend'] = _revocation_store.stats().get('backend')
+
+    avg_decode = stats['decode_seconds'] / stats['decode_count'] if stats['decode_count'] else 0.0
+    lookups = stats['hits'] + stats['misses']
+    stats['avg_decode_ms'] = round(avg_decode * 1000, 3)
+    stats['cpu_seconds_saved'] = round(stats['hits'] * avg_decode, 3)
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+    stats['decode_seconds'] = round(stats['decode_seconds'], 3)
+    return stats
+
 
 # fastapi start
 from fastapi import Request, HTTPException
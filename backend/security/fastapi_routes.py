@@ -7,9 +7,13 @@ from .auth_utils import (
     create_access_token,
     create_refresh_token,
     get_current_user,
-    verify_token
+    verify_token,
+    revoke_token,
+    get_token_cache_stats
 )
+from .rbac_utils import invalidate_permissions
 from core import get_user_role
+from services import ws_session
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
@@ -108,8 +112,19 @@ def get_me(user=Depends(get_current_user)):
     "email": user.get("email")
 }
 
+def _bearer_token(request: Request) -> str | None:
+    auth = request.headers.get("authorization") or ""
+    if auth.lower().startswith("bearer "):
+        return auth[7:].strip() or None
+    return None
+
+
 @router.post("/logout")
-def logout(response: Response):
+def logout(request: Request, response: Response):
+    revoke_token(request.cookies.get("token"))
+    revoke_token(request.cookies.get("refresh_token"))
+    revoke_token(_bearer_token(request))
+
     response.delete_cookie("token")
     response.delete_cookie("refresh_token")
 
@@ -120,7 +135,7 @@ def logout(response: Response):
 
 
 @router.post("/refresh")
-def refresh(request: Request):
+def refresh(request: Request, response: Response):
 
     refresh_token = request.cookies.get("refresh_token")
 
@@ -135,10 +150,58 @@ def refresh(request: Request):
     if payload.get("type") != "refresh":
         raise HTTPException(status_code=401, detail="Invalid token type")
 
-    new_access_token = create_access_token(payload["sub"])
+    user = User.get_by_id(payload["sub"])
+
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+
+    new_access_token = create_access_token({
+        "id": user.id,
+        "email": user.email,
+        "role": get_user_role(user.email)
+    })
+
+    # The previous access token is superseded by the new one (identical
+    # claims within the same second produce the same token: keep it)
+    old_access_token = request.cookies.get("token")
+    if old_access_token != new_access_token:
+        revoke_token(old_access_token)
+
+    response.set_cookie(
+        key="token",
+        value=new_access_token,
+        httponly=True,
+        secure=False,
+        samesite="lax",
+        max_age=15 * 60
+    )
 
     return {
         "access_token": new_access_token,
         "token_type": "Bearer",
         "expires_in": 15 * 60
     }
+
+
+@router.get("/token-cache/stats")
+def token_cache_stats(user=Depends(get_current_user)):
+    return get_token_cache_stats()
+
+
+# -------- Permission cache invalidation --------
+# permission_roles is edited outside this API (directly in Supabase), so the
+# editor calls this after saving to drop the cached permission matrix.
+class InvalidatePermissionsRequest(BaseModel):
+    email: str | None = None
+
+
+@router.post("/permissions/invalidate")
+def invalidate_permission_cache(data: InvalidatePermissionsRequest, user=Depends(get_current_user)):
+    target = data.email or user.get("email")
+
+    if target != user.get("email") and user.get("role") != "Admin":
+        raise HTTPException(status_code=403, detail="Only admins can invalidate other users' permissions")
+
+    invalidate_permissions(target)
+    ws_session.mark_stale(target)
+    return {"message": "Permission cache cleared", "email": target}
@@ -1,6 +1,166 @@
+import os
+import time
+import threading
 from fastapi import Request, HTTPException, Depends
 from security.auth_utils import get_current_user
 from core import supabase
+from utils.tiered_cache import get_bus
+
+# Permission resolver
+# Each user's `permission_roles` map is compiled once into a set of
+# (page, action) grants and cached for PERMISSION_CACHE_TTL seconds.
+# If Supabase is unreachable, a stale entry is served for up to
+# PERMISSION_STALE_GRACE seconds; after that the check fails closed (503).
+# A `permission_roles` value that is not a JSON object is bad data, not an
+# outage: that user is denied (403) and the row is logged.
+# invalidate_permissions() is broadcast on the cache invalidation bus so
+# every worker drops its copy, not just the one that served the request.
+PERMISSION_BUS_NAMESPACE = "permissions"
+PERMISSION_CACHE_TTL = int(os.getenv("PERMISSION_CACHE_TTL_SECONDS", "60"))
+PERMISSION_STALE_GRACE = int(os.getenv("PERMISSION_STALE_GRACE_SECONDS", "600"))
+PERMISSION_CACHE_MAX_ENTRIES = int(os.getenv("PERMISSION_CACHE_MAX_ENTRIES", "5000"))
+
+_permission_cache = {}   # email -> (PermissionMatrix | None, fetched_at)
+_permission_lock = threading.Lock()
+
+
+class PermissionBackendError(Exception):
+    """Supabase could not be reached (and, from resolve_permissions, no usable cached permissions exist)."""
+
+
+class PermissionDataError(ValueError):
+    """A user's permission_roles is not a {page: {action: bool}} object."""
+
+
+class PermissionMatrix:
+    """Precompiled (page, action) lookup for one user's permission_roles."""
+
+    __slots__ = ("pages", "grants")
+
+    def __init__(self, permission_roles: dict | None):
+        if permission_roles is not None and not isinstance(permission_roles, dict):
+            raise PermissionDataError(f"permission_roles is {type(permission_roles).__name__}, expected an object")
+        pages = set()
+        grants = set()
+        for page, actions in (permission_roles or {}).items():
+            if not actions or not isinstance(actions, dict):
+                continue
+            pages.add(page)
+            for action, allowed in actions.items():
+                if allowed:
+                    grants.add((page, action))
+        self.pages = frozenset(pages)
+        self.grants = frozenset(grants)
+
+    def has_page(self, page: str) -> bool:
+        return page in self.pages
+
+    def allows(self, page: str, action: str) -> bool:
+        return (page, "All") in self.grants or (page, action) in self.grants
+
+
+def _fetch_permissions(emails: list[str]) -> dict:
+    """Load and compile permissions for many users in one query."""
+    if len(emails) == 1:
+        query = supabase.table("user_logins").select("email, permission_roles").eq("email", emails[0]).limit(1)
+    else:
+        query = supabase.table("user_logins").select("email, permission_roles").in_("email", emails)
+
+    try:
+        response = query.execute()
+    except Exception as e:
+        raise PermissionBackendError(str(e)) from e
+
+    found = {}
+    for row in response.data or []:
+        if "permission_roles" in row and row.get("email") not in found:
+            try:
+                found[row.get("email")] = PermissionMatrix(row.get("permission_roles"))
+            except PermissionDataError as e:
+                # Fail closed for this user only; cached like "no permissions"
+                print(f"⚠ Malformed permission_roles for {row.get('email')}: {e}")
+                found[row.get("email")] = None
+
+    # Users without a row are cached as "no permissions assigned" (None)
+    return {email: found.get(email) for email in emails}
+
+
+def _store(results: dict, now: float):
+    with _permission_lock:
+        if len(_permission_cache) + len(results) > PERMISSION_CACHE_MAX_ENTRIES:
+            _permission_cache.clear()
+        for email, matrix in results.items():
+            _permission_cache[email] = (matrix, now)
+
+
+def resolve_permissions_bulk(emails: list[str]) -> dict:
+    """
+    Return {email: PermissionMatrix | None} for many users, fetching only the
+    ones missing from (or expired in) the cache, in a single query.
+    """
+    _bus.poll()
+    now = time.time()
+    result = {}
+    stale = {}
+    to_fetch = []
+
+    with _permission_lock:
+        for email in dict.fromkeys(e for e in emails if e):
+            cached = _permission_cache.get(email)
+            if cached and now - cached[1] < PERMISSION_CACHE_TTL:
+                result[email] = cached[0]
+            else:
+                to_fetch.append(email)
+                if cached:
+                    stale[email] = cached
+
+    if not to_fetch:
+        return result
+
+    try:
+        fetched = _fetch_permissions(to_fetch)
+        _store(fetched, now)
+        result.update(fetched)
+    except PermissionBackendError as e:
+        print(f"⚠ Permission fetch failed, using cached permissions where possible: {e}")
+        for email in to_fetch:
+            cached = stale.get(email)
+            if not cached or now - cached[1] > PERMISSION_CACHE_TTL + PERMISSION_STALE_GRACE:
+                raise PermissionBackendError(str(e))
+            result[email] = cached[0]
+
+    return result
+
+
+def resolve_permissions(email: str):
+    return resolve_permissions_bulk([email]).get(email)
+
+
+def _drop_cached(email: str | None):
+    with _permission_lock:
+        if email:
+            _permission_cache.pop(email, None)
+        else:
+            _permission_cache.clear()
+
+
+def _on_invalidate(namespace: str, key: str | None):
+    if namespace == PERMISSION_BUS_NAMESPACE:
+        _drop_cached(key)
+
+
+_bus = get_bus()
+_bus.subscribe(_on_invalidate)
+
+
+def invalidate_permissions(email: str | None = None):
+    """Drop cached permissions for one user (or everyone) on every worker after a change."""
+    _drop_cached(email)
+    try:
+        _bus.publish(PERMISSION_BUS_NAMESPACE, email)
+    except Exception as e:
+        print("⚠ Permission invalidation publish failed:", e)
+
 
 def require_permission(page_name: str, required_action: str = 'View'):
     """
@@ -12,37 +172,34 @@ def require_permission(page_name: str, required_action: str = 'View'):
     ):
         email = current_user.get("email")
         role = current_user.get("role")
-        
+
         # 1. Admin bypass
         if role == "Admin":
             return current_user
-            
-        # 2. Fetch User Permissions from Database securely
+
+        # 2. Resolve user permissions (cached, compiled)
         try:
-            response = supabase.table("user_logins").select("permission_roles").eq("email", email).limit(1).execute()
-            
-            if not response.data or 'permission_roles' not in response.data[0]:
-                raise HTTPException(status_code=403, detail="Forbidden: No permissions assigned.")
-                
-            user_permissions = response.data[0]['permission_roles'] or {}
-            
-            # 3. Check requested page
-            page_perms = user_permissions.get(page_name, {})
-            if not page_perms:
-                raise HTTPException(status_code=403, detail=f"Forbidden: Access to {page_name} denied.")
-                
-            # 4. Check specific action or "All"
-            has_all_access = page_perms.get("All", False)
-            has_action_access = page_perms.get(required_action, False)
-            
-            if not (has_all_access or has_action_access):
-                raise HTTPException(
-                    status_code=403, 
-                    detail=f"Forbidden: You do not have {required_action} permission for {page_name}."
-                )
-                
-            return current_user
+            permissions = resolve_permissions(email)
+        except PermissionBackendError as e:
+            raise HTTPException(status_code=503, detail=f"Permission check failed: {str(e)}")
         except Exception as e:
-            raise HTTPException(status_code=403, detail=f"Permission check failed: {str(e)}")
-            
+            print(f"❌ Permission check error for {email}: {e}")
+            raise HTTPException(status_code=500, detail="Permission check failed")
+
+        if permissions is None:
+            raise HTTPException(status_code=403, detail="Forbidden: No permissions assigned.")
+
+        # 3. Check requested page
+        if not permissions.has_page(page_name):
+            raise HTTPException(status_code=403, detail=f"Forbidden: Access to {page_name} denied.")
+
+        # 4. Check specific action or "All"
+        if not permissions.allows(page_name, required_action):
+            raise HTTPException(
+                status_code=403,
+                detail=f"Forbidden: You do not have {required_action} permission for {page_name}."
+            )
+
+        return current_user
+
     return permission_checker
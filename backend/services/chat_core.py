@@ -4,7 +4,7 @@ from datetime import datetime, timezone
 from core import (
     supabase,
     get_response_metrics,
-    call_llm_with_model,
+    call_llm_for_task,
     get_user_role,
     query_supabase,
     save_chat_message
@@ -452,6 +452,35 @@ def get_user_fact(user_email, required_categories=None, min_confidence=0.7):
         traceback.print_exc()
         return {}
     
+def merge_user_facts(old_facts: dict, old_confidence: dict, facts: dict, confidence: dict = None):
+    """
+    Merge newly extracted facts into the stored ones.
+    Returns (merged_facts, merged_confidence, changed_keys); changed_keys is
+    empty when nothing new and valid was extracted.
+    """
+    old_facts = old_facts or {}
+    old_confidence = old_confidence or {}
+    cleaned_facts = {}
+    cleaned_confidence = {}
+
+    for k, v in (facts or {}).items():
+        value = str(v).strip()
+
+        if not value or value.lower() in ["null", "none", "unknown", "n/a"]:
+            continue
+
+        if old_facts.get(k) == value:
+            continue
+
+        cleaned_facts[k] = value
+        if confidence and k in confidence:
+            cleaned_confidence[k] = confidence[k]
+
+    merged_facts = {**old_facts, **cleaned_facts}
+    merged_confidence = {**old_confidence, **cleaned_confidence}
+    return merged_facts, merged_confidence, list(cleaned_facts.keys())
+
+
 def store_user_fact(user_email: str, facts: dict, confidence: dict = None):
     if not user_email or not isinstance(facts, dict) or not facts:
         return
@@ -466,29 +495,12 @@ def store_user_fact(user_email: str, facts: dict, confidence: dict = None):
         old_facts = existing.data[0]["facts"] if existing.data else {}
         old_confidence = existing.data[0].get("confidence_1", {}) if existing.data else {}
 
-        cleaned_facts = {}
-        cleaned_confidence = {}
-
-        for k, v in facts.items():
-            value = str(v).strip()
-
-            if not value or value.lower() in ["null", "none", "unknown", "n/a"]:
-                continue
-
-            if old_facts.get(k) == value:
-                continue
-
-            cleaned_facts[k] = value
-            if confidence and k in confidence:
-                cleaned_confidence[k] = confidence[k]
+        merged_facts, merged_confidence, changed = merge_user_facts(old_facts, old_confidence, facts, confidence)
 
-        if not cleaned_facts:
+        if not changed:
             print("⚠ No valid new facts to store.")
             return
 
-        merged_facts = {**old_facts, **cleaned_facts}
-        merged_confidence = {**old_confidence, **cleaned_confidence}
-
         supabase.table("user_fact").upsert({
             "user_id": user_email,
             "facts": merged_facts,
@@ -496,15 +508,12 @@ def store_user_fact(user_email: str, facts: dict, confidence: dict = None):
             "updated_at": datetime.now(timezone.utc).isoformat()
         }).execute()
 
-        print(f"✅ User facts stored for {user_email}: {list(cleaned_facts.keys())}")
+        print(f"✅ User facts stored for {user_email}: {changed}")
 
     except Exception as e:
         print(f"❌ [UserFacts] Upsert failed:", e)   
         
-def extract_and_store_user_fact(user_email: str, text: str):
-    if not user_email or not text:
-        return
-
+def fact_extraction_messages(text: str) -> list[dict]:
     prompt = f"""
             You are an intelligent user-profile extraction system.
 
@@ -534,12 +543,41 @@ def extract_and_store_user_fact(user_email: str, text: str):
             JSON:
             """
 
-    messages = [
+    return [
         {"role": "system", "content": "You extract user profile facts and return only JSON."},
         {"role": "user", "content": prompt}
     ]
 
-    response = call_llm_with_model(messages)
+
+def parse_fact_response(response) -> tuple[dict, dict]:
+    """(facts, confidence) from the extraction reply; empty dicts if it is not valid JSON."""
+    if not response or isinstance(response, dict):
+        print("❌ LLM Error:", response)
+        return {}, {}
+
+    try:
+        data = json.loads(response)
+    except Exception as e:
+        print("❌ JSON parse failed:", e)
+        print("LLM raw response:", response)
+        return {}, {}
+
+    if not isinstance(data, dict):
+        return {}, {}
+    return data.get("facts", {}) or {}, data.get("confidence", {}) or {}
+
+
+def extract_and_store_user_fact(user_email: str, text: str):
+    if not user_email or not text:
+        return
+
+    response = call_llm_for_task(
+        "facts",
+        fact_extraction_messages(text),
+        user_email=user_email,
+        temperature=0.5,
+        max_tokens=350
+    )
     # print("📦 FACT LLM RAW RESPONSE:", response)
     # if not response:
     #     print("⚠ Empty LLM response")
@@ -560,19 +598,7 @@ def extract_and_store_user_fact(user_email: str, text: str):
     #     print("RAW JSON BLOCK:", json_block)
     #     return
 
-    if isinstance(response, dict):
-        print("❌ LLM Error:", response)
-        return
-
-    try:
-        data = json.loads(response)
-    except Exception as e:
-        print("❌ JSON parse failed:", e)
-        print("LLM raw response:", response)
-        return
-
-    facts = data.get("facts", {})
-    confidence = data.get("confidence", {})
+    facts, confidence = parse_fact_response(response)
 
     if not facts:
         print("⚠ No facts extracted.")
@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import threading
+from functools import lru_cache
+
+# ============================================================
+# ============ TOKEN-BUDGETED PROMPT CONTEXT PACKING ==========
+# ============================================================
+# Chat prompts are assembled from sections of very different value:
+# instructions and the user question (must keep), DB answers, recent
+# history, documents, the table schema, episodic summaries. Each section is
+# added with a priority (0 = required, higher = dropped first) and the
+# builder fits them into the model's prompt budget:
+#
+#   - sections are placed in priority order while they fit whole
+#   - a section that does not fit is cut to the space that is left:
+#       "lines"   keeps whole lines + "(N more lines omitted)"  (DB rows, bullets)
+#       "tokens"  keeps the leading tokens                       (free text)
+#       history   keeps the newest messages
+#   - whatever still does not fit is dropped
+#
+# Token counts use tiktoken when its encoding can be loaded, otherwise ~4
+# characters per token. The encoding is downloaded on first use (unless
+# TIKTOKEN_CACHE_DIR has it), so it loads on a background thread: callers
+# wait at most TIKTOKEN_LOAD_TIMEOUT_SECONDS in total, then estimate from
+# length until (if ever) the load finishes. Counts of static sections
+# (instructions, schema) are cached.
+#
+# Budget per model: CONTEXT_MODEL_BUDGETS (JSON {model: tokens}), falling
+# back to CONTEXT_TOKEN_BUDGET. The completion's max_tokens is reserved.
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000"))
+CONTEXT_BUDGET_LOG = os.getenv("CONTEXT_BUDGET_LOG", "1") == "1"
+TIKTOKEN_LOAD_TIMEOUT_SECONDS = float(os.getenv("TIKTOKEN_LOAD_TIMEOUT_SECONDS", "5"))
+
+DEFAULT_MODEL_BUDGETS = {
+    "openai/gpt-4o-mini": 12000,
+    "meta-llama/llama-3.1-8b-instruct": 6000
+}
+
+try:
+    MODEL_BUDGETS = {**DEFAULT_MODEL_BUDGETS, **json.loads(os.getenv("CONTEXT_MODEL_BUDGETS") or "{}")}
+except ValueError as e:
+    print("⚠ Invalid CONTEXT_MODEL_BUDGETS, using defaults:", e)
+    MODEL_BUDGETS = dict(DEFAULT_MODEL_BUDGETS)
+
+# Per-message overhead of the chat format (role markers etc.)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+_encoding_state = "unloaded"   # unloaded | loading | ready | failed
+_encoding_deadline = 0.0
+_encoding_thread = None
+_encoding_lock = threading.Lock()
+
+
+def _load_encoding():
+    global _encoding, _encoding_state
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"⚠ tiktoken unavailable, estimating tokens from length: {e}")
+        _encoding_state = "failed"
+        return
+    _encoding = encoding
+    _encoding_state = "ready"
+
+
+def _get_encoding():
+    global _encoding_state, _encoding_deadline, _encoding_thread
+    if _encoding_state in ("ready", "failed"):
+        return _encoding
+
+    with _encoding_lock:
+        if _encoding_state == "unloaded":
+            _encoding_state = "loading"
+            _encoding_deadline = time.monotonic() + TIKTOKEN_LOAD_TIMEOUT_SECONDS
+            _encoding_thread = threading.Thread(target=_load_encoding, name="tiktoken-load", daemon=True)
+            _encoding_thread.start()
+
+    remaining = _encoding_deadline - time.monotonic()
+    if remaining > 0:
+        _encoding_thread.join(remaining)
+        if _encoding_state == "loading":
+            print(f"⚠ tiktoken encoding not loaded after {TIKTOKEN_LOAD_TIMEOUT_SECONDS}s, "
+                  "estimating tokens from length meanwhile")
+    return _encoding
+
+
+def count_tokens(text) -> int:
+    if not text:
+        return 0
+    text = str(text)
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+@lru_cache(maxsize=512)
+def count_tokens_cached(text: str) -> int:
+    """For static text (instructions, schema) that is counted on every request."""
+    return count_tokens(text)
+
+
+def budget_for(model: str | None, reserve: int = 0) -> int:
+    budget = MODEL_BUDGETS.get(model or "", CONTEXT_TOKEN_BUDGET)
+    return max(256, budget - (reserve or 0))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        cut = text[:max_tokens * 4]
+    else:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        cut = encoding.decode(tokens[:max_tokens])
+    return cut.rstrip() + "\n…[truncated]"
+
+
+def truncate_lines(text: str, max_tokens: int) -> str:
+    lines = text.splitlines()
+    kept, used = [], 0
+    for line in lines:
+        cost = count_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    if not kept:
+        return truncate_tokens(text, max_tokens)
+    omitted = len(lines) - len(kept)
+    if omitted:
+        kept.append(f"…({omitted} more lines omitted)")
+    return "\n".join(kept)
+
+
+def fit_messages(messages: list, max_tokens: int) -> tuple[list, int, int]:
+    """
+    Cut a ready-made chat message list to max_tokens, shortening the longest
+    contents first (instructions and questions are usually the short ones).
+    Returns (messages, tokens before, tokens after); the input is not modified.
+    """
+    sizes = [count_tokens(m.get("content")) + MESSAGE_OVERHEAD_TOKENS for m in messages or []]
+    total = sum(sizes)
+    if total <= max_tokens:
+        return messages, total, total
+
+    fitted = [dict(m) for m in messages]
+    excess = total - max_tokens
+    for index in sorted(range(len(fitted)), key=lambda i: sizes[i], reverse=True):
+        if excess <= 0:
+            break
+        content = str(fitted[index].get("content") or "")
+        # 8 tokens of slack for the truncation marker
+        keep = max(0, sizes[index] - MESSAGE_OVERHEAD_TOKENS - excess - 8)
+        fitted[index]["content"] = truncate_tokens(content, keep)
+        new_size = count_tokens(fitted[index]["content"]) + MESSAGE_OVERHEAD_TOKENS
+        excess -= sizes[index] - new_size
+        sizes[index] = new_size
+
+    return fitted, total, sum(sizes)
+
+
+class ContextBudget:
+
+    def __init__(self, model: str | None = None, reserve: int = 0, label: str = "prompt"):
+        self.model = model
+        self.budget = budget_for(model, reserve)
+        self.reserve = reserve
+        self.label = label
+        self._sections = []   # (priority, order, name, kind, value, static, mode)
+
+    def add(self, name: str, text, priority: int = 5, static: bool = False, mode: str = "tokens"):
+        """mode: "tokens" (cut text) or "lines" (keep whole lines)."""
+        self._sections.append((priority, len(self._sections), name, "text", str(text or ""), static, mode))
+        return self
+
+    def add_history(self, name: str, messages: list, priority: int = 2):
+        self._sections.append((priority, len(self._sections), name, "history", list(messages or []), False, None))
+        return self
+
+    def fit(self) -> dict:
+        """
+        Return {section name: fitted text or message list} within the budget.
+        Required sections (priority 0) are always kept whole.
+        """
+        remaining = self.budget
+        fitted = {}
+        breakdown = []
+
+        for priority, _, name, kind, value, static, mode in sorted(self._sections):
+            if kind == "history":
+                result, used, note = self._fit_history(value, remaining if priority else float("inf"))
+            else:
+                size = count_tokens_cached(value) if static else count_tokens(value)
+                if not value:
+                    result, used, note = value, 0, ""
+                elif priority == 0 or size <= remaining:
+                    result, used, note = value, size, ""
+                elif remaining > 32:
+                    limit = remaining - 8   # room for the truncation note
+                    result = truncate_lines(value, limit) if mode == "lines" else truncate_tokens(value, limit)
+                    used = count_tokens(result)
+                    note = f" (cut from {size})"
+                else:
+                    result, used, note = "", 0, f" (dropped {size})"
+
+            fitted[name] = result
+            remaining -= used
+            breakdown.append(f"{name} {used}{note}")
+
+        if CONTEXT_BUDGET_LOG:
+            print(f"📏 {self.label} budget {self.budget} ({self.model or 'default'}, reserve {self.reserve}): "
+                  + ", ".join(breakdown) + f" | used {self.budget - remaining}")
+        return fitted
+
+    def _fit_history(self, messages: list, remaining):
+        kept, used = [], 0
+        for message in reversed(messages):
+            cost = count_tokens(message.get("content")) + MESSAGE_OVERHEAD_TOKENS
+            if used + cost > remaining:
+                break
+            kept.append(message)
+            used += cost
+        kept.reverse()
+        note = f" ({len(kept)}/{len(messages)} msgs)" if len(kept) != len(messages) else ""
+        return kept, used, note
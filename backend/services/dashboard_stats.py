@@ -0,0 +1,237 @@
+import os
+import time
+import threading
+from core import supabase
+
+# ============================================================
+# ============ DASHBOARD AGGREGATES (/manager/dashboard) ======
+# ============================================================
+# Per-status counters kept in process memory and updated by the write paths
+# (assign_task, update_assignment_status, broadcast/task creation).
+# A periodic full reconciliation against the source tables corrects any drift
+# (e.g. writes made by other workers or directly in Supabase).
+#
+# Reads never wait on Supabase or on payload building while holding _lock:
+# reconcile() builds new counters off-lock and swaps them in, and status
+# buckets are copy-on-write (a published bucket dict is never mutated), so
+# get_dashboard() only copies references under the lock. The route calls it
+# through asyncio.to_thread, since a due reconciliation still blocks.
+
+RECONCILE_INTERVAL = int(os.getenv("DASHBOARD_RECONCILE_SECONDS", "300"))
+RESPONSE_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "5"))
+FETCH_PAGE_SIZE = 1000
+
+_lock = threading.RLock()
+_reconcile_lock = threading.Lock()   # one reconciliation at a time
+
+_state = {
+    "ready": False,
+    "reconciled_at": 0.0,
+    "version": 0,             # bumped by every change; guards _response_cache
+    "total_broadcasts": 0,
+    "total_tasks": 0,
+    "status_counts": {},
+    "by_broadcast": {},       # broadcast_id -> {status: count}
+    "by_organization": {},    # organization_id -> {status: count}
+}
+
+# Lookup maps needed to route a status delta to its breakdown buckets
+_task_broadcast = {}          # task_id -> broadcast_id
+_broadcast_org = {}           # broadcast_id -> organization_id
+
+# breakdown -> (expires_at, payload)
+_response_cache = {}
+
+
+def _fetch_all(table: str, columns: str) -> list:
+    """Read every row of `table` in pages (PostgREST caps a single response)."""
+    rows = []
+    start = 0
+    while True:
+        res = (
+            supabase
+            .table(table)
+            .select(columns)
+            .range(start, start + FETCH_PAGE_SIZE - 1)
+            .execute()
+        )
+        page = res.data or []
+        rows.extend(page)
+        if len(page) < FETCH_PAGE_SIZE:
+            return rows
+        start += FETCH_PAGE_SIZE
+
+
+def _bumped(bucket: dict | None, status: str, delta: int) -> dict:
+    """Copy of bucket with the delta applied (published buckets are never mutated)."""
+    bucket = dict(bucket or {})
+    bucket[status] = bucket.get(status, 0) + delta
+    if bucket[status] <= 0:
+        bucket.pop(status, None)
+    return bucket
+
+
+def _apply_delta(task_id, status: str, delta: int):
+    _state["status_counts"] = _bumped(_state["status_counts"], status, delta)
+
+    broadcast_id = _task_broadcast.get(str(task_id))
+    if broadcast_id is None:
+        return
+    by_broadcast = _state["by_broadcast"]
+    by_broadcast[broadcast_id] = _bumped(by_broadcast.get(broadcast_id), status, delta)
+
+    org_id = _broadcast_org.get(broadcast_id)
+    if org_id is not None:
+        by_organization = _state["by_organization"]
+        by_organization[org_id] = _bumped(by_organization.get(org_id), status, delta)
+
+
+def reconcile():
+    """Rebuild all counters from the source tables."""
+    broadcasts = _fetch_all("project_broadcasts", "id, organization_id")
+    tasks = _fetch_all("broadcast_tasks", "id, broadcast_id")
+    assignments = _fetch_all("task_assignments", "status, task_id")
+
+    broadcast_org = {str(b["id"]): b.get("organization_id") for b in broadcasts}
+    task_broadcast = {str(t["id"]): str(t.get("broadcast_id")) for t in tasks}
+
+    # Counted off-lock, in plain dicts nothing else can see yet
+    status_counts, by_broadcast, by_organization = {}, {}, {}
+    for a in assignments:
+        status = a.get("status") or "unknown"
+        status_counts[status] = status_counts.get(status, 0) + 1
+        broadcast_id = task_broadcast.get(str(a.get("task_id")))
+        if broadcast_id is None:
+            continue
+        bucket = by_broadcast.setdefault(broadcast_id, {})
+        bucket[status] = bucket.get(status, 0) + 1
+        org_id = broadcast_org.get(broadcast_id)
+        if org_id is not None:
+            bucket = by_organization.setdefault(org_id, {})
+            bucket[status] = bucket.get(status, 0) + 1
+
+    with _lock:
+        _broadcast_org.clear()
+        _broadcast_org.update(broadcast_org)
+        _task_broadcast.clear()
+        _task_broadcast.update(task_broadcast)
+
+        _state["status_counts"] = status_counts
+        _state["by_broadcast"] = by_broadcast
+        _state["by_organization"] = by_organization
+        _state["total_broadcasts"] = len(broadcasts)
+        _state["total_tasks"] = len(tasks)
+        _state["reconciled_at"] = time.time()
+        _state["ready"] = True
+        _state["version"] += 1
+        _response_cache.clear()
+
+    print(f"📊 Dashboard aggregates reconciled: {len(assignments)} assignments")
+
+
+def _ensure_fresh():
+    if _state["ready"] and time.time() - _state["reconciled_at"] <= RECONCILE_INTERVAL:
+        return
+
+    if _state["ready"]:
+        # Due for a reconciliation: if one is already running, serve the current numbers
+        if not _reconcile_lock.acquire(blocking=False):
+            return
+    else:
+        _reconcile_lock.acquire()
+        if _state["ready"]:
+            _reconcile_lock.release()
+            return
+
+    try:
+        reconcile()
+    finally:
+        _reconcile_lock.release()
+
+
+# ------------------------------------------------------------
+# Write-path hooks (no-ops until the first reconciliation)
+# ------------------------------------------------------------
+
+def record_broadcast_created(broadcast_id, organization_id=None):
+    with _lock:
+        if not _state["ready"]:
+            return
+        _broadcast_org[str(broadcast_id)] = organization_id
+        _state["total_broadcasts"] += 1
+        _state["version"] += 1
+        _response_cache.clear()
+
+
+def record_task_created(task_id, broadcast_id):
+    with _lock:
+        if not _state["ready"]:
+            return
+        _task_broadcast[str(task_id)] = str(broadcast_id)
+        _state["total_tasks"] += 1
+        _state["version"] += 1
+        _response_cache.clear()
+
+
+def record_assignments(task_id, count: int, status: str = "pending"):
+    with _lock:
+        if not _state["ready"] or count <= 0:
+            return
+        _apply_delta(task_id, status, count)
+        _state["version"] += 1
+        _response_cache.clear()
+
+
+def record_status_change(task_id, old_status: str | None, new_status: str):
+    with _lock:
+        if not _state["ready"] or old_status == new_status:
+            return
+        _apply_delta(task_id, old_status or "unknown", -1)
+        _apply_delta(task_id, new_status or "unknown", 1)
+        _state["version"] += 1
+        _response_cache.clear()
+
+
+# ------------------------------------------------------------
+# Read path
+# ------------------------------------------------------------
+
+def get_dashboard(breakdown: str | None = None) -> dict:
+    """
+    Return the manager dashboard payload.
+    breakdown: None, "broadcast" or "organization".
+    Blocks while a due reconciliation runs: call it from a worker thread.
+    """
+    now = time.time()
+    cached = _response_cache.get(breakdown)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    _ensure_fresh()
+
+    # References only: buckets are replaced, never mutated, once published
+    with _lock:
+        version = _state["version"]
+        status_counts = _state["status_counts"]
+        total_broadcasts = _state["total_broadcasts"]
+        total_tasks = _state["total_tasks"]
+        by_broadcast = dict(_state["by_broadcast"]) if breakdown == "broadcast" else None
+        by_organization = dict(_state["by_organization"]) if breakdown == "organization" else None
+
+    payload = {
+        "total_broadcasts": total_broadcasts,
+        "total_tasks": total_tasks,
+        "total_assignments": sum(status_counts.values()),
+        "status_breakdown": dict(status_counts)
+    }
+
+    if by_broadcast is not None:
+        payload["by_broadcast"] = {k: dict(v) for k, v in by_broadcast.items() if v}
+    elif by_organization is not None:
+        payload["by_organization"] = {str(k): dict(v) for k, v in by_organization.items() if v}
+
+    with _lock:
+        # Not if a write landed while the payload was being built
+        if _state["version"] == version:
+            _response_cache[breakdown] = (now + RESPONSE_CACHE_TTL, payload)
+    return payload
@@ -1,3 +1,4 @@
+import asyncio
 import random
 import traceback
 #JONCY START
@@ -61,8 +62,32 @@ from security.encrypt_utils import encrypt_api, decrypt_api
 
 # chirag logic end
 from services.work_service import process_ai_reply
+from services import session_store
+from services.context_budget import ContextBudget
+from services.suggestion_engine import start_suggestions
+from services.llm_metering import tag_usage
+from utils.prompt_templates import PromptTemplate
+
+# Static instructions first, user-specific lines last (stable cacheable prefix)
+DUAL_CHAT_TEMPLATE = PromptTemplate(
+    "dual_chat",
+    [
+        "You are a helpful AI assistant.\n"
+        "Use provided project or document context if relevant.",
+        "Respond clearly and professionally.\n"
+        "At the end of your answer generate 2 short follow-up questions.\n\n"
+        "Format EXACTLY like this:\n\n"
+        "Answer:\n"
+        "<your answer>\n\n"
+        "You Might Also Ask:\n"
+        "- question\n"
+        "- question",
+    ],
+    "User: {user_name} ({user_email}), Role: {user_role}.\n"
+    "{episodic_text}"
+)
 
-async def handle_dual_chat(data, current_user, stream=False):
+async def handle_dual_chat(data, current_user, stream=False, ws_session=None):
     try:
         safe_reply = None
         final_safe_reply = None
@@ -79,23 +104,29 @@ async def handle_dual_chat(data, current_user, stream=False):
         project_id = data.project_id or "default"
 
         user_email = current_user.get("email")
+        tag_usage(call_site="chat_dual", user_email=user_email, project_id=project_id)
         user_name = current_user.get("name", "")
-        user_role = get_user_role(user_email)
+        user_role = ws_session.role if ws_session else get_user_role(user_email)
         user_role = user_role.strip().lower().replace(" ", "_") # Sujal
 
         # -------------------- Facts --------------------
-        extract_and_store_user_fact(user_email, user_input)
+        await asyncio.to_thread(extract_and_store_user_fact, user_email, user_input)
         user_facts = get_user_fact(user_email) or {}
 
         # -------------------- Validate input --------------------
         user_valid, user_err = validate_user_input(user_input)
         if not user_valid:
             # We still resolve chat_id before returning to maintain session
-            chat_id = _resolve_chat_id(project_id, user_email, data.chat_id)
+            if ws_session:
+                chat_id = ws_session.resolve_chat_id(project_id, data.chat_id)
+            else:
+                chat_id = _resolve_chat_id(project_id, user_email, data.chat_id)
             return {"reply": user_err, "chat_id": chat_id, "is_tabular": False}
 
         # -------------------- Resolve project_id --------------------
-        if project_id != "default" and not _is_uuid(project_id):
+        if ws_session:
+            project_id = ws_session.resolve_project(project_id)
+        elif project_id != "default" and not _is_uuid(project_id):
             try:
                 res = (
                     supabase.table("projects")
@@ -111,11 +142,17 @@ async def handle_dual_chat(data, current_user, stream=False):
             except Exception:
                 project_id = None
 
-        chat_id = _resolve_chat_id(project_id, user_email, data.chat_id)
+        if ws_session:
+            chat_id = ws_session.resolve_chat_id(project_id, data.chat_id)
+        else:
+            chat_id = _resolve_chat_id(project_id, user_email, data.chat_id)
+
+        save_message = ws_session.save_message if ws_session else save_chat_message
 
         encrypted_user_msg = encrypt_api(user_input, project_id)
 
-        user_msg_id = save_chat_message(
+        user_msg_id = await asyncio.to_thread(
+            save_message,
             user_email=user_email,
             role="user",
             content=encrypted_user_msg,
@@ -124,12 +161,8 @@ async def handle_dual_chat(data, current_user, stream=False):
         )
 
         # ================= SELF ASKING SESSION SETUP ================= #Tanmey Start
-        # FastAPI doesn't have Flask sessions - using in-memory session dict attached to function
-        if not hasattr(handle_dual_chat, '_sessions'):
-            handle_dual_chat._sessions = {}
-        
-        session_key = f"{user_email}_{project_id}_{chat_id}"
-        session = handle_dual_chat._sessions.setdefault(session_key, {})
+        # Bounded, TTL-evicted store shared by all workers (see services/session_store.py)
+        session = session_store.get_session("dual", user_email, project_id, chat_id)
 
         # 🔒 GUARD: random number without active clarification
         if user_input.strip().isdigit() and not session.get("multi_clarification"):
@@ -259,7 +292,8 @@ async def handle_dual_chat(data, current_user, stream=False):
         
         # Handle risk response
         if not is_safe:
-            save_chat_message(
+            await asyncio.to_thread(
+                save_message,
                 user_email=user_email,
                 role="assistant",
                 content=risk_response["reply"],
@@ -292,7 +326,8 @@ async def handle_dual_chat(data, current_user, stream=False):
             # )
 
             encrypted_greeting = encrypt_api(greeting_response, project_id)
-            save_chat_message(
+            await asyncio.to_thread(
+                save_message,
                 user_email=user_email,
                 role="assistant",
                 content=encrypted_greeting,
@@ -306,19 +341,22 @@ async def handle_dual_chat(data, current_user, stream=False):
         wants_table = detect_table_request(user_input)
         print(f"[DEBUG] Table request detected: {wants_table}")
 
+        # Follow-up suggestions are prepared while the answer is generated
+        suggestion_job = start_suggestions(
+            user_input, project_id, project_data, user_email, expect_inline=not wants_table
+        )
+
         # -------------------- Load History early for context --------------------
         episodic = load_episodic_memory(user_email, project_id, chat_id) or []
-        episodic_text = (
-            "\nPrevious conversation summaries:\n" + "\n---\n".join(episodic)
-            if episodic
-            else ""
-        )
          # chirag logic start
         # conv_hist = load_chat_history(user_email, project_id, chat_id, limit=15) or []
 #JONCY START
-        encrypted_hist = (
-            load_chat_history(user_email, project_id, chat_id, limit=5) or []
-        )
+        if ws_session:
+            encrypted_hist = ws_session.history(project_id, chat_id, limit=5)
+        else:
+            encrypted_hist = (
+                load_chat_history(user_email, project_id, chat_id, limit=5) or []
+            )
 #JONCY END
         # Decrypt history for LLM context
         #JONCY START
@@ -343,7 +381,7 @@ async def handle_dual_chat(data, current_user, stream=False):
         # ]
 
         # // KIRTAN START 05-03
-        active_model = get_user_llm_model(user_email)
+        active_model = ws_session.llm_model if ws_session else get_user_llm_model(user_email)
         #JONCY START
         # active_model = "meta-llama/llama-3.1-8b-instruct"
         #JONCY OVER
@@ -385,7 +423,8 @@ async def handle_dual_chat(data, current_user, stream=False):
 
              # chirag logic start
 
-            save_chat_message(
+            await asyncio.to_thread(
+                save_message,
                 user_email=user_email,
                 role="assistant",
                 content=encrypted_resp,
@@ -395,7 +434,8 @@ async def handle_dual_chat(data, current_user, stream=False):
 
             encrypted_user_msg = encrypt_api(user_query, project_id)
 
-            save_chat_message(
+            await asyncio.to_thread(
+                save_message,
                 user_email=user_email,
                 role="user",
                 content=encrypted_user_msg,
@@ -407,7 +447,7 @@ async def handle_dual_chat(data, current_user, stream=False):
 
         # -------------------- Intent --------------------
         # // KIRTAN START 05-03
-        query_type = detect_intent(normalized_query, user_email)
+        query_type = await asyncio.to_thread(detect_intent, normalized_query, user_email)
         # // KIRTAN STOP 05-03
         print(f"🧭 Detected intent: {query_type}")
 
@@ -471,8 +511,8 @@ async def handle_dual_chat(data, current_user, stream=False):
 
         elif wants_table:
             # // KIRTAN START 05-03
-            llm_rows = llm_force_json_table(
-                user_input, context=str(db_answer or ""), user_email=user_email
+            llm_rows = await asyncio.to_thread(
+                llm_force_json_table, user_input, context=str(db_answer or ""), user_email=user_email
             )
             # // KIRTAN STOP 05-03
             if llm_rows:
@@ -484,7 +524,8 @@ async def handle_dual_chat(data, current_user, stream=False):
 
         if wants_table:
 
-            final_safe_reply, assistant_msg_id, suggestions = process_ai_reply(
+            final_safe_reply, assistant_msg_id, suggestions = await asyncio.to_thread(
+                process_ai_reply,
                 user_input=user_input,
                 normalized_query=normalized_query,
                 raw_reply=final_reply,
@@ -492,11 +533,10 @@ async def handle_dual_chat(data, current_user, stream=False):
                 chat_id=chat_id,
                 user_email=user_email,
                 is_tabular=is_tabular,
-                project_data=project_data
+                project_data=project_data,
+                ws_session=ws_session,
+                suggestion_job=suggestion_job
             )
-            #JONCY START
-            suggestions = You_Might_Also_Ask
-            #JONCY END
             return {
                 "reply": final_safe_reply,
                 "is_tabular": is_tabular,
@@ -523,6 +563,22 @@ async def handle_dual_chat(data, current_user, stream=False):
             #     {"role": "user", "content": synth_prompt},
             # ]
 
+            # Fit DB / document context, history and summaries into the prompt budget
+            max_tokens_value = 1200
+            context = ContextBudget(active_model, reserve=max_tokens_value, label="dual chat")
+            context.add("question", user_input, priority=0)
+            context.add("db", db_answer, priority=1, mode="lines")
+            context.add_history("history", conv_hist, priority=2)
+            context.add("documents", doc_context, priority=3)
+            context.add("episodic", "\n---\n".join(episodic), priority=5)
+            fitted = context.fit()
+
+            episodic_text = (
+                "\nPrevious conversation summaries:\n" + fitted["episodic"]
+                if fitted["episodic"]
+                else ""
+            )
+
             #JONCY START
             # messages = [
             #     {
@@ -536,41 +592,33 @@ async def handle_dual_chat(data, current_user, stream=False):
             #     }
             # ]
             messages = [
-                    {
+                {
                     "role": "system",
-                    "content": (
-                    f"You are a helpful AI assistant.\n"
-                    f"User: {user_name} ({user_email}), Role: {user_role}.\n"
-                    f"{episodic_text}\n"
-                    "Use provided project or document context if relevant.\n\n"
-                    "Respond clearly and professionally.\n"
-                    "At the end of your answer generate 2 short follow-up questions.\n\n"
-                    "Format EXACTLY like this:\n\n"
-                    "Answer:\n"
-                    "<your answer>\n\n"
-                    "You Might Also Ask:\n"
-                    "- question\n"
-                    "- question"
+                    "content": DUAL_CHAT_TEMPLATE.render(
+                        user_name=user_name,
+                        user_email=user_email,
+                        user_role=user_role,
+                        episodic_text=episodic_text
                     ),
                 }
             ]
 
             # Add project/database context
-            if db_answer:
+            if fitted["db"]:
                 messages.append({
                     "role": "system",
-                    "content": f"Project database information:\n{db_answer}"
+                    "content": f"Project database information:\n{fitted['db']}"
                 })
 
             # Add RAG/document context
-            if doc_context:
+            if fitted["documents"]:
                 messages.append({
                     "role": "system",
-                    "content": f"Relevant documentation:\n{doc_context}"
+                    "content": f"Relevant documentation:\n{fitted['documents']}"
                 })
 
             # Add conversation history
-            messages.extend(conv_hist)
+            messages.extend(fitted["history"])
 
             # Add the actual user question
             messages.append({
@@ -591,7 +639,7 @@ async def handle_dual_chat(data, current_user, stream=False):
                         messages,
                         model=active_model,
                         temperature=0.5,
-                        max_tokens=1200,
+                        max_tokens=max_tokens_value,
                         stream=True
                     )
 
@@ -608,7 +656,8 @@ async def handle_dual_chat(data, current_user, stream=False):
                         fallback=collected_reply
                     )
 
-                    final_safe_reply, assistant_msg_id, suggestions = process_ai_reply(
+                    final_safe_reply, assistant_msg_id, suggestions = await asyncio.to_thread(
+                        process_ai_reply,
                         user_input=user_input,
                         normalized_query=normalized_query,
                         raw_reply=final_reply,
@@ -616,7 +665,9 @@ async def handle_dual_chat(data, current_user, stream=False):
                         chat_id=chat_id,
                         user_email=user_email,
                         is_tabular=False,
-                        project_data=project_data
+                        project_data=project_data,
+                        ws_session=ws_session,
+                        suggestion_job=suggestion_job
                     )
 
                     yield {
@@ -637,29 +688,14 @@ async def handle_dual_chat(data, current_user, stream=False):
                         messages,
                         model=active_model,
                         temperature=0.5,
-                        max_tokens=1200,
+                        max_tokens=max_tokens_value,
                         stream=False
                     )
 
                 final_reply = format_response(user_input, fallback=reply)
-#JONCY START
-                You_Might_Also_Ask = []
-                answer_part = final_reply
-
-                match = re.split(r"You Might Also Ask\s*[:\-]\s*", final_reply, flags=re.IGNORECASE)
-
-                if len(match) > 1:
-                    answer_part = match[0].replace("Answer:", "").strip()
-                    suggestion_lines = match[1].split("\n")
-
-                    for line in suggestion_lines:
-                        line = line.strip()
-                        if line.startswith("-"):
-                            You_Might_Also_Ask.append(line[1:].strip())
-
-                final_reply = answer_part
-#JONCY END
-                final_safe_reply, assistant_msg_id, suggestions = process_ai_reply(
+                # process_ai_reply splits off the "You Might Also Ask" lines
+                final_safe_reply, assistant_msg_id, suggestions = await asyncio.to_thread(
+                    process_ai_reply,
                     user_input=user_input,
                     normalized_query=normalized_query,
                     raw_reply=final_reply,
@@ -667,7 +703,9 @@ async def handle_dual_chat(data, current_user, stream=False):
                     chat_id=chat_id,
                     user_email=user_email,
                     is_tabular=False,
-                    project_data=project_data
+                    project_data=project_data,
+                    ws_session=ws_session,
+                    suggestion_job=suggestion_job
                 )
 
                 return {
@@ -0,0 +1,104 @@
+import json
+import hashlib
+from fastapi import HTTPException, Request, Response
+from core import supabase
+from utils.pagination import decode_cursor, apply_keyset, next_cursor, check_key_value, InvalidCursor
+
+# ============================================================
+# ================= SHARED LISTING LAYER =====================
+# ============================================================
+# Used by the polling list endpoints (announcements, feedback, broadcasts,
+# users list):
+#   - keyset/cursor pagination on a timestamp column (+ id tie-breaker)
+#   - `since`: only rows newer than the client's latest timestamp
+#   - `fields`: column projection against a per-endpoint allow-list
+#   - ETag / If-None-Match so unchanged polls get an empty 304
+# Pagination metadata travels in headers so list payloads keep their shape.
+
+MAX_PAGE_SIZE = 500
+
+
+def parse_fields(fields: str | None, allowed: set, required: tuple = ()) -> str:
+    """
+    Turn "a,b,c" into a select string, validated against `allowed`.
+    Columns in `required` (sort / tie-breaker keys) are always included.
+    """
+    if not fields:
+        return "*"
+
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    columns = list(dict.fromkeys([*requested, *required]))
+    return ", ".join(columns)
+
+
+def list_rows(
+    table: str,
+    sort_col: str,
+    tie_col: str | None = "id",
+    select: str = "*",
+    filters=None,
+    cursor: str | None = None,
+    since: str | None = None,
+    limit: int | None = None,
+    desc: bool = True
+) -> tuple[list, str | None]:
+    """
+    Fetch one page of `table`.
+
+    filters: optional callable(query) -> query for endpoint specific filters
+             (user scoping included; they are applied as their own filters)
+    since:   return only rows whose sort_col is strictly greater than this value
+
+    Returns (rows, next_cursor). Without a limit the full (filtered) set is returned.
+    A malformed cursor or `since` value is rejected with 400.
+    """
+    if limit is not None:
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    query = supabase.table(table).select(select)
+
+    if filters:
+        query = filters(query)
+
+    try:
+        if since:
+            query = query.gt(sort_col, check_key_value(sort_col, since))
+        query = apply_keyset(query, sort_col, tie_col, decode_cursor(cursor), desc=desc)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if limit:
+        query = query.limit(limit)
+
+    rows = query.execute().data or []
+    return rows, next_cursor(rows, sort_col, tie_col, limit)
+
+
+def compute_etag(payload) -> str:
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return 'W/"' + hashlib.sha1(body.encode("utf-8")).hexdigest() + '"'
+
+
+def conditional_response(request: Request, response: Response, payload, next_page: str | None = None):
+    """
+    Attach ETag / X-Next-Cursor headers and short-circuit with 304 when the
+    client already holds this exact payload.
+    """
+    etag = compute_etag(payload)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if next_page:
+            headers["X-Next-Cursor"] = next_page
+        return Response(status_code=304, headers=headers)
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    if next_page:
+        response.headers["X-Next-Cursor"] = next_page
+    return payload
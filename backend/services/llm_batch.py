@@ -0,0 +1,449 @@
+import os
+import time
+import uuid
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timezone
+
+from core import (
+    supabase,
+    call_llm_for_task,
+    episodic_summary_messages,
+    episodic_memory_row,
+    get_user_id,
+    _is_uuid
+)
+from services.chat_core import fact_extraction_messages, parse_fact_response, merge_user_facts
+from services.llm_sync import _fetch_paged
+from security.encrypt_utils import decrypt_api_strict
+from utils.log_store import AppendOnlyStore
+
+# ============================================================
+# ================== OFFLINE LLM BATCH JOBS ==================
+# ============================================================
+# Maintenance workloads (episodic re-summarisation, bulk fact re-extraction)
+# run here instead of one item at a time through the interactive path:
+#
+#   - calls go through the model router's "batch" tier (own concurrency
+#     slots), so they never take the slots of chat-time auxiliary calls
+#   - BATCH_CONCURRENCY workers, paced by a BATCH_RATE_PER_MINUTE limiter
+#   - every item's outcome is checkpointed to
+#     BATCH_CHECKPOINT_DIR/<job_id>.log (append-only, see utils/log_store):
+#       generated   LLM output kept, not yet written to Supabase
+#       written     done
+#       skipped     nothing to write (empty summary, no facts found, or
+#                   the write found no valid target for it)
+#       failed      retried when the job is resumed
+#     Resuming a job id skips written/skipped items and writes generated
+#     ones without calling the LLM again.
+#   - results are written back in chunks of BATCH_WRITE_CHUNK rows
+#   - chat history is loaded one user at a time and items are consumed
+#     lazily, so memory does not grow with the total chat history
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "2"))
+BATCH_RATE_PER_MINUTE = float(os.getenv("BATCH_RATE_PER_MINUTE", "30"))
+BATCH_WRITE_CHUNK = int(os.getenv("BATCH_WRITE_CHUNK", "100"))
+BATCH_CHECKPOINT_DIR = os.getenv("BATCH_CHECKPOINT_DIR", "batch_checkpoints")
+BATCH_PAGE_SIZE = 1000
+
+EPISODIC_MIN_MESSAGES = int(os.getenv("BATCH_EPISODIC_MIN_MESSAGES", "4"))
+EPISODIC_MAX_MESSAGES = 50
+FACT_MAX_MESSAGES = int(os.getenv("BATCH_FACT_MAX_MESSAGES", "30"))
+FACT_MAX_CHARS = 6000
+
+JOB_RETENTION_SECONDS = 6 * 3600
+
+_jobs_lock = threading.Lock()
+_jobs = {}  # job_id -> job status dict
+
+
+class RateLimiter:
+    """Spaces calls evenly: at most `per_minute` starts per minute across threads."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+# ============================================================
+# ========================== RUNNER ==========================
+# ============================================================
+
+def checkpoint_path(job_id: str) -> str:
+    if not _is_uuid(job_id):
+        # Job ids become file names: never let a client pick a path
+        raise ValueError(f"Invalid batch job id: {job_id!r}")
+    return os.path.join(BATCH_CHECKPOINT_DIR, f"{job_id}.log")
+
+
+def run_batch(job_id: str, spec: dict, items, progress=None, should_stop=None) -> dict:
+    """
+    Run items through the LLM and write the results back.
+
+    items:  iterable of {"id": str, "messages": [...], "meta": {...}}; consumed
+            lazily, with at most BATCH_MAX_IN_FLIGHT items generating at once
+    spec:   task, max_tokens, temperature, parse(output) -> result | None,
+            write(list of (item, result)) -> ids skipped by the write (or None)
+    progress: optional callable(done: int, seen: int)
+    """
+    os.makedirs(BATCH_CHECKPOINT_DIR, exist_ok=True)
+    checkpoint = AppendOnlyStore(checkpoint_path(job_id))
+    state = checkpoint.items()
+    limiter = RateLimiter(BATCH_RATE_PER_MINUTE)
+
+    counts = defaultdict(int)
+    pending_write = []   # (item, result)
+    errors = []
+    seen = 0
+    done = 0
+
+    def flush():
+        if not pending_write:
+            return
+        batch = list(pending_write)
+        pending_write.clear()
+        try:
+            skipped = set(spec["write"](batch) or ())
+        except Exception as e:
+            # Left as "generated": the next resume retries the write only
+            print(f"❌ Batch {job_id}: write of {len(batch)} results failed:", e)
+            errors.append(f"write: {e}")
+            counts["write_failed"] += len(batch)
+            return
+        checkpoint.put_many({
+            item["id"]: {"status": "skipped" if item["id"] in skipped else "written"} for item, _ in batch
+        })
+        counts["written"] += len(batch) - len(skipped)
+        counts["skipped"] += len(skipped)
+
+    def queue_write(item, result):
+        pending_write.append((item, result))
+        if len(pending_write) >= BATCH_WRITE_CHUNK:
+            flush()
+
+    def generate(item):
+        limiter.wait()
+        output = call_llm_for_task(
+            spec["task"],
+            item["messages"],
+            temperature=spec.get("temperature", 0.2),
+            max_tokens=spec.get("max_tokens", 400)
+        )
+        if not output:
+            # Router slot timeout or every model failed: retry on resume
+            raise RuntimeError("no LLM output")
+        return spec["parse"](output)
+
+    def collect(future, item):
+        try:
+            result = future.result()
+        except Exception as e:
+            checkpoint.put(item["id"], {"status": "failed", "error": str(e)[:300]})
+            counts["failed"] += 1
+            if len(errors) < 20:
+                errors.append(f"{item['id']}: {e}")
+            return
+        if result is None:
+            checkpoint.put(item["id"], {"status": "skipped"})
+            counts["skipped"] += 1
+        else:
+            checkpoint.put(item["id"], {"status": "generated", "result": result})
+            counts["generated"] += 1
+            queue_write(item, result)
+
+    max_in_flight = max(1, BATCH_CONCURRENCY) * 2
+    with ThreadPoolExecutor(max_workers=max(1, BATCH_CONCURRENCY), thread_name_prefix=f"batch-{job_id[:8]}") as pool:
+        futures = {}
+        stopped = False
+
+        def drain(block_until: int):
+            nonlocal done
+            while len(futures) > block_until:
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    collect(future, futures.pop(future))
+                    done += 1
+                if progress:
+                    progress(done, seen)
+
+        for item in items:
+            if should_stop and should_stop():
+                # Items not yet submitted stay unrecorded and run on resume
+                stopped = True
+                break
+            seen += 1
+            entry = state.get(item["id"]) or {}
+            status = entry.get("status")
+            if status in ("written", "skipped"):
+                counts["resumed_done"] += 1
+                done += 1
+            elif status == "generated":
+                counts["resumed_generated"] += 1
+                queue_write(item, entry.get("result"))
+                done += 1
+            else:
+                futures[pool.submit(generate, item)] = item
+                drain(max_in_flight - 1)
+
+        if stopped:
+            for future in list(futures):
+                if future.cancel():
+                    futures.pop(future)
+                    counts["cancelled"] += 1
+        drain(0)
+
+    flush()
+    if progress:
+        progress(done, seen)
+    return {"total": seen, **counts, "errors": errors, "checkpoint": checkpoint_path(job_id)}
+
+
+# ============================================================
+# ========================== JOBS ============================
+# ============================================================
+
+def _perms_emails() -> dict:
+    return {r["id"]: r.get("email") for r in _fetch_paged("user_perms", "id, email") if r.get("email")}
+
+
+def _user_chats(uid) -> dict:
+    """(project_id, chat_id) -> [(created_at, role, text)] of one user, decrypted, oldest first."""
+    chats = defaultdict(list)
+    start = 0
+    while True:
+        page = (
+            supabase
+            .table("user_memorys")
+            .select("project_id, chat_id, role, content, created_at")
+            .eq("user_id", uid)
+            .range(start, start + BATCH_PAGE_SIZE - 1)
+            .execute()
+        ).data or []
+        for row in page:
+            text = decrypt_api_strict(row.get("content"), row.get("project_id"))
+            if text:
+                chats[(row.get("project_id"), row.get("chat_id"))].append(
+                    (row.get("created_at") or "", row.get("role") or "user", text)
+                )
+        if len(page) < BATCH_PAGE_SIZE:
+            break
+        start += BATCH_PAGE_SIZE
+    for messages in chats.values():
+        messages.sort(key=lambda m: m[0])
+    return chats
+
+
+def _users(emails: list | None) -> list:
+    """[(perms user id, email)] of the job, optionally limited to `emails`."""
+    wanted = set(emails) if emails else None
+    return [(uid, email) for uid, email in _perms_emails().items() if wanted is None or email in wanted]
+
+
+def build_episodic_items(emails: list | None = None):
+    """One item per chat; chats are loaded one user at a time."""
+    for uid, email in _users(emails):
+        for (project_id, chat_id), messages in _user_chats(uid).items():
+            if len(messages) < EPISODIC_MIN_MESSAGES or not _is_uuid(chat_id):
+                continue
+            lines = [f"{role.upper()}: {text}" for _, role, text in messages[-EPISODIC_MAX_MESSAGES:]]
+            yield {
+                "id": f"{uid}:{project_id}:{chat_id}",
+                "messages": episodic_summary_messages(lines),
+                "meta": {"email": email, "project_id": project_id, "chat_id": chat_id, "msg_count": len(lines)}
+            }
+
+
+def write_episodic(results: list) -> list:
+    """
+    Replace each chat's summaries with the new whole-chat summary. Older
+    (windowed) rows would overlap it in load_episodic_memory, which returns
+    the newest two per chat, and every rerun would add one more.
+
+    The new rows are inserted first and only then are the chats' other rows
+    deleted, so a failure in between leaves an extra row, never no summary.
+    Returns the ids of items without a valid episodic user id (skipped).
+    """
+    rows = []
+    skipped = []
+    chats = defaultdict(list)   # (user_id, project_id) -> [chat_id]
+    for item, summary in results:
+        meta = item["meta"]
+        episodic_user_id = get_user_id(meta["email"])
+        if not _is_uuid(episodic_user_id):
+            skipped.append(item["id"])
+            continue
+        rows.append(episodic_memory_row(episodic_user_id, meta["project_id"], meta["chat_id"], summary, meta["msg_count"]))
+        chats[(episodic_user_id, meta["project_id"])].append(meta["chat_id"])
+    if not rows:
+        return skipped
+
+    inserted = supabase.table("episodic_memory").insert(rows).execute().data or []
+    new_ids = [r["id"] for r in inserted if r.get("id") is not None]
+    if len(new_ids) != len(rows):
+        print("⚠ Episodic insert returned no ids; older summaries kept")
+        return skipped
+
+    for (episodic_user_id, project_id), chat_ids in chats.items():
+        query = (
+            supabase.table("episodic_memory")
+            .delete()
+            .eq("user_id", episodic_user_id)
+            .in_("chat_id", chat_ids)
+            .not_.in_("id", new_ids)
+        )
+        query = query.eq("project_id", project_id) if project_id is not None else query.is_("project_id", "null")
+        query.execute()
+    return skipped
+
+
+def build_fact_items(emails: list | None = None):
+    """One item per user, built from that user's latest messages."""
+    for uid, email in _users(emails):
+        messages = [m for chat in _user_chats(uid).values() for m in chat if m[1] == "user"]
+        if not messages:
+            continue
+        messages.sort(key=lambda m: m[0])
+        text = "\n".join(m[2] for m in messages[-FACT_MAX_MESSAGES:])[-FACT_MAX_CHARS:]
+        yield {"id": email, "messages": fact_extraction_messages(text), "meta": {"email": email}}
+
+
+def parse_facts(output):
+    facts, confidence = parse_fact_response(output)
+    return {"facts": facts, "confidence": confidence} if facts else None
+
+
+def write_facts(results: list):
+    emails = [item["meta"]["email"] for item, _ in results]
+    existing = {
+        r["user_id"]: r
+        for r in (supabase.table("user_fact").select("user_id, facts, confidence_1").in_("user_id", emails).execute().data or [])
+    }
+
+    now = datetime.now(timezone.utc).isoformat()
+    rows = []
+    for item, result in results:
+        email = item["meta"]["email"]
+        old = existing.get(email) or {}
+        facts, confidence, changed = merge_user_facts(
+            old.get("facts"), old.get("confidence_1"), result["facts"], result["confidence"]
+        )
+        if changed:
+            rows.append({"user_id": email, "facts": facts, "confidence_1": confidence, "updated_at": now})
+    if rows:
+        supabase.table("user_fact").upsert(rows, on_conflict="user_id").execute()
+
+
+JOB_KINDS = {
+    "episodic_resummarize": {
+        "build": build_episodic_items,
+        "task": "batch_episodic_summary",
+        "max_tokens": 250,
+        "temperature": 0.2,
+        "parse": lambda output: output.strip() or None,
+        "write": write_episodic
+    },
+    "fact_reextract": {
+        "build": build_fact_items,
+        "task": "batch_facts",
+        "max_tokens": 400,
+        "temperature": 0.2,
+        "parse": parse_facts,
+        "write": write_facts
+    }
+}
+
+
+# ------------------------------------------------------------
+# Background job wrapper
+# ------------------------------------------------------------
+
+def _prune_jobs():
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    for job_id in [j for j, job in _jobs.items() if job.get("finished_at") and job["finished_at"] < cutoff]:
+        _jobs.pop(job_id, None)
+
+
+def create_batch_job(kind: str, emails: list | None = None, requested_by: str | None = None, job_id: str | None = None) -> dict:
+    """
+    Register a pending job; run it with run_batch_job(job_id).
+    Pass the id of an earlier job to resume it from its checkpoint.
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown batch job kind: {kind}")
+    if job_id is not None and not _is_uuid(job_id):
+        raise ValueError(f"Invalid batch job id: {job_id!r}")
+
+    job = {
+        "job_id": job_id or str(uuid.uuid4()),
+        "kind": kind,
+        "emails": emails,
+        "status": "queued",
+        "stage": "queued",
+        "done": 0,
+        "total": 0,
+        "resumed": bool(job_id),
+        "requested_by": requested_by,
+        "created_at": time.time(),
+        "finished_at": None,
+        "cancel_requested": False,
+        "result": None
+    }
+    with _jobs_lock:
+        _prune_jobs()
+        running = _jobs.get(job["job_id"])
+        if running and running["status"] in ("queued", "running"):
+            raise ValueError(f"Batch job {job['job_id']} is already {running['status']}")
+        _jobs[job["job_id"]] = job
+    return dict(job)
+
+
+def run_batch_job(job_id: str):
+    job = _jobs.get(job_id)
+    if not job:
+        return
+
+    spec = JOB_KINDS[job["kind"]]
+
+    def progress(done, total):
+        job.update({"stage": "generating", "done": done, "total": total})
+
+    job["status"] = "running"
+    try:
+        job["stage"] = "loading"
+        items = spec["build"](job["emails"])
+        print(f"📦 Batch {job['kind']} {job_id} started")
+        job["result"] = run_batch(job_id, spec, items, progress=progress, should_stop=lambda: job["cancel_requested"])
+        job["status"] = "cancelled" if job["cancel_requested"] else "completed"
+        job["stage"] = "done"
+    except Exception as e:
+        print(f"❌ Batch job {job_id} failed:", e)
+        job["status"] = "failed"
+        job["result"] = {"errors": [str(e)]}
+    finally:
+        job["finished_at"] = time.time()
+
+
+def cancel_batch_job(job_id: str) -> bool:
+    """Stop submitting new items; in-flight items finish and are checkpointed."""
+    job = _jobs.get(job_id)
+    if not job or job["status"] not in ("queued", "running"):
+        return False
+    job["cancel_requested"] = True
+    return True
+
+
+def get_batch_job(job_id: str) -> dict | None:
+    job = _jobs.get(job_id)
+    return dict(job) if job else None
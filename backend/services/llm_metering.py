@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import atexit
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import defaultdict, deque
+
+# ============================================================
+# ================ LLM USAGE METERING / COSTS ================
+# ============================================================
+# Every OpenRouter response (streamed or not) is recorded with its token
+# usage, latency and model, tagged with:
+#
+#   call_site   what the call was for: chat_common / chat_work / chat_dual
+#               (main answers), a router task (intent, json_table,
+#               followups, episodic_summary, ...), facts, table_retry
+#   user, project_id
+#
+# Tags live in a ContextVar: chat handlers call tag_usage() once per
+# request, narrower call sites wrap their call in usage_context(). The
+# OpenRouter client captures the tags on the calling thread, because the
+# resilience layer sends requests from its own worker threads.
+#
+# Records are aggregated in memory (for GET /api/llm/usage) and buffered;
+# a background thread flushes the buffer every LLM_USAGE_FLUSH_SECONDS or
+# LLM_USAGE_FLUSH_BATCH records to the sinks: a local JSONL file (opt-in:
+# set LLM_USAGE_LOG to a path; rotated at LLM_USAGE_LOG_MAX_BYTES, keeping
+# LLM_USAGE_LOG_BACKUPS old files) and, when configured, a Supabase table.
+#
+# Costs are estimates from LLM_PRICES (JSON {model: [usd per 1M prompt
+# tokens, usd per 1M completion tokens]}). When a response carries no usage
+# block, tokens are estimated from text length and the record is marked so.
+
+LLM_USAGE_LOG = os.getenv("LLM_USAGE_LOG", "")
+LLM_USAGE_LOG_MAX_BYTES = int(os.getenv("LLM_USAGE_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LLM_USAGE_LOG_BACKUPS = int(os.getenv("LLM_USAGE_LOG_BACKUPS", "3"))
+LLM_USAGE_FLUSH_SECONDS = float(os.getenv("LLM_USAGE_FLUSH_SECONDS", "10"))
+LLM_USAGE_FLUSH_BATCH = int(os.getenv("LLM_USAGE_FLUSH_BATCH", "200"))
+LLM_USAGE_MAX_BUFFER = 10000
+LATENCY_SAMPLES = 500
+
+DEFAULT_PRICES = {
+    "openai/gpt-4o-mini": [0.15, 0.60],
+    "meta-llama/llama-3.1-8b-instruct": [0.02, 0.05]
+}
+
+try:
+    LLM_PRICES = {**DEFAULT_PRICES, **json.loads(os.getenv("LLM_PRICES") or "{}")}
+except ValueError as e:
+    print("⚠ Invalid LLM_PRICES, using defaults:", e)
+    LLM_PRICES = dict(DEFAULT_PRICES)
+
+_usage_tags = contextvars.ContextVar("llm_usage_tags", default={})
+
+
+def tag_usage(**tags):
+    """Tag every LLM call for the rest of the current request / task."""
+    _usage_tags.set({**_usage_tags.get(), **{k: v for k, v in tags.items() if v is not None}})
+
+
+@contextmanager
+def usage_context(**tags):
+    """Tag the LLM calls made inside the block (restores the outer tags after)."""
+    token = _usage_tags.set({**_usage_tags.get(), **{k: v for k, v in tags.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _usage_tags.reset(token)
+
+
+def current_usage_tags() -> dict:
+    return dict(_usage_tags.get())
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prices = LLM_PRICES.get(model)
+    if not prices:
+        return 0.0
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+
+def _percentile(samples, pct: float):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _new_bucket() -> dict:
+    return {"calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "estimated": 0}
+
+
+class UsageMeter:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._sinks = []
+        self._started_at = time.time()
+        self._dropped = 0
+        self._flushed = 0
+        self._flush_errors = 0
+        self._by = {"call_site": defaultdict(_new_bucket), "user": defaultdict(_new_bucket),
+                    "model": defaultdict(_new_bucket), "project": defaultdict(_new_bucket)}
+        self._latency = defaultdict(lambda: deque(maxlen=LATENCY_SAMPLES))   # call_site -> ms
+        self._wake = threading.Event()
+        self._flusher = None
+
+        if LLM_USAGE_LOG:
+            self.add_sink("file", self._write_file)
+
+    # ------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------
+
+    def record(self, model: str, tags: dict, latency_ms: float, usage: dict | None = None,
+               prompt_chars: int = 0, completion_chars: int = 0, ok: bool = True, stream: bool = False,
+               ttft_ms: float | None = None):
+        estimated = ok and not usage
+        if usage:
+            prompt_tokens = int(usage.get("prompt_tokens") or 0)
+            completion_tokens = int(usage.get("completion_tokens") or 0)
+        else:
+            prompt_tokens = (prompt_chars + 3) // 4 if ok else 0
+            completion_tokens = (completion_chars + 3) // 4
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+
+        record = {
+            "ts": round(time.time(), 3),
+            "call_site": tags.get("call_site") or "other",
+            "user": tags.get("user_email"),
+            "project_id": tags.get("project_id"),
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost_usd": round(cost, 8),
+            "latency_ms": round(latency_ms, 1),
+            "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+            "stream": stream,
+            "ok": ok,
+            "estimated": estimated
+        }
+
+        keys = {
+            "call_site": record["call_site"],
+            "user": record["user"] or "anonymous",
+            "model": model,
+            "project": record["project_id"] or "none"
+        }
+        with self._lock:
+            for dimension, key in keys.items():
+                bucket = self._by[dimension][key]
+                bucket["calls"] += 1
+                bucket["errors"] += 0 if ok else 1
+                bucket["prompt_tokens"] += prompt_tokens
+                bucket["completion_tokens"] += completion_tokens
+                bucket["cost_usd"] += cost
+                bucket["estimated"] += 1 if estimated else 0
+            if ok:
+                self._latency[record["call_site"]].append(latency_ms)
+
+            if len(self._buffer) >= LLM_USAGE_MAX_BUFFER:
+                self._buffer.pop(0)
+                self._dropped += 1
+            self._buffer.append(record)
+            full = len(self._buffer) >= LLM_USAGE_FLUSH_BATCH
+
+        self._ensure_flusher()
+        if full:
+            self._wake.set()
+
+    # ------------------------------------------------------------
+    # Flushing
+    # ------------------------------------------------------------
+
+    def add_sink(self, name: str, write):
+        """write(records: list[dict]) -> None; called from the flusher thread."""
+        self._sinks.append((name, write))
+
+    def _write_file(self, records: list):
+        self._rotate_file()
+        with open(LLM_USAGE_LOG, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records))
+
+    def _rotate_file(self):
+        """llm_usage.jsonl -> .1 -> .2 ... once it reaches LLM_USAGE_LOG_MAX_BYTES."""
+        try:
+            if os.path.getsize(LLM_USAGE_LOG) < LLM_USAGE_LOG_MAX_BYTES:
+                return
+        except OSError:
+            return
+        for index in range(LLM_USAGE_LOG_BACKUPS - 1, 0, -1):
+            if os.path.exists(f"{LLM_USAGE_LOG}.{index}"):
+                os.replace(f"{LLM_USAGE_LOG}.{index}", f"{LLM_USAGE_LOG}.{index + 1}")
+        if LLM_USAGE_LOG_BACKUPS > 0:
+            os.replace(LLM_USAGE_LOG, f"{LLM_USAGE_LOG}.1")
+        else:
+            os.remove(LLM_USAGE_LOG)
+
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            with self._lock:
+                if self._flusher is None or not self._flusher.is_alive():
+                    self._flusher = threading.Thread(target=self._flush_loop, name="llm-usage-flush", daemon=True)
+                    self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(LLM_USAGE_FLUSH_SECONDS)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            records, self._buffer = self._buffer, []
+        if not records:
+            return
+        for name, write in self._sinks:
+            try:
+                write(records)
+            except Exception as e:
+                self._flush_errors += 1
+                print(f"⚠ LLM usage flush to {name} failed ({len(records)} records):", e)
+        self._flushed += len(records)
+
+    # ------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------
+
+    def report(self, top: int = 10) -> dict:
+        def rows(dimension):
+            buckets = self._by[dimension]
+            ordered = sorted(buckets.items(), key=lambda kv: (kv[1]["cost_usd"], kv[1]["prompt_tokens"] + kv[1]["completion_tokens"]), reverse=True)
+            return [
+                {dimension: key, **bucket, "cost_usd": round(bucket["cost_usd"], 6),
+                 "total_tokens": bucket["prompt_tokens"] + bucket["completion_tokens"]}
+                for key, bucket in ordered[:top]
+            ]
+
+        with self._lock:
+            call_sites = rows("call_site")
+            for row in call_sites:
+                samples = list(self._latency.get(row["call_site"], ()))
+                row["p50_latency_ms"] = _percentile(samples, 50)
+                row["p95_latency_ms"] = _percentile(samples, 95)
+            report = {
+                "since": self._started_at,
+                "call_sites": call_sites,
+                "top_users": rows("user"),
+                "models": rows("model"),
+                "top_projects": rows("project"),
+                "buffered": len(self._buffer),
+                "flushed": self._flushed,
+                "dropped": self._dropped,
+                "flush_errors": self._flush_errors,
+                "sinks": [name for name, _ in self._sinks],
+                "total_cost_usd": round(sum(b["cost_usd"] for b in self._by["model"].values()), 6)
+            }
+        return report
+
+
+LLM_METER = UsageMeter()
+atexit.register(LLM_METER.flush)
@@ -0,0 +1,294 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# ============================================================
+# ============== UPSTREAM LLM RESILIENCE (OpenRouter) =========
+# ============================================================
+# Wraps a blocking "send one request" function with:
+#
+#   deadline   every call has an overall time budget (LLM_CALL_TIMEOUT_SECONDS);
+#              each HTTP attempt gets the remaining time as its timeout
+#   retries    429 / 5xx / timeouts / connection errors are retried with
+#              full-jitter exponential backoff while the deadline allows
+#   hedging    only for calls that opt in (auxiliary router tasks, never main
+#              answers): if the model has not answered after the p95 latency
+#              observed for that model *and call site*, the same request is
+#              sent again (to the same model unless LLM_HEDGE_MODEL is set)
+#              and the first successful answer wins
+#   breaker    per-model circuit breaker: opens after consecutive failures,
+#              rejects calls while open, then lets a single probe through
+#              (half-open) and closes again on success
+#
+# Failures still end in None for callers, as before, but a hung upstream can
+# no longer hold a worker indefinitely.
+
+LLM_CALL_TIMEOUT_SECONDS = float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", "45"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_MS = int(os.getenv("LLM_RETRY_BASE_MS", "250"))
+LLM_RETRY_MAX_MS = int(os.getenv("LLM_RETRY_MAX_MS", "4000"))
+
+# "" = hedge to the same model; set a model id to hedge to another one
+LLM_HEDGE_MODEL = os.getenv("LLM_HEDGE_MODEL", "")
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "1") == "1"
+LLM_HEDGE_DEFAULT_MS = int(os.getenv("LLM_HEDGE_DEFAULT_MS", "8000"))
+LLM_HEDGE_MIN_MS = int(os.getenv("LLM_HEDGE_MIN_MS", "1500"))
+LLM_HEDGE_MIN_SAMPLES = 20
+
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+LATENCY_SAMPLES = 200
+
+
+class UpstreamError(Exception):
+    """Raised by send functions; status None means timeout / connection error."""
+
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        return self.status is None or self.status in RETRYABLE_STATUS
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, open_seconds: float = LLM_BREAKER_OPEN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.time() - self.opened_at < self.open_seconds:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            # Half-open: one probe at a time
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"🔴 Circuit opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+    def release_probe(self):
+        """A half-open probe ended without a verdict (e.g. non-retryable client error)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = max(0.0, round(self.open_seconds - (time.time() - self.opened_at), 1))
+            return {"state": self.state, "consecutive_failures": self.failures, "retry_in_seconds": retry_in}
+
+
+class ResilientCaller:
+
+    def __init__(self, max_workers: int = 32):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-call")
+        self._lock = threading.Lock()
+        self._breakers = {}   # model -> CircuitBreaker
+        self._latency = {}    # (model, call_site) -> deque of successful call ms
+        self._stats = {
+            "calls": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "timeouts": 0,
+            "circuit_rejections": 0,
+            "hedges": 0,
+            "hedge_wins": 0
+        }
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker()
+            return self._breakers[model]
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def hedge_delay(self, model: str, call_site: str | None = None) -> float:
+        """
+        Seconds to wait before hedging: the p95 of this model at this call
+        site, once enough samples exist. Sites are kept apart so short calls
+        (intent, facts) do not pull down the delay of long ones.
+        """
+        with self._lock:
+            samples = sorted(self._latency.get((model, call_site or "other"), ()))
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_MS / 1000
+        p95 = samples[int(0.95 * (len(samples) - 1))]
+        return max(LLM_HEDGE_MIN_MS, p95) / 1000
+
+    # ------------------------------------------------------------
+    # Calls
+    # ------------------------------------------------------------
+
+    def call(self, model: str, send, timeout: float | None = None, hedge: bool = False, call_site: str | None = None):
+        """
+        send(model, timeout_seconds) performs one request and returns its
+        result, or raises UpstreamError. Returns None when every attempt failed.
+        hedge: allow a hedged second request (auxiliary calls only).
+        call_site: latency samples and the hedge delay are kept per call site.
+        """
+        self._count("calls")
+        deadline = time.monotonic() + (timeout or LLM_CALL_TIMEOUT_SECONDS)
+        hedge_model = (LLM_HEDGE_MODEL or model) if hedge and LLM_HEDGE_ENABLED else None
+        call_site = call_site or "other"
+
+        primary = self._executor.submit(self._attempts, model, send, deadline, call_site)
+        futures = {primary: model}
+        hedged = False
+        remaining = deadline - time.monotonic()
+        first_wait = min(self.hedge_delay(model, call_site), remaining) if hedge_model else remaining
+
+        done, _ = wait(futures, timeout=max(0.0, first_wait))
+        while True:
+            for future in done:
+                used_model = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"⚠ LLM call to {used_model} failed: {e}")
+                    continue
+                if future is not primary:
+                    self._count("hedge_wins")
+                self._count("succeeded")
+                return result
+
+            remaining = deadline - time.monotonic()
+            # Hedge when the primary is slow, or fall back to it when the primary failed
+            if hedge_model and not hedged and remaining > 0 and self.breaker(hedge_model).snapshot()["state"] != CircuitBreaker.OPEN:
+                hedged = True
+                self._count("hedges")
+                print(f"🪁 Hedging LLM request: {model} -> {hedge_model}")
+                futures[self._executor.submit(self._attempts, hedge_model, send, deadline, call_site)] = hedge_model
+
+            if not futures or remaining <= 0:
+                break
+            done, _ = wait(futures, timeout=remaining, return_when=FIRST_COMPLETED)
+
+        if futures:
+            # Abandoned attempts finish on their own once their HTTP timeout expires
+            self._count("timeouts")
+            print(f"⏱ LLM call to {model} exceeded its deadline")
+        self._count("failed")
+        return None
+
+    def _attempts(self, model: str, send, deadline: float, call_site: str = "other"):
+        breaker = self.breaker(model)
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                self._count("circuit_rejections")
+                raise CircuitOpenError(f"circuit open for {model}")
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                breaker.release_probe()
+                raise UpstreamError("deadline exceeded")
+
+            started = time.perf_counter()
+            try:
+                result = send(model, remaining)
+            except UpstreamError as e:
+                if not e.retryable:
+                    breaker.release_probe()
+                    raise
+                breaker.record_failure()
+                attempt += 1
+                backoff = random.uniform(0, min(LLM_RETRY_MAX_MS, LLM_RETRY_BASE_MS * 2 ** attempt)) / 1000
+                if attempt > LLM_MAX_RETRIES or time.monotonic() + backoff >= deadline:
+                    raise
+                self._count("retries")
+                print(f"↻ Retrying {model} in {backoff:.2f}s ({e})")
+                time.sleep(backoff)
+                continue
+            except Exception:
+                breaker.release_probe()
+                raise
+
+            breaker.record_success()
+            with self._lock:
+                self._latency.setdefault((model, call_site), deque(maxlen=LATENCY_SAMPLES)).append(
+                    (time.perf_counter() - started) * 1000
+                )
+            return result
+
+    # ------------------------------------------------------------
+    # Health
+    # ------------------------------------------------------------
+
+    def health(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            models = list(self._breakers)
+            latency = {key: sorted(samples) for key, samples in self._latency.items()}
+
+        breakers = {}
+        for model in models:
+            sites = {}
+            for (sample_model, call_site), samples in latency.items():
+                if sample_model != model or not samples:
+                    continue
+                sites[call_site] = {
+                    "latency_ms_p50": round(samples[len(samples) // 2], 1),
+                    "latency_ms_p95": round(samples[int(0.95 * (len(samples) - 1))], 1),
+                    "hedge_after_ms": round(self.hedge_delay(model, call_site) * 1000)
+                }
+            breakers[model] = {**self.breaker(model).snapshot(), "call_sites": sites}
+
+        open_count = sum(1 for b in breakers.values() if b["state"] != CircuitBreaker.CLOSED)
+        return {
+            "status": "degraded" if open_count else "ok",
+            "hedging": (LLM_HEDGE_MODEL or "same model") if LLM_HEDGE_ENABLED else None,
+            "timeout_seconds": LLM_CALL_TIMEOUT_SECONDS,
+            "max_retries": LLM_MAX_RETRIES,
+            **stats,
+            "models": breakers
+        }
+
+
+LLM_RESILIENCE = ResilientCaller()
@@ -0,0 +1,179 @@
+import time
+import uuid
+import threading
+from datetime import datetime, timezone
+from core import supabase, USER_LLM_CACHE
+
+# ============================================================
+# ========== USER LLM SETTINGS RECONCILIATION (sync) =========
+# ============================================================
+# Set-based replacement for the per-user "exists? then insert" loop:
+#   1. page through user_profiles and user_llm_settings ids
+#   2. diff the two sets in memory
+#   3. bulk upsert the missing default rows in chunks
+
+PAGE_SIZE = 1000
+UPSERT_CHUNK_SIZE = 500
+JOB_RETENTION_SECONDS = 3600
+
+DEFAULT_LLM_MODEL = "openai/gpt-4o-mini"
+DEFAULT_LLM_PROVIDER = "openai"
+
+_jobs_lock = threading.Lock()
+_jobs = {}  # job_id -> job status dict
+
+
+def _fetch_paged(table: str, columns: str) -> list:
+    rows = []
+    start = 0
+    while True:
+        res = (
+            supabase
+            .table(table)
+            .select(columns)
+            .range(start, start + PAGE_SIZE - 1)
+            .execute()
+        )
+        page = res.data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+def _default_settings(uid) -> dict:
+    return {
+        "user_id": uid,
+        "llm_model": DEFAULT_LLM_MODEL,
+        "provider": DEFAULT_LLM_PROVIDER,
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+
+
+def reconcile_llm_settings(dry_run: bool = False, progress=None) -> dict:
+    """
+    Create default user_llm_settings rows for every user_profiles user that
+    has none. Existing settings are never overwritten.
+
+    progress: optional callable(stage: str, done: int, total: int)
+    """
+    def report(stage, done, total):
+        if progress:
+            progress(stage, done, total)
+
+    report("loading", 0, 0)
+    users = _fetch_paged("user_profiles", "user_id, email")
+    existing = {
+        str(r.get("user_id"))
+        for r in _fetch_paged("user_llm_settings", "user_id")
+        if r.get("user_id") is not None
+    }
+
+    missing = []
+    seen = set()
+    for u in users:
+        uid = u.get("user_id")
+        if not uid or not u.get("email"):
+            continue
+        if str(uid) in existing or str(uid) in seen:
+            continue
+        seen.add(str(uid))
+        missing.append(u)
+
+    report("diffed", 0, len(missing))
+
+    synced_count = 0
+    errors = []
+
+    if not dry_run:
+        for start in range(0, len(missing), UPSERT_CHUNK_SIZE):
+            chunk = missing[start:start + UPSERT_CHUNK_SIZE]
+            try:
+                supabase.table("user_llm_settings") \
+                    .upsert(
+                        [_default_settings(u["user_id"]) for u in chunk],
+                        on_conflict="user_id",
+                        ignore_duplicates=True
+                    ) \
+                    .execute()
+                synced_count += len(chunk)
+            except Exception as e:
+                errors.extend(f"Failed to sync {u.get('email')}: {str(e)}" for u in chunk)
+
+            report("upserting", start + len(chunk), len(missing))
+
+    if synced_count:
+        # Cached "no settings yet" defaults for these users are now stale
+        USER_LLM_CACHE.invalidate()
+
+    report("done", len(missing), len(missing))
+
+    if dry_run:
+        message = f"Dry run: {len(missing)} users would be synced."
+    else:
+        message = f"Synced {synced_count} new users."
+
+    return {
+        "message": message,
+        "total_checked": len(users),
+        "missing": len(missing),
+        "synced": synced_count,
+        "dry_run": dry_run,
+        "missing_emails": [u.get("email") for u in missing] if dry_run else [],
+        "errors": errors
+    }
+
+
+# ------------------------------------------------------------
+# Background job wrapper
+# ------------------------------------------------------------
+
+def _prune_jobs():
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    for job_id in [j for j, job in _jobs.items() if job.get("finished_at") and job["finished_at"] < cutoff]:
+        _jobs.pop(job_id, None)
+
+
+def create_sync_job(dry_run: bool = False, requested_by: str | None = None) -> dict:
+    """Register a pending job; run it with run_sync_job(job_id)."""
+    job = {
+        "job_id": str(uuid.uuid4()),
+        "status": "queued",
+        "stage": "queued",
+        "done": 0,
+        "total": 0,
+        "dry_run": dry_run,
+        "requested_by": requested_by,
+        "created_at": time.time(),
+        "finished_at": None,
+        "result": None
+    }
+    with _jobs_lock:
+        _prune_jobs()
+        _jobs[job["job_id"]] = job
+    return dict(job)
+
+
+def run_sync_job(job_id: str):
+    job = _jobs.get(job_id)
+    if not job:
+        return
+
+    def progress(stage, done, total):
+        job.update({"stage": stage, "done": done, "total": total})
+
+    job["status"] = "running"
+    try:
+        job["result"] = reconcile_llm_settings(dry_run=job["dry_run"], progress=progress)
+        job["status"] = "completed"
+    except Exception as e:
+        print("❌ LLM settings sync job failed:", e)
+        job["status"] = "failed"
+        job["result"] = {"errors": [str(e)]}
+    finally:
+        job["finished_at"] = time.time()
+
+
+def get_sync_job(job_id: str) -> dict | None:
+    job = _jobs.get(job_id)
+    return dict(job) if job else None
@@ -0,0 +1,277 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from services.context_budget import count_tokens, fit_messages
+
+# ============================================================
+# ============ TASK-AWARE ROUTING FOR AUXILIARY LLM CALLS =====
+# ============================================================
+# Auxiliary calls (intent classification, JSON-table forcing, follow-up
+# suggestions, episodic summaries, clarifications, user fact extraction)
+# name a *task*. Each task maps to a *tier* with:
+#
+#   models              fallback chain, tried in order; "$user" = the user's chat model
+#   max_tokens          completion token cap for the task
+#   max_prompt_tokens   prompt size cap; longer prompts are cut before the call
+#                       (longest messages first, services/context_budget.py)
+#   latency_budget_ms   deadline for each call; the fallback chain stops once it is spent
+#   max_concurrency     in-flight calls allowed for the tier
+#   queue_timeout_ms    how long a call waits for a slot before it is skipped
+#
+# Each tier has its own concurrency cap, so a burst of auxiliary calls waits
+# (or is skipped) inside its tier instead of piling up in front of the main
+# answer path, which is not routed here.
+#
+# call() blocks its thread while it waits for a slot and for the model, so
+# the async chat handlers run routed calls (and the helpers that make them,
+# e.g. save_chat_message for episodic summaries) through asyncio.to_thread.
+#
+# Configuration comes from MODEL_ROUTER_CONFIG (JSON, same shape as
+# DEFAULT_ROUTER_CONFIG; missing keys keep their defaults) and is reloaded
+# when the file changes.
+
+MODEL_ROUTER_CONFIG = os.getenv("MODEL_ROUTER_CONFIG", "model_router.json")
+MODEL_ROUTER_RELOAD_SECONDS = float(os.getenv("MODEL_ROUTER_RELOAD_SECONDS", "5"))
+USER_MODEL = "$user"
+
+DEFAULT_ROUTER_CONFIG = {
+    "default_tier": "user",
+    "tiers": {
+        "fast": {
+            "models": ["openai/gpt-4o-mini", "meta-llama/llama-3.1-8b-instruct"],
+            "max_tokens": 400,
+            "max_prompt_tokens": 4000,
+            "latency_budget_ms": 8000,
+            "max_concurrency": 4,
+            "queue_timeout_ms": 2000
+        },
+        "user": {
+            "models": [USER_MODEL, "openai/gpt-4o-mini"],
+            "max_tokens": 1500,
+            "max_prompt_tokens": 16000,
+            "latency_budget_ms": 30000,
+            "max_concurrency": 8,
+            "queue_timeout_ms": 10000
+        },
+        # Offline jobs (services/llm_batch.py): own slots, long waits
+        "batch": {
+            "models": ["openai/gpt-4o-mini", "meta-llama/llama-3.1-8b-instruct"],
+            "max_tokens": 600,
+            "max_prompt_tokens": 8000,
+            "latency_budget_ms": 120000,
+            "max_concurrency": 2,
+            "queue_timeout_ms": 600000
+        }
+    },
+    "tasks": {
+        "intent": "fast",
+        "json_table": "fast",
+        "followups": "fast",
+        "episodic_summary": "fast",
+        "clarification": "fast",
+        "facts": "fast",
+        "batch_episodic_summary": "batch",
+        "batch_facts": "batch"
+    }
+}
+
+LATENCY_SAMPLES = 200
+
+
+def _estimate_tokens(chars: int) -> int:
+    return (chars + 3) // 4
+
+
+def _percentile(samples, pct: float):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 1)
+
+
+class ModelRouter:
+
+    def __init__(self, config_path: str = MODEL_ROUTER_CONFIG):
+        self.config_path = config_path
+        self._lock = threading.Lock()
+        self._config = None
+        self._config_mtime = None
+        self._loaded_at = None
+        self._last_check = 0.0
+        self._slots = {}     # tier -> (max_concurrency, BoundedSemaphore)
+        self._stats = {}     # task -> counters
+        self._latency = {}   # task -> deque of ms
+        self._load()
+
+    # ------------------------------------------------------------
+    # Configuration
+    # ------------------------------------------------------------
+
+    def _load(self):
+        config = json.loads(json.dumps(DEFAULT_ROUTER_CONFIG))
+        mtime = None
+
+        if self.config_path and os.path.exists(self.config_path):
+            try:
+                mtime = os.path.getmtime(self.config_path)
+                with open(self.config_path, "r") as f:
+                    override = json.load(f)
+                for name, tier in (override.get("tiers") or {}).items():
+                    config["tiers"].setdefault(name, {}).update(tier)
+                config["tasks"].update(override.get("tasks") or {})
+                if override.get("default_tier"):
+                    config["default_tier"] = override["default_tier"]
+                print(f"🔀 Model router config loaded from {self.config_path}")
+            except Exception as e:
+                print(f"⚠ Invalid model router config {self.config_path}, keeping previous: {e}")
+                if self._config is not None:
+                    self._config_mtime = mtime
+                    return
+
+        with self._lock:
+            self._config = config
+            self._config_mtime = mtime
+            self._loaded_at = time.time()
+            for name, tier in config["tiers"].items():
+                limit = max(1, int(tier.get("max_concurrency", 4)))
+                current = self._slots.get(name)
+                # In-flight calls release the semaphore they acquired, so swapping is safe
+                if current is None or current[0] != limit:
+                    self._slots[name] = (limit, threading.BoundedSemaphore(limit))
+
+    def _maybe_reload(self):
+        now = time.time()
+        if now - self._last_check < MODEL_ROUTER_RELOAD_SECONDS:
+            return
+        self._last_check = now
+        try:
+            mtime = os.path.getmtime(self.config_path) if self.config_path and os.path.exists(self.config_path) else None
+        except OSError:
+            mtime = None
+        if mtime != self._config_mtime:
+            self._load()
+
+    def reload(self):
+        self._load()
+
+    def tier_for(self, task: str) -> tuple[str, dict]:
+        self._maybe_reload()
+        config = self._config
+        name = config["tasks"].get(task, config["default_tier"])
+        if name not in config["tiers"]:
+            name = config["default_tier"]
+        return name, config["tiers"][name]
+
+    # ------------------------------------------------------------
+    # Calls
+    # ------------------------------------------------------------
+
+    def call(self, task: str, call_fn, messages: list, user_model=None, max_tokens: int | None = None):
+        """
+        Run call_fn(model, max_tokens, timeout_seconds, messages) for the
+        task's tier, walking the fallback chain until a call returns a
+        non-empty result. messages are cut to the tier's max_prompt_tokens.
+        user_model: the user's chat model, or a callable resolving it lazily.
+        Returns None if every model failed or no slot was free in time.
+        """
+        tier_name, tier = self.tier_for(task)
+        tier_tokens = tier.get("max_tokens")
+        tokens = min(max_tokens, tier_tokens) if max_tokens and tier_tokens else (max_tokens or tier_tokens or 1500)
+        budget_ms = tier.get("latency_budget_ms", 30000)
+
+        self._count(task, "calls")
+        max_prompt_tokens = tier.get("max_prompt_tokens")
+        if max_prompt_tokens:
+            messages, before, prompt_tokens = fit_messages(messages, max_prompt_tokens)
+            if prompt_tokens < before:
+                print(f"✂ Model router: {task} prompt cut from {before} to {prompt_tokens} tokens")
+                self._count(task, "prompts_truncated")
+        else:
+            prompt_tokens = sum(count_tokens(m.get("content")) for m in messages or [])
+        self._count(task, "prompt_tokens", prompt_tokens)
+
+        _, slots = self._slots[tier_name]
+        if not slots.acquire(timeout=tier.get("queue_timeout_ms", 10000) / 1000):
+            print(f"⚠ Model router: tier '{tier_name}' saturated, skipping {task}")
+            self._count(task, "rejected")
+            return None
+
+        started = time.perf_counter()
+        try:
+            for index, model in enumerate(self._models(tier, user_model)):
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if index and elapsed_ms > budget_ms:
+                    break
+                if index:
+                    self._count(task, "fallbacks")
+
+                remaining_s = max(1.0, (budget_ms - elapsed_ms) / 1000)
+                result = call_fn(model, tokens, remaining_s, messages)
+                if result:
+                    self._count(task, "ok")
+                    self._count(task, "completion_tokens_est", _estimate_tokens(len(str(result))))
+                    self._count_model(task, model)
+                    return result
+
+            self._count(task, "failed")
+            return None
+        finally:
+            slots.release()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if elapsed_ms > budget_ms:
+                self._count(task, "over_latency_budget")
+            with self._lock:
+                self._latency.setdefault(task, deque(maxlen=LATENCY_SAMPLES)).append(elapsed_ms)
+
+    def _models(self, tier: dict, user_model) -> list:
+        models = []
+        for model in tier.get("models") or []:
+            if model == USER_MODEL:
+                if callable(user_model):
+                    try:
+                        user_model = user_model()
+                    except Exception as e:
+                        print("⚠ Model router: could not resolve user model:", e)
+                        user_model = None
+                model = user_model
+            if model and model not in models:
+                models.append(model)
+        return models or ["openai/gpt-4o-mini"]
+
+    # ------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------
+
+    def _count(self, task: str, name: str, amount: int = 1):
+        with self._lock:
+            stats = self._stats.setdefault(task, {"models": {}})
+            stats[name] = stats.get(name, 0) + amount
+
+    def _count_model(self, task: str, model: str):
+        with self._lock:
+            models = self._stats.setdefault(task, {"models": {}})["models"]
+            models[model] = models.get(model, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            tasks = {}
+            for task, stats in self._stats.items():
+                samples = list(self._latency.get(task, ()))
+                tasks[task] = {
+                    **stats,
+                    "models": dict(stats["models"]),
+                    "latency_ms_p50": _percentile(samples, 50),
+                    "latency_ms_p95": _percentile(samples, 95)
+                }
+            return {
+                "config_path": self.config_path,
+                "config_loaded_at": self._loaded_at,
+                "config": self._config,
+                "tasks": tasks
+            }
+
+
+MODEL_ROUTER = ModelRouter()
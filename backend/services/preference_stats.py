@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from core import supabase
+
+# ============================================================
+# ============== USER RESPONSE-STYLE PREFERENCES =============
+# ============================================================
+# Per-user thumbs-up/down tallies by response_category, kept in memory.
+# Each user is loaded with one scan of user_memorys on first use; after that
+# every vote (including flipping or clearing a previous vote) is an O(1) delta.
+#
+# The cache is an LRU of at most PREFERENCE_STATS_MAX_USERS users. An entry
+# older than PREFERENCE_STATS_TTL_SECONDS is reloaded from Supabase on its
+# next use, which also picks up votes recorded by other workers.
+
+CATEGORIES = ("short", "medium", "long")
+PREFERENCE_STATS_MAX_USERS = int(os.getenv("PREFERENCE_STATS_MAX_USERS", "5000"))
+PREFERENCE_STATS_TTL_SECONDS = float(os.getenv("PREFERENCE_STATS_TTL_SECONDS", "900"))
+
+_lock = threading.Lock()
+_users = OrderedDict()   # user_id -> {"stats": {category: n}, "votes": {message_id: (category, feedback)}, "loaded_at": ts}
+
+
+def _vote_value(feedback) -> int:
+    if feedback is True:
+        return 1
+    if feedback is False:
+        return -1
+    return 0
+
+
+def _load_user(user_id):
+    """Build the tallies for one user from user_memorys (one query)."""
+    res = supabase.table("user_memorys") \
+        .select("id, response_category, context_feedback") \
+        .eq("user_id", user_id) \
+        .not_.is_("context_feedback", None) \
+        .execute()
+
+    stats = {c: 0 for c in CATEGORIES}
+    votes = {}
+
+    for row in res.data or []:
+        category = row.get("response_category")
+        feedback = row.get("context_feedback")
+        if category not in stats:
+            continue
+        stats[category] += _vote_value(feedback)
+        votes[str(row.get("id"))] = (category, feedback)
+
+    return stats, votes
+
+
+def _entry(user_id) -> dict:
+    """The user's cache entry (caller holds no lock), loading it on a miss or after the TTL."""
+    key = str(user_id)
+    now = time.time()
+
+    with _lock:
+        entry = _users.get(key)
+        if entry is not None and now - entry["loaded_at"] < PREFERENCE_STATS_TTL_SECONDS:
+            _users.move_to_end(key)
+            return entry
+
+    stats, votes = _load_user(user_id)
+
+    with _lock:
+        entry = _users.get(key)
+        # Another thread may have reloaded it meanwhile
+        if entry is None or entry["loaded_at"] < now:
+            entry = {"stats": stats, "votes": votes, "loaded_at": time.time()}
+            _users[key] = entry
+        _users.move_to_end(key)
+        while len(_users) > PREFERENCE_STATS_MAX_USERS:
+            _users.popitem(last=False)
+        return entry
+
+
+def apply_feedback(user_id, message_id, category, feedback) -> dict:
+    """
+    Record a vote on an assistant message.
+    A previous vote on the same message is reversed before the new one is applied.
+    """
+    entry = _entry(user_id)
+
+    with _lock:
+        stats = entry["stats"]
+        votes = entry["votes"]
+        message_key = str(message_id)
+
+        old = votes.pop(message_key, None)
+        if old and old[0] in stats:
+            stats[old[0]] -= _vote_value(old[1])
+
+        if category in stats and feedback is not None:
+            stats[category] += _vote_value(feedback)
+            votes[message_key] = (category, feedback)
+
+        return dict(stats)
+
+
+def get_summary(user_id) -> dict:
+    """Same shape as core.get_user_preference_summary, without the scan."""
+    entry = _entry(user_id)
+    with _lock:
+        stats = dict(entry["stats"])
+
+    return {
+        "stats": stats,
+        "preferred_style": max(stats, key=stats.get)
+    }
+
+
+def get_preferred_style(user_id, default: str = "medium") -> str:
+    """Preferred response length for prompt building ("short" | "medium" | "long")."""
+    if not user_id:
+        return default
+    try:
+        return get_summary(user_id)["preferred_style"]
+    except Exception as e:
+        print("⚠ get_preferred_style error:", e)
+        return default
+
+
+def forget_user(user_id):
+    """Drop a user's tallies so the next read reloads them from Supabase."""
+    with _lock:
+        _users.pop(str(user_id), None)
@@ -0,0 +1,83 @@
+import os
+from utils.kv_store import build_store
+
+# ============================================================
+# ================ CHAT CONVERSATION SESSIONS ================
+# ============================================================
+# Per-conversation state for the work / dual chats (e.g. the pending
+# self-asking clarification, session["multi_clarification"]).
+# Previously a dict hung off the handler function; now it lives in a
+# bounded store (LRU + TTL in memory, or SQLite / Redis via
+# SESSION_STORE_BACKEND so all workers see the same sessions).
+
+CHAT_SESSION_TTL_SECONDS = int(os.getenv("CHAT_SESSION_TTL_SECONDS", str(6 * 3600)))
+CHAT_SESSION_MAX_ENTRIES = int(os.getenv("CHAT_SESSION_MAX_ENTRIES", "20000"))
+CHAT_SESSION_MAX_BYTES = int(os.getenv("CHAT_SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+
+_store = build_store(
+    "chat_sessions",
+    backend=os.getenv("SESSION_STORE_BACKEND"),
+    default_ttl=CHAT_SESSION_TTL_SECONDS,
+    max_entries=CHAT_SESSION_MAX_ENTRIES,
+    max_bytes=CHAT_SESSION_MAX_BYTES
+)
+
+
+class ChatSessionState(dict):
+    """
+    A plain dict for callers (session.get / session[...] = ...), written back
+    to the store on every mutation so other workers see the change.
+    """
+
+    def __init__(self, key: str, data: dict | None = None):
+        super().__init__(data or {})
+        self.key = key
+
+    def _save(self):
+        if self:
+            _store.set(self.key, dict(self))
+        else:
+            _store.delete(self.key)
+
+    def __setitem__(self, name, value):
+        super().__setitem__(name, value)
+        self._save()
+
+    def __delitem__(self, name):
+        super().__delitem__(name)
+        self._save()
+
+    def pop(self, name, *default):
+        value = super().pop(name, *default)
+        self._save()
+        return value
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._save()
+
+    def setdefault(self, name, default=None):
+        if name not in self:
+            self[name] = default
+        return self[name]
+
+    def clear(self):
+        super().clear()
+        self._save()
+
+
+def session_key(chat_type: str, user_email: str, project_id, chat_id) -> str:
+    return f"{chat_type}:{user_email}_{project_id}_{chat_id}"
+
+
+def get_session(chat_type: str, user_email: str, project_id, chat_id) -> ChatSessionState:
+    key = session_key(chat_type, user_email, project_id, chat_id)
+    return ChatSessionState(key, _store.get(key))
+
+
+def clear_session(chat_type: str, user_email: str, project_id, chat_id):
+    _store.delete(session_key(chat_type, user_email, project_id, chat_id))
+
+
+def get_session_store_stats() -> dict:
+    return _store.stats()
@@ -0,0 +1,81 @@
+import os
+import json
+import asyncio
+import contextlib
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from services.ws_utils import iter_frames, coalesce_frames
+
+# ============================================================
+# ============ SERVER-SENT EVENTS FOR HTTP CLIENTS ===========
+# ============================================================
+# Streams the same frames as the chat websockets (token / meta / done) as
+# SSE events: `event: <frame type>` + `data: <frame json>`.
+# A `: ping` comment is sent when no frame was produced for
+# SSE_HEARTBEAT_SECONDS, which also detects disconnected clients; on
+# disconnect the upstream LLM stream is closed.
+
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+
+def format_sse(frame: dict) -> str:
+    data = json.dumps(frame, default=str)
+    return f"event: {frame.get('type', 'message')}\ndata: {data}\n\n"
+
+
+async def sse_events(request: Request, stream):
+    frames = coalesce_frames(iter_frames(stream))
+    pending = None
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(frames.__anext__())
+
+            done, _ = await asyncio.wait({pending}, timeout=SSE_HEARTBEAT_SECONDS)
+
+            if not done:
+                if await request.is_disconnected():
+                    print("🔌 SSE client disconnected")
+                    return
+                yield ": ping\n\n"
+                continue
+
+            try:
+                frame = pending.result()
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                print("❌ SSE stream error:", e)
+                yield format_sse({
+                    "type": "error",
+                    "message": "Something went wrong while processing your request."
+                })
+                return
+            finally:
+                pending = None
+
+            yield format_sse(frame)
+
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            with contextlib.suppress(BaseException):
+                await pending
+        with contextlib.suppress(Exception):
+            await frames.aclose()
+        if hasattr(stream, "aclose"):
+            with contextlib.suppress(Exception):
+                await stream.aclose()
+
+
+def sse_response(request: Request, stream) -> StreamingResponse:
+    return StreamingResponse(
+        sse_events(request, stream),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
@@ -0,0 +1,302 @@
+import os
+import re
+import asyncio
+import json
+import hashlib
+import threading
+from difflib import SequenceMatcher
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from core import call_llm_for_task
+from validators import extract_tech_stack_from_project
+from utils.kv_store import MemoryStore
+
+# ============================================================
+# ============ SPECULATIVE FOLLOW-UP SUGGESTIONS =============
+# ============================================================
+# "You Might Also Ask" suggestions for the meta frame, ready when the answer
+# finishes instead of after another LLM round trip:
+#
+#   start_suggestions()   called before the answer is generated. Builds the
+#                         project's question templates (cached per project)
+#                         and, when the answer will not carry suggestions of
+#                         its own (tables) and there is no project snapshot,
+#                         starts a speculative LLM call from the query alone.
+#   job.resolve(answer)   called when the answer is complete (from a worker
+#                         thread; async handlers use job.resolve_async):
+#                           1. the answer's own "You Might Also Ask" lines,
+#                              if the model wrote them (no extra cost)
+#                           2. else the speculative LLM result, if ready
+#                           3. topped up with templates, ranked by the
+#                              topics the answer touched but the user did
+#                              not ask about
+#
+# Templates are built only from project rows the caller already loaded
+# through its access checks; the engine never fetches projects itself.
+#
+# SUGGESTIONS_LLM_MODE: "off" | "fallback" (speculate only for answers
+# without inline suggestions and without a project snapshot) | "always".
+
+SUGGESTIONS_COUNT = int(os.getenv("SUGGESTIONS_COUNT", "3"))
+SUGGESTIONS_LLM_MODE = os.getenv("SUGGESTIONS_LLM_MODE", "fallback")
+SUGGESTIONS_WAIT_SECONDS = float(os.getenv("SUGGESTIONS_WAIT_SECONDS", "1.0"))
+SUGGESTIONS_TEMPLATE_TTL_SECONDS = int(os.getenv("SUGGESTIONS_TEMPLATE_TTL_SECONDS", "900"))
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("SUGGESTIONS_WORKERS", "4")), thread_name_prefix="suggestions")
+_template_cache = MemoryStore(max_entries=2000, max_bytes=4 * 1024 * 1024, default_ttl=SUGGESTIONS_TEMPLATE_TTL_SECONDS)
+
+_stats_lock = threading.Lock()
+_stats = {
+    "jobs": 0,
+    "inline": 0,            # answer already carried suggestions
+    "speculative_llm": 0,   # speculative LLM calls started
+    "llm_used": 0,
+    "llm_timeouts": 0,
+    "llm_cancelled": 0,     # not needed, dropped before it started
+    "llm_abandoned": 0,     # not needed (or too late), left running; result ignored
+    "templates_only": 0,
+    "template_builds": 0
+}
+
+TOPIC_KEYWORDS = {
+    "status": ("status", "progress", "update", "on track", "health"),
+    "timeline": ("deadline", "timeline", "due", "end date", "schedule", "milestone", "when"),
+    "team": ("team", "member", "who", "assigned", "leader", "lead", "owner"),
+    "tech": ("tech", "stack", "framework", "language", "architecture", "library", "tool"),
+    "client": ("client", "customer", "scope", "requirement", "stakeholder"),
+    "tasks": ("task", "todo", "blocker", "blocked", "pending", "open item", "backlog")
+}
+
+GENERIC_TEMPLATES = [
+    {"topic": "status", "question": "What's the project status?"},
+    {"topic": "team", "question": "Who's working on this?"},
+    {"topic": "timeline", "question": "What's the timeline?"},
+    {"topic": "tasks", "question": "Are there any blockers?"},
+    {"topic": "tech", "question": "What's the tech stack?"}
+]
+
+
+def _bump(key: str, by: int = 1):
+    with _stats_lock:
+        _stats[key] += by
+
+
+# ============================================================
+# ===================== PROJECT TEMPLATES ====================
+# ============================================================
+
+def build_project_templates(project: dict) -> list[dict]:
+    name = project.get("project_name") or "this project"
+    status = (project.get("status") or "").strip()
+    end_date = project.get("end_date")
+    leader = project.get("leader_of_project")
+    client = project.get("client_name")
+    tech = extract_tech_stack_from_project(project)
+
+    templates = []
+    if status and status.lower() in ("completed", "done", "closed"):
+        templates.append({"topic": "status", "question": f"What was delivered in {name}?"})
+    else:
+        templates.append({"topic": "status", "question": f"What is the current status of {name}?"})
+    if end_date:
+        templates.append({"topic": "timeline", "question": f"Is {name} on track for {end_date}?"})
+    else:
+        templates.append({"topic": "timeline", "question": f"What is the timeline for {name}?"})
+    if leader:
+        templates.append({"topic": "team", "question": f"What is {leader} working on in {name}?"})
+    templates.append({"topic": "team", "question": f"Who is assigned to {name}?"})
+    templates.append({"topic": "tasks", "question": f"What are the open tasks in {name}?"})
+    if tech:
+        templates.append({"topic": "tech", "question": f"How is {tech[0]} used in {name}?"})
+    else:
+        templates.append({"topic": "tech", "question": f"What tech stack does {name} use?"})
+    if client:
+        templates.append({"topic": "client", "question": f"What does {client} expect from {name}?"})
+    return templates
+
+
+def _fingerprint(project: dict) -> str:
+    fields = ("project_name", "status", "end_date", "leader_of_project", "client_name", "tech_stack", "tech_stack_custom")
+    raw = json.dumps([project.get(f) for f in fields], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def project_templates(project_id: str | None, project_data: dict | None) -> list[dict]:
+    """Templates for an access-checked project row, cached per project."""
+    if not project_data:
+        return GENERIC_TEMPLATES
+    key = f"suggest:{project_id or project_data.get('id')}"
+    fingerprint = _fingerprint(project_data)
+    cached = _template_cache.get(key)
+    if cached and cached.get("fingerprint") == fingerprint:
+        return cached["templates"]
+
+    templates = build_project_templates(project_data)
+    _template_cache.set(key, {"fingerprint": fingerprint, "templates": templates})
+    _bump("template_builds")
+    return templates
+
+
+# ============================================================
+# ========================= RANKING ==========================
+# ============================================================
+
+def _topics(text: str) -> set:
+    lowered = (text or "").lower()
+    return {topic for topic, words in TOPIC_KEYWORDS.items() if any(w in lowered for w in words)}
+
+
+def _similar(a: str, b: str) -> bool:
+    return SequenceMatcher(None, a.lower(), b.lower()).ratio() > 0.8
+
+
+def rank_templates(templates: list[dict], user_query: str, answer: str = "") -> list[str]:
+    asked = _topics(user_query)
+    touched = _topics(answer) - asked
+
+    def score(indexed):
+        index, template = indexed
+        topic = template["topic"]
+        # Prefer what the answer brought up, then untouched topics, then what was asked
+        weight = 0 if topic in touched else 2 if topic in asked else 1
+        return (weight, index)
+
+    return [t["question"] for _, t in sorted(enumerate(templates), key=score)]
+
+
+def extract_inline_suggestions(answer: str) -> list[str]:
+    parts = re.split(r"You Might Also Ask\s*[:\-]\s*", answer or "", flags=re.IGNORECASE)
+    if len(parts) < 2:
+        return []
+    suggestions = []
+    for line in parts[1].split("\n"):
+        line = line.strip()
+        if line.startswith(("-", "•", "*")):
+            suggestions.append(line[1:].strip())
+        elif re.match(r"^\d+\.", line):
+            suggestions.append(line.split(".", 1)[1].strip())
+    return suggestions
+
+
+def _merge(groups: list[list[str]], user_query: str, limit: int) -> list[str]:
+    merged = []
+    for group in groups:
+        for question in group:
+            question = (question or "").strip()
+            if len(question) <= 5 or _similar(question, user_query or ""):
+                continue
+            if any(_similar(question, kept) for kept in merged):
+                continue
+            merged.append(question)
+            if len(merged) == limit:
+                return merged
+    return merged
+
+
+# ============================================================
+# ======================= SPECULATION ========================
+# ============================================================
+
+def _speculate(user_query: str, project_data: dict | None, user_email: str | None) -> list[str]:
+    snapshot = ""
+    if project_data:
+        snapshot = (
+            f"\nProject: {project_data.get('project_name', 'N/A')}, "
+            f"status {project_data.get('status', 'N/A')}, "
+            f"ends {project_data.get('end_date', 'N/A')}"
+        )
+    response = call_llm_for_task("followups", [
+        {"role": "system", "content": "You suggest contextual follow-up questions. Reply ONLY with a valid JSON array of strings."},
+        {"role": "user", "content": (
+            f'User asked: "{user_query}"{snapshot}\n\n'
+            "Suggest 3 short follow-up questions (under 10 words each) the user is likely to ask "
+            "after getting an answer. Return ONLY a JSON array of strings."
+        )}
+    ], user_email=user_email, temperature=0.7, max_tokens=150, dedupe=True)
+
+    match = re.search(r"\[.*\]", response or "", re.DOTALL)
+    if not match:
+        return []
+    suggestions = json.loads(match.group(0))
+    return [s for s in suggestions if isinstance(s, str)] if isinstance(suggestions, list) else []
+
+
+class SuggestionJob:
+
+    def __init__(self, user_query: str, project_id: str | None, project_data: dict | None, user_email: str | None, speculate: bool):
+        self.user_query = user_query or ""
+        self.templates = project_templates(project_id, project_data)
+        self._future = None
+        if speculate:
+            _bump("speculative_llm")
+            self._future = _executor.submit(_speculate, self.user_query, project_data, user_email)
+
+    def resolve(self, answer: str, inline: list[str] | None = None, wait: float = SUGGESTIONS_WAIT_SECONDS) -> list[str]:
+        inline = extract_inline_suggestions(answer) if inline is None else inline
+        inline = _merge([inline], self.user_query, SUGGESTIONS_COUNT)
+        if len(inline) >= 2:
+            _bump("inline")
+            self._cancel()
+            return inline
+
+        speculative = []
+        if self._future is not None:
+            try:
+                speculative = self._future.result(timeout=wait)
+                if speculative:
+                    _bump("llm_used")
+            except FutureTimeout:
+                _bump("llm_timeouts")
+                self._cancel()
+            except Exception as e:
+                print(f"⚠️ Speculative suggestions failed: {e}")
+        if not speculative:
+            _bump("templates_only")
+
+        ranked = rank_templates(self.templates, self.user_query, answer)
+        return _merge([inline, speculative, ranked], self.user_query, SUGGESTIONS_COUNT)
+
+    async def resolve_async(self, answer: str, inline: list[str] | None = None) -> list[str]:
+        """resolve() for the event loop: awaits the speculative call instead of blocking on it."""
+        inline = extract_inline_suggestions(answer) if inline is None else inline
+        needs_llm = len(_merge([inline], self.user_query, SUGGESTIONS_COUNT)) < 2
+        if needs_llm and self._future is not None and not self._future.done():
+            try:
+                # shield: a timeout here must not cancel the call; resolve() decides
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(self._future)), SUGGESTIONS_WAIT_SECONDS)
+            except Exception:
+                pass   # timeouts and failures are counted by resolve()
+        return self.resolve(answer, inline, wait=0)
+
+    def _cancel(self):
+        """Drop the speculative call: cancelled if still queued, else left to finish unused."""
+        if self._future is None or self._future.done():
+            return
+        if self._future.cancel():
+            _bump("llm_cancelled")
+        else:
+            _bump("llm_abandoned")
+
+
+def start_suggestions(
+    user_query: str,
+    project_id: str | None = None,
+    project_data: dict | None = None,
+    user_email: str | None = None,
+    expect_inline: bool = True
+) -> SuggestionJob:
+    """expect_inline: the answer prompt asks the model for "You Might Also Ask" lines."""
+    _bump("jobs")
+    speculate = SUGGESTIONS_LLM_MODE == "always" or (
+        SUGGESTIONS_LLM_MODE == "fallback" and not project_data and not expect_inline
+    )
+    return SuggestionJob(user_query, project_id, project_data, user_email, speculate)
+
+
+def get_suggestion_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["no_extra_llm_ratio"] = round((stats["jobs"] - stats["speculative_llm"]) / stats["jobs"], 3) if stats["jobs"] else 0
+    stats["template_cache"] = _template_cache.stats()
+    stats["mode"] = SUGGESTIONS_LLM_MODE
+    return stats
@@ -0,0 +1,153 @@
+import re
+from core import supabase
+from utils.pagination import decode_cursor, apply_keyset, next_cursor
+
+# ============================================================
+# ================= TASK READ MODEL (/my-tasks) ===============
+# ============================================================
+# Loads assignments + tasks + broadcast titles with batched `in_` lookups
+# (3 round trips per page, independent of the number of assignments).
+
+PROJECT_TAG_RE = re.compile(r"\[Project:([a-f0-9-]+)\]")
+PROJECT_TAG_STRIP_RE = re.compile(r"\[Project:[^\]]+\]")
+
+MAX_PAGE_SIZE = 200
+
+# (task_id, raw_description) -> (clean_description, project_id)
+# Legacy rows keep the project tag inside the description; parse each one once.
+_DESCRIPTION_CACHE = {}
+_DESCRIPTION_CACHE_MAX = 5000
+
+
+def extract_project_tag(description: str | None) -> tuple[str, str | None]:
+    """Split a task description into (clean_description, project_id_from_tag)."""
+    desc = description or ""
+    if not desc:
+        return "", None
+
+    match = PROJECT_TAG_RE.search(desc)
+    tag_project_id = match.group(1) if match else None
+    clean = PROJECT_TAG_STRIP_RE.sub("", desc).strip() if "[Project:" in desc else desc
+    return clean, tag_project_id
+
+
+def parse_task_description(task: dict) -> tuple[str, str | None]:
+    """
+    Return (clean_description, project_id) for a broadcast_tasks row.
+    The project_id column wins over the legacy [Project:...] tag.
+    """
+    raw = task.get("description") or ""
+    key = (task.get("id"), raw)
+
+    cached = _DESCRIPTION_CACHE.get(key)
+    if cached is None:
+        cached = extract_project_tag(raw)
+        if len(_DESCRIPTION_CACHE) >= _DESCRIPTION_CACHE_MAX:
+            _DESCRIPTION_CACHE.clear()
+        _DESCRIPTION_CACHE[key] = cached
+
+    clean, tag_project_id = cached
+    return clean, task.get("project_id") or tag_project_id
+
+
+def _parse_statuses(status: str | None) -> list[str]:
+    if not status:
+        return []
+    return [s.strip() for s in status.split(",") if s.strip()]
+
+
+def load_user_tasks(
+    user_id: int,
+    status: str | None = None,
+    cursor: str | None = None,
+    limit: int | None = None
+) -> tuple[list[dict], str | None]:
+    """
+    Load one page of a user's active task assignments joined with task and
+    broadcast data.
+
+    - status: optional comma separated filter ("pending,in_progress")
+    - cursor / limit: keyset pagination on (assigned_at, id), newest first.
+      Without a limit the full list is returned (legacy behaviour).
+
+    Returns (tasks, next_cursor).
+    """
+    if limit is not None:
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    # STEP 1 — assignments page
+    query = (
+        supabase
+        .table("task_assignments")
+        .select("id, task_id, status, assigned_at")
+        .eq("user_id", user_id)
+        .eq("is_active", True)
+    )
+
+    statuses = _parse_statuses(status)
+    if len(statuses) == 1:
+        query = query.eq("status", statuses[0])
+    elif statuses:
+        query = query.in_("status", statuses)
+
+    query = apply_keyset(query, "assigned_at", "id", decode_cursor(cursor))
+    if limit:
+        query = query.limit(limit)
+
+    assignments = query.execute().data or []
+    if not assignments:
+        return [], None
+
+    # STEP 2 — all tasks of the page in one round trip
+    task_ids = list({a["task_id"] for a in assignments if a.get("task_id") is not None})
+    tasks_by_id = {}
+    if task_ids:
+        task_res = (
+            supabase
+            .table("broadcast_tasks")
+            .select("*")
+            .in_("id", task_ids)
+            .execute()
+        )
+        tasks_by_id = {str(t["id"]): t for t in (task_res.data or [])}
+
+    # STEP 3 — all broadcast titles of the page in one round trip
+    broadcast_ids = list({
+        t["broadcast_id"] for t in tasks_by_id.values() if t.get("broadcast_id") is not None
+    })
+    titles_by_broadcast = {}
+    if broadcast_ids:
+        broadcast_res = (
+            supabase
+            .table("project_broadcasts")
+            .select("id, title")
+            .in_("id", broadcast_ids)
+            .execute()
+        )
+        titles_by_broadcast = {
+            str(b["id"]): b.get("title", "N/A") for b in (broadcast_res.data or [])
+        }
+
+    tasks = []
+    for a in assignments:
+        task_data = tasks_by_id.get(str(a.get("task_id")))
+
+        if task_data:
+            desc, project_id = parse_task_description(task_data)
+            broadcast_title = titles_by_broadcast.get(str(task_data.get("broadcast_id")), "N/A")
+        else:
+            desc, project_id, broadcast_title = "", None, "N/A"
+
+        tasks.append({
+            "assignment_id": a["id"],
+            "status": a["status"],
+            "assigned_at": a["assigned_at"],
+            "task_title": task_data["title"] if task_data else "Unnamed Task",
+            "description": desc,
+            "project_id": project_id,
+            "priority": task_data["priority"] if task_data else "low",
+            "deadline": task_data["deadline"] if task_data else None,
+            "broadcast_title": broadcast_title
+        })
+
+    return tasks, next_cursor(assignments, "assigned_at", "id", limit)
@@ -1,3 +1,4 @@
+import asyncio
 import random
 #JONCY START
 import re
@@ -28,9 +29,9 @@ from core import (
     build_fact_memory_system_prompt_322,  #Tanmey Added 
     handle_multi_question_self_asking,     #Tanmey Added
     generate_followup_suggestions,        #Tanmey Added
-    get_user_preference_summary,
     get_response_metrics,
-    get_user_perms_id
+    get_user_perms_id,
+    _safe_model_name
 )
 
 from validators import (
@@ -49,6 +50,10 @@ from validators import (
     # validate_query_with_rbac
 )
 
+from services import preference_stats, session_store
+from services.context_budget import ContextBudget
+from services.suggestion_engine import start_suggestions
+from services.llm_metering import tag_usage
 from services.chat_core import (
     format_response,
     extract_and_store_user_fact,
@@ -77,7 +82,9 @@ def process_ai_reply(
         chat_id,
         user_email,
         is_tabular,
-        project_data=None 
+        project_data=None,
+        ws_session=None,
+        suggestion_job=None
     ):
         """
         Centralized reply processing pipeline.
@@ -184,7 +191,9 @@ def process_ai_reply(
         # 🔹 Save assistant message
         encrypted_reply = encrypt_api(final_safe_reply, project_id)
 
-        assistant_msg_id = save_chat_message(
+        save_message = ws_session.save_message if ws_session else save_chat_message
+
+        assistant_msg_id = save_message(
             user_email=user_email,
             role="assistant",
             content=encrypted_reply,
@@ -217,6 +226,8 @@ def process_ai_reply(
                 elif line and not line.lower().startswith("you might"):
                     suggestions.append(line.strip())
 
+        if suggestion_job:
+            suggestions = suggestion_job.resolve(answer_part, inline=suggestions)
         final_safe_reply = answer_part
         #JONCY OVER
         # generate_followup_suggestions(
@@ -229,10 +240,37 @@ def process_ai_reply(
         return final_safe_reply, assistant_msg_id, suggestions
 
 
+def _load_project_data(project_id, user_role, user_email):
+    """Fetch the project row, filtered by the caller's project access (None if not allowed)."""
+    # Import RBAC function
+    from core import _apply_access_controls
+
+    # Build query
+    query = (
+        supabase
+        .table("projects")
+        .select("*")
+        .eq("id", project_id)
+    )
+
+    # ✅ Apply RBAC filtering - checks assigned_to_emails
+    query = _apply_access_controls(
+        table="projects",
+        query=query,
+        role=user_role,
+        user_email=user_email
+    )
+
+    # Execute filtered query
+    result = query.execute()
+    return result.data[0] if result.data else None
+
+
 async def handle_work_chat(
     data,
     current_user,
-    stream: bool = False
+    stream: bool = False,
+    ws_session=None
 ):
     try:
         print("🚀 ENTER handle_work_chat | stream =", stream)
@@ -247,9 +285,10 @@ async def handle_work_chat(
         
         # Krishi_Start (New)
         user_email = current_user.get("email")
+        tag_usage(call_site="chat_work", user_email=user_email, project_id=project_id)
 
         # update krishi
-        extract_and_store_user_fact(user_email, user_input)
+        await asyncio.to_thread(extract_and_store_user_fact, user_email, user_input)
         user_fact = get_user_fact(user_email) or {}
         # update krishi over
         # Krishi_End (New)
@@ -260,7 +299,9 @@ async def handle_work_chat(
             return {"reply": user_err}
         
         # 🔹 RESOLVE PROJECT ID IF CUSTOM STRING
-        if project_id and not _is_uuid(project_id):
+        if ws_session:
+            project_id = ws_session.resolve_project(project_id)
+        elif project_id and not _is_uuid(project_id):
             print(f"🔄 Resolving custom project ID (work_chat): {project_id}")
             try:
                 res = (
@@ -282,7 +323,7 @@ async def handle_work_chat(
         # Sujal_Harsh_Over
 
         user_name = current_user.get("name", "")
-        user_role = get_user_role(user_email)
+        user_role = ws_session.role if ws_session else get_user_role(user_email)
         user_role = user_role.strip().lower().replace(" ", "_") # Sujal
 
         if not project_id:
@@ -296,11 +337,17 @@ async def handle_work_chat(
             }
 
         # Initialize/Resolve chat_id early
-        chat_id = _resolve_chat_id(project_id, user_email, data.chat_id)
+        if ws_session:
+            chat_id = ws_session.resolve_chat_id(project_id, data.chat_id)
+        else:
+            chat_id = _resolve_chat_id(project_id, user_email, data.chat_id)
+
+        save_message = ws_session.save_message if ws_session else save_chat_message
 
         encrypted_user_msg = encrypt_api(user_input, project_id)
 
-        user_msg_id = save_chat_message(
+        user_msg_id = await asyncio.to_thread(
+            save_message,
             user_email=user_email,
             role="user",
             content=encrypted_user_msg,
@@ -315,36 +362,20 @@ async def handle_work_chat(
         
         if project_id:
             try:
-                # Import RBAC function
-                from core import _apply_access_controls
-                
-                # Build query
-                query = (
-                    supabase
-                    .table("projects")
-                    .select("*")
-                    .eq("id", project_id)
-                )
-                
-                # ✅ Apply RBAC filtering - checks assigned_to_emails
-                query = _apply_access_controls(
-                    table="projects",
-                    query=query,
-                    role=user_role,
-                    user_email=user_email
-                )
-                
-                # Execute filtered query
-                result = query.execute()
-                
-                if result.data:
-                    project_data = result.data[0]
+                if ws_session:
+                    project_data = ws_session.project_data(
+                        project_id,
+                        lambda: _load_project_data(project_id, user_role, user_email)
+                    )
+                else:
+                    project_data = _load_project_data(project_id, user_role, user_email)
+
+                if project_data:
                     tech_stack = extract_tech_stack_from_project(project_data)
                     print(f"✅ Project data loaded for authorized user")
                 else:
                     # User not authorized for this project
                     print(f"⚠️ User {user_email} not authorized for project {project_id}")
-                    project_data = None
                     tech_stack = []
                     
             except Exception as e:
@@ -373,7 +404,8 @@ async def handle_work_chat(
             if risk_response.get("requires_confirmation"):
                 # For tech stack mismatch - you might want to add a confirmation flow
                 # For now, we'll return the message asking for confirmation
-                save_chat_message(
+                await asyncio.to_thread(
+                    save_message,
                     user_email=user_email,
                     role="assistant",
                     content=risk_response["reply"],
@@ -389,7 +421,8 @@ async def handle_work_chat(
                 }
             else:
                 # High risk - immediate block
-                save_chat_message(
+                await asyncio.to_thread(
+                    save_message,
                     user_email=user_email,
                     role="assistant",
                     content=risk_response["reply"],
@@ -407,13 +440,8 @@ async def handle_work_chat(
         # Sujal_Over
 
         # ================= SELF ASKING SESSION SETUP ================= #Tanmey Start
-        # FastAPI doesn't have Flask sessions - using a simple in-memory session dict
-        # TODO: Replace with Redis or proper session management for production
-        if not hasattr(handle_work_chat, '_sessions'):
-            handle_work_chat._sessions = {}
-        
-        session_key = f"{user_email}_{project_id}_{chat_id}"
-        session = handle_work_chat._sessions.setdefault(session_key, {})
+        # Bounded, TTL-evicted store shared by all workers (see services/session_store.py)
+        session = session_store.get_session("work", user_email, project_id, chat_id)
         
         # 🔒 GUARD: random number without active clarification
         if user_input.strip().isdigit() and not session.get("multi_clarification"):
@@ -425,7 +453,8 @@ async def handle_work_chat(
         if greeting_response:
             # chirag logic start
             encrypted_response = encrypt_api(greeting_response, project_id)
-            save_chat_message(
+            await asyncio.to_thread(
+                save_message,
                 user_email=user_email,
                 role="assistant",
                 content=encrypted_response,
@@ -447,7 +476,8 @@ async def handle_work_chat(
                 )
             # chirag logic start
             encrypted_response = encrypt_api(resp, project_id) # Sujal
-            save_chat_message(
+            await asyncio.to_thread(
+                save_message,
                 user_email=user_email,
                 role="assistant",
                 content=encrypted_response,
@@ -474,7 +504,8 @@ async def handle_work_chat(
             )
             # chirag logic start
             encrypted_response = encrypt_api(company_ctx, project_id) # Sujal
-            save_chat_message(
+            await asyncio.to_thread(
+                save_message,
                 user_email=user_email,
                 role="assistant",
                 content=encrypted_response,
@@ -485,7 +516,7 @@ async def handle_work_chat(
             return {"reply": company_ctx, "is_tabular": False, "chat_id": chat_id}
 
         # -------------------- Intent Detection --------------------
-        query_type = detect_intent(normalized_query)
+        query_type = await asyncio.to_thread(detect_intent, normalized_query)
         print(f"🧭 Detected intent: {query_type}")
 
         doc_context = None
@@ -496,6 +527,11 @@ async def handle_work_chat(
         wants_table = detect_table_request(user_input)
         print(f"[DEBUG] Table request detected: {wants_table}")
 
+        # Follow-up suggestions are prepared while the answer is generated
+        suggestion_job = start_suggestions(
+            user_input, project_id, project_data, user_email, expect_inline=not wants_table
+        )
+
         # if "project" in ql or query_type in ["project_details", "all_projects"]:
         #JONCY START
         if query_type in ["project_details", "all_projects"]:
@@ -537,29 +573,15 @@ async def handle_work_chat(
             except Exception as e:
                 print("❌ Document lookup error:", e)
                 doc_context = None
-
-            synth_prompt = f"""
-            User Question:
-            {normalized_query}
-
-            Database Information:
-            {db_answer if db_answer else "No database information available."}
-
-            Document Context:
-            {doc_context if doc_context else "No documentation context available."}
-
-            Instructions:
-            - Use database or documentation data if available.
-            - Do NOT invent project details.
-            - If information is missing, clearly say so.
-            - Provide a helpful answer.
-            """
             #JONCY END
 
         # chirag logic start
-        encrypted_hist = (
-            load_chat_history(user_email, project_id, chat_id, limit=10) or []
-        )
+        if ws_session:
+            encrypted_hist = ws_session.history(project_id, chat_id, limit=10)
+        else:
+            encrypted_hist = (
+                load_chat_history(user_email, project_id, chat_id, limit=10) or []
+            )
 
         # Decrypt history for LLM context
         conv_hist = []
@@ -575,25 +597,6 @@ async def handle_work_chat(
             # - Always give a human-like, professional, natural reply.
             # - Never dump raw DB rows or raw doc chunks.
             # """
-
-            #JONCY START
-            synth_prompt = f"""
-            User Question:
-            {normalized_query}
-
-            Database Information:
-            {db_answer if db_answer else "No database information available."}
-
-            Document Context:
-            {doc_context if doc_context else "No documentation context available."}
-
-            Instructions:
-            - Use the database or documentation information when available.
-            - Do NOT invent project details.
-            - If the data is missing, clearly say you do not have that information.
-            - Provide a clear and helpful answer.
-            """
-            #JONCY END
         
         # Sujal_Start - Enhanced prompt with project data
         # Build comprehensive data context
@@ -649,11 +652,6 @@ async def handle_work_chat(
 # """
 
         episodic = load_episodic_memory(user_email, project_id, chat_id) or []
-        episodic_text = (
-            "\nPrevious conversation summaries:\n" + "\n---\n".join(episodic)
-            if episodic
-            else ""
-        )
         # Sujal_Over
 
         # -------------------- TABLE RESPONSE --------------------
@@ -664,8 +662,8 @@ async def handle_work_chat(
             is_tabular = True
 
         elif wants_table:
-            llm_rows = llm_force_json_table(
-                user_input, context=str(db_answer or "")
+            llm_rows = await asyncio.to_thread(
+                llm_force_json_table, user_input, context=str(db_answer or "")
             )
             if llm_rows:
                 final_reply = format_data_as_table(llm_rows, query_type)
@@ -676,7 +674,8 @@ async def handle_work_chat(
         
                 # 🔥 EARLY RETURN FOR TABLE
         if wants_table:
-            final_safe_reply, assistant_msg_id, suggestions = process_ai_reply(
+            final_safe_reply, assistant_msg_id, suggestions = await asyncio.to_thread(
+                process_ai_reply,
                 user_input=user_input,
                 normalized_query=normalized_query,
                 raw_reply=final_reply,
@@ -684,7 +683,9 @@ async def handle_work_chat(
                 chat_id=chat_id,
                 user_email=user_email,
                 is_tabular=is_tabular,
-                project_data=project_data
+                project_data=project_data,
+                ws_session=ws_session,
+                suggestion_job=suggestion_job
             )
 
             return {
@@ -704,16 +705,13 @@ async def handle_work_chat(
 
         # -------------------- TEXT RESPONSE --------------------
         else:
-            user_id = get_user_perms_id(user_email)
+            user_id = ws_session.user_id if ws_session else get_user_perms_id(user_email)
             # user_pref = get_user_preference_summary(user_id) or {}
             #JONCY START
-            if user_id:
-                user_pref = get_user_preference_summary(user_id) or {}
-            else:
+            if not user_id:
                 print("⚠ No user_id found for:", user_email)
-                user_pref = {}
             #JONCY END
-            preferred_style = user_pref.get("preferred_style", "medium").lower()
+            preferred_style = preference_stats.get_preferred_style(user_id).lower()
           
             if preferred_style == "short":
                 max_tokens_value = 200
@@ -761,8 +759,42 @@ async def handle_work_chat(
             #     {"role": "user", "content": synth_prompt},
             # ]
 
+            # Fit DB / document context, history and summaries into the prompt budget
+            # Work chat answers with call_llm_with_model's default model
+            work_model = _safe_model_name(None)
+            context = ContextBudget(work_model, reserve=max_tokens_value, label="work chat")
+            context.add("question", normalized_query, priority=0)
+            context.add("db", db_answer, priority=1, mode="lines")
+            context.add_history("history", conv_hist[-5:], priority=2)
+            context.add("documents", doc_context, priority=3)
+            context.add("episodic", "\n---\n".join(episodic), priority=5)
+            fitted = context.fit()
+
+            episodic_text = (
+                "\nPrevious conversation summaries:\n" + fitted["episodic"]
+                if fitted["episodic"]
+                else ""
+            )
+
             #JONCY START
-            recent_history = conv_hist[-5:]
+            synth_prompt = f"""
+            User Question:
+            {normalized_query}
+
+            Database Information:
+            {fitted["db"] if fitted["db"] else "No database information available."}
+
+            Document Context:
+            {fitted["documents"] if fitted["documents"] else "No documentation context available."}
+
+            Instructions:
+            - Use the database or documentation information when available.
+            - Do NOT invent project details.
+            - If the data is missing, clearly say you do not have that information.
+            - Provide a clear and helpful answer.
+            """
+
+            recent_history = fitted["history"]
 
             # messages = [
             #     {
@@ -813,6 +845,7 @@ async def handle_work_chat(
 
                     response_stream = call_llm_with_model(
                         messages,
+                        model=work_model,
                         temperature=0.5,
                         max_tokens=max_tokens_value,
                         stream=True
@@ -831,7 +864,8 @@ async def handle_work_chat(
                         fallback=collected_reply
                     )
 
-                    final_safe_reply, assistant_msg_id, suggestions = process_ai_reply(
+                    final_safe_reply, assistant_msg_id, suggestions = await asyncio.to_thread(
+                        process_ai_reply,
                         user_input=user_input,
                         normalized_query=normalized_query,
                         raw_reply=final_reply,
@@ -839,7 +873,9 @@ async def handle_work_chat(
                         chat_id=chat_id,
                         user_email=user_email,
                         is_tabular=False,
-                        project_data=project_data
+                        project_data=project_data,
+                        ws_session=ws_session,
+                        suggestion_job=suggestion_job
                     )
 
                     yield {
@@ -859,6 +895,7 @@ async def handle_work_chat(
                 # ================= NORMAL MODE =================
                 reply = call_llm_with_model(
                     messages,
+                    model=work_model,
                     temperature=0.5,
                     max_tokens=max_tokens_value,
                     stream=False
@@ -866,7 +903,8 @@ async def handle_work_chat(
 
                 final_reply = format_response(user_input, fallback=reply)
 
-                final_safe_reply, assistant_msg_id, suggestions = process_ai_reply(
+                final_safe_reply, assistant_msg_id, suggestions = await asyncio.to_thread(
+                    process_ai_reply,
                     user_input=user_input,
                     normalized_query=normalized_query,
                     raw_reply=final_reply,
@@ -874,7 +912,9 @@ async def handle_work_chat(
                     chat_id=chat_id,
                     user_email=user_email,
                     is_tabular=False,
-                    project_data=project_data
+                    project_data=project_data,
+                    ws_session=ws_session,
+                    suggestion_job=suggestion_job
                 )
 
                 return {
@@ -0,0 +1,223 @@
+import os
+import json
+import uuid
+import asyncio
+from fastapi import WebSocket, WebSocketDisconnect
+from services.ws_utils import iter_frames, coalesce_frames, send_frame, record_connection
+from services import ws_replay
+
+# ============================================================
+# ============ MULTIPLEXED CHAT WEBSOCKET PROTOCOL ===========
+# ============================================================
+# Client -> server frames:
+#   {"request_id": "r1", "query": "...", ...}              start a generation
+#   {"type": "cancel", "request_id": "r1"}                  abort a generation
+#   {"type": "resume", "generation_id": "...", "offset": n} replay after reconnect
+#   {"type": "ping"}                                        keep-alive
+#
+# Server -> client frames carry the request_id and generation_id they belong
+# to, plus a per-generation `seq` (resume from last seq + 1):
+#   token / meta / done / error / cancelled
+#
+# Frames without a request_id get a generated one, so clients that send
+# one question at a time keep working unchanged.
+
+WS_MAX_CONCURRENT_GENERATIONS = int(os.getenv("WS_MAX_CONCURRENT_GENERATIONS", "3"))
+
+
+class ChatConnection:
+
+    def __init__(self, websocket: WebSocket, handler, build_request, ws_session, label: str = "Chat"):
+        """
+        handler:       chat service coroutine (handle_common_chat, ...)
+        build_request: callable(frame: dict) -> request model for the handler
+        """
+        self.websocket = websocket
+        self.handler = handler
+        self.build_request = build_request
+        self.ws_session = ws_session
+        self.label = label
+
+        self._send_lock = asyncio.Lock()
+        self._generations = {}   # request_id -> ws_replay.Generation
+        self._forwarders = {}    # request_id -> asyncio.Task sending frames to this socket
+
+        record_connection(websocket)
+
+    async def send(self, frame: dict):
+        # Concurrent generations share one socket; never interleave writes
+        async with self._send_lock:
+            await send_frame(self.websocket, frame)
+
+    async def serve(self):
+        """Read frames until the client disconnects."""
+        while True:
+            raw_data = await self.websocket.receive_text()
+
+            try:
+                frame = json.loads(raw_data)
+                if not isinstance(frame, dict):
+                    raise ValueError("frame must be a JSON object")
+            except ValueError:
+                await self.send({"type": "error", "message": "Invalid message format."})
+                continue
+
+            frame_type = frame.get("type") or "message"
+
+            if frame_type == "ping":
+                await self.send({"type": "pong"})
+                continue
+
+            if frame_type == "cancel":
+                self.cancel(frame.get("request_id"))
+                continue
+
+            if frame_type == "resume":
+                await self.resume(frame)
+                continue
+
+            await self.start(frame)
+
+    def _active(self) -> int:
+        for request_id in [r for r, g in self._generations.items() if g.finished]:
+            self._generations.pop(request_id, None)
+        return len(self._generations)
+
+    async def start(self, frame: dict):
+        request_id = str(frame.get("request_id") or uuid.uuid4())
+
+        if self._active() >= WS_MAX_CONCURRENT_GENERATIONS:
+            await self.send({
+                "type": "error",
+                "request_id": request_id,
+                "message": "Too many requests in progress. Please wait or cancel one."
+            })
+            return
+
+        if request_id in self._generations:
+            await self.send({
+                "type": "error",
+                "request_id": request_id,
+                "message": "A request with this id is already running."
+            })
+            return
+
+        gen = ws_replay.start_generation(
+            self.ws_session.email,
+            request_id,
+            lambda g: self._produce(g, frame)
+        )
+        self._generations[request_id] = gen
+        self._follow(request_id, gen, 0)
+
+    async def resume(self, frame: dict):
+        gen = ws_replay.get_generation(frame.get("generation_id"), self.ws_session.email)
+        request_id = str(frame.get("request_id") or (gen.request_id if gen else ""))
+
+        if not gen:
+            await self.send({
+                "type": "error",
+                "request_id": request_id or None,
+                "generation_id": frame.get("generation_id"),
+                "message": "Generation not found or expired."
+            })
+            return
+
+        if not gen.finished:
+            self._generations[request_id] = gen
+        self._follow(request_id, gen, frame.get("offset") or 0)
+
+    def cancel(self, request_id: str | None):
+        gen = self._generations.get(str(request_id)) if request_id else None
+        if gen:
+            gen.cancel()
+
+    # ------------------------------------------------------------
+    # Producer: runs the chat service into the replay buffer
+    # ------------------------------------------------------------
+
+    async def _produce(self, gen, frame: dict):
+        stream = None
+        try:
+            data = self.build_request(frame)
+
+            await self.ws_session.ensure_fresh()
+
+            stream = await self.handler(
+                data,
+                self.ws_session.current_user,
+                stream=True,
+                ws_session=self.ws_session
+            )
+
+            async for out in coalesce_frames(iter_frames(stream)):
+                await gen.append(out)
+
+        except asyncio.CancelledError:
+            # Upstream stream is closed below; post-processing never runs
+            print(f"🛑 {self.label} request {gen.request_id} cancelled")
+            await gen.append({"type": "cancelled"})
+
+        except Exception as e:
+            print(f"❌ {self.label} WS request {gen.request_id} error:", e)
+            await gen.append({
+                "type": "error",
+                "message": "Something went wrong while processing your request."
+            })
+
+        finally:
+            if hasattr(stream, "aclose"):
+                try:
+                    await stream.aclose()
+                except Exception:
+                    pass
+
+    # ------------------------------------------------------------
+    # Forwarder: replays / tails a generation onto this socket
+    # ------------------------------------------------------------
+
+    def _follow(self, request_id: str, gen, offset: int):
+        previous = self._forwarders.get(request_id)
+        if previous and not previous.done():
+            previous.cancel()
+        self._forwarders[request_id] = asyncio.create_task(self._forward(request_id, gen, offset))
+
+    async def _forward(self, request_id: str, gen, offset: int):
+        frames = gen.follow(offset)
+        try:
+            async for frame in frames:
+                await self.send({**frame, "request_id": request_id, "generation_id": gen.generation_id})
+
+        except ws_replay.ReplayUnavailable as e:
+            await self._send_quietly({
+                "type": "error",
+                "request_id": request_id,
+                "generation_id": gen.generation_id,
+                "message": f"Cannot resume: {e}"
+            })
+
+        except (WebSocketDisconnect, RuntimeError):
+            # Socket went away; the generation keeps running for the grace period
+            pass
+
+        finally:
+            await frames.aclose()
+            if self._forwarders.get(request_id) is asyncio.current_task():
+                self._forwarders.pop(request_id, None)
+
+    async def _send_quietly(self, frame: dict):
+        try:
+            await self.send(frame)
+        except Exception:
+            pass
+
+    async def close(self):
+        """
+        Socket closed: stop forwarding. In-flight generations are not cancelled;
+        they keep running (and buffering) so the client can resume.
+        """
+        tasks = list(self._forwarders.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
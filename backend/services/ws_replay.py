@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+
+# ============================================================
+# ============== RESUMABLE GENERATIONS (replay) ==============
+# ============================================================
+# Every websocket generation writes its frames into a Generation buffer
+# instead of straight to the socket. Sockets follow the buffer, so when a
+# socket drops:
+#   - the upstream LLM call keeps running for WS_REPLAY_GRACE_SECONDS
+#   - a reconnecting client sends {"type": "resume", "generation_id", "offset"}
+#     and receives every frame from `offset` on, then the live tail
+# Finished generations stay replayable for WS_REPLAY_TTL_SECONDS.
+# Each buffer keeps at most WS_REPLAY_MAX_BYTES of frames (oldest dropped).
+
+WS_REPLAY_GRACE_SECONDS = int(os.getenv("WS_REPLAY_GRACE_SECONDS", "60"))
+WS_REPLAY_TTL_SECONDS = int(os.getenv("WS_REPLAY_TTL_SECONDS", "300"))
+WS_REPLAY_MAX_BYTES = int(os.getenv("WS_REPLAY_MAX_BYTES", str(256 * 1024)))
+WS_REPLAY_MAX_GENERATIONS = int(os.getenv("WS_REPLAY_MAX_GENERATIONS", "1000"))
+
+_generations = OrderedDict()   # generation_id -> Generation
+
+
+class ReplayUnavailable(Exception):
+    """The requested offset was already dropped from the replay buffer."""
+
+
+class Generation:
+
+    def __init__(self, email: str, request_id: str):
+        self.generation_id = str(uuid.uuid4())
+        self.email = email
+        self.request_id = request_id
+        self.created_at = time.time()
+        self.finished = False
+        self.finished_at = None
+        self.task = None
+
+        self._frames = []      # buffered frames, _frames[0] has seq == _base
+        self._sizes = []
+        self._bytes = 0
+        self._base = 0
+        self._next_seq = 0
+        self._cond = asyncio.Condition()
+        self._followers = 0
+        self._grace_timer = None
+
+    # ------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------
+
+    async def append(self, frame: dict):
+        frame = {**frame, "seq": self._next_seq}
+        size = len(json.dumps(frame, default=str))
+
+        async with self._cond:
+            self._frames.append(frame)
+            self._sizes.append(size)
+            self._bytes += size
+            self._next_seq += 1
+
+            # Keep the buffer bounded; the newest frame is always retained
+            while self._bytes > WS_REPLAY_MAX_BYTES and len(self._frames) > 1:
+                self._bytes -= self._sizes.pop(0)
+                self._frames.pop(0)
+                self._base += 1
+
+            self._cond.notify_all()
+
+    async def finish(self):
+        async with self._cond:
+            self.finished = True
+            self.finished_at = time.time()
+            self._cond.notify_all()
+        self._cancel_grace_timer()
+
+    # ------------------------------------------------------------
+    # Consumer side
+    # ------------------------------------------------------------
+
+    async def follow(self, offset: int = 0):
+        """Yield buffered frames from `offset` on, then live frames until finished."""
+        pos = max(int(offset or 0), 0)
+        self._followers += 1
+        self._cancel_grace_timer()
+
+        try:
+            while True:
+                async with self._cond:
+                    while pos >= self._next_seq and not self.finished:
+                        await self._cond.wait()
+
+                    if pos < self._base:
+                        raise ReplayUnavailable(f"offset {pos} no longer buffered (oldest is {self._base})")
+
+                    batch = self._frames[pos - self._base:]
+                    done = self.finished
+
+                for frame in batch:
+                    yield frame
+                    pos += 1
+
+                if done and pos >= self._next_seq:
+                    return
+        finally:
+            self._followers -= 1
+            if self._followers == 0 and not self.finished:
+                self._start_grace_timer()
+
+    # ------------------------------------------------------------
+    # Disconnect grace period
+    # ------------------------------------------------------------
+
+    def _start_grace_timer(self):
+        self._cancel_grace_timer()
+        loop = asyncio.get_running_loop()
+        self._grace_timer = loop.call_later(WS_REPLAY_GRACE_SECONDS, self._abandon)
+
+    def _cancel_grace_timer(self):
+        if self._grace_timer:
+            self._grace_timer.cancel()
+            self._grace_timer = None
+
+    def _abandon(self):
+        self._grace_timer = None
+        if self._followers == 0 and not self.finished and self.task and not self.task.done():
+            print(f"🗑 Generation {self.generation_id} abandoned after disconnect grace period")
+            self.task.cancel()
+
+    def cancel(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+
+
+def _prune():
+    now = time.time()
+    for gid in list(_generations):
+        gen = _generations[gid]
+        if gen.finished and now - gen.finished_at > WS_REPLAY_TTL_SECONDS:
+            _generations.pop(gid, None)
+
+    # Hard cap: drop the oldest finished generations first
+    overflow = len(_generations) - WS_REPLAY_MAX_GENERATIONS
+    for gid in [g for g, gen in _generations.items() if gen.finished][:max(overflow, 0)]:
+        _generations.pop(gid, None)
+
+
+def start_generation(email: str, request_id: str, produce) -> Generation:
+    """
+    Register a generation and run `produce(generation)` as its task.
+    produce: coroutine function that appends frames to the generation.
+    """
+    _prune()
+    gen = Generation(email, request_id)
+    _generations[gen.generation_id] = gen
+
+    async def runner():
+        try:
+            await produce(gen)
+        finally:
+            await gen.finish()
+
+    gen.task = asyncio.create_task(runner())
+    return gen
+
+
+def get_generation(generation_id: str | None, email: str) -> Generation | None:
+    """Look up a generation; only its owner may resume it."""
+    gen = _generations.get(str(generation_id)) if generation_id else None
+    if not gen or gen.email != email:
+        return None
+    return gen
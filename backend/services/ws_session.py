@@ -0,0 +1,262 @@
+import os
+import time
+import asyncio
+import weakref
+from collections import deque
+from core import (
+    supabase,
+    get_user_perms_id,
+    get_user_role,
+    get_user_llm_model,
+    save_chat_message,
+    _is_uuid
+)
+from services.chat_core import _resolve_chat_id
+from security.rbac_utils import resolve_permissions, PERMISSION_BUS_NAMESPACE
+from utils.tiered_cache import get_bus
+
+# ============================================================
+# ============== PER-CONNECTION CHAT SESSIONS ================
+# ============================================================
+# A ChatSession is built once when a chat websocket connects and handed to
+# the chat services for every message on that socket, so identity, role,
+# permissions, model, project and chat_id are not re-resolved per message.
+#
+# Identity data is refreshed in the background once it is older than
+# WS_SESSION_TTL_SECONDS; messages keep using the current values meanwhile.
+# After mark_stale(email) (permission or model changes) the next message
+# waits for the refresh, so it never runs with revoked access.
+
+WS_SESSION_TTL_SECONDS = int(os.getenv("WS_SESSION_TTL_SECONDS", "300"))
+WS_SESSION_HISTORY_WINDOW = int(os.getenv("WS_SESSION_HISTORY_WINDOW", "20"))
+DEFAULT_PROJECT_ID = "default"
+
+_live_sessions = {}   # email -> WeakSet[ChatSession]
+
+
+class ChatSession:
+
+    def __init__(self, email: str, name: str = "User"):
+        self.email = email
+        self.name = name
+        self.user_id = None          # user_perms.id (numeric)
+        self.role = "Employee"
+        self.permissions = None      # rbac_utils.PermissionMatrix | None
+        self.llm_model = None
+        self.loaded_at = 0.0
+
+        self._stale = False
+        self._refresh_task = None
+        self._projects = {}          # custom project id -> resolved id
+        self._project_data = {}      # project id -> loaded project row
+        self._chat_ids = {}          # (project_id, candidate chat_id) -> chat_id
+        self._history = {}           # (project_id, chat_id) -> deque of messages
+
+    # ------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------
+
+    @classmethod
+    async def open(cls, email: str, name: str = "User") -> "ChatSession":
+        session = cls(email, name)
+        await session.refresh()
+        _live_sessions.setdefault(email, weakref.WeakSet()).add(session)
+        return session
+
+    def close(self):
+        if self._refresh_task and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        sessions = _live_sessions.get(self.email)
+        if sessions is not None:
+            sessions.discard(self)
+            if not sessions:
+                _live_sessions.pop(self.email, None)
+
+    async def refresh(self):
+        """Re-resolve identity, role, permissions and model settings."""
+        # Cleared before loading: a mark_stale() that lands mid-refresh sets it
+        # again, since this refresh may already have read the old values
+        stale, self._stale = self._stale, False
+        try:
+            user_id, role, permissions, llm_model = await asyncio.gather(
+                asyncio.to_thread(get_user_perms_id, self.email),
+                asyncio.to_thread(get_user_role, self.email),
+                asyncio.to_thread(self._safe_permissions),
+                asyncio.to_thread(get_user_llm_model, self.email)
+            )
+        except BaseException:
+            self._stale = self._stale or stale
+            raise
+
+        self.user_id = user_id
+        self.role = role
+        self.permissions = permissions
+        self.llm_model = llm_model
+        self.loaded_at = time.time()
+
+        # Project access depends on role; history may have moved on elsewhere
+        self._project_data.clear()
+        self._history.clear()
+
+    def _safe_permissions(self):
+        try:
+            return resolve_permissions(self.email)
+        except Exception as e:
+            print(f"⚠ WS session permission load failed for {self.email}: {e}")
+            return self.permissions
+
+    async def ensure_fresh(self):
+        """
+        Call before each message. A session marked stale is refreshed before
+        returning; one that merely expired is refreshed in the background.
+        """
+        get_bus().poll()
+        if self._stale:
+            # A refresh already in flight may predate the invalidation
+            if self._refresh_task and not self._refresh_task.done():
+                await asyncio.shield(self._refresh_task)
+            if self._stale:
+                self._refresh_task = asyncio.create_task(self._background_refresh())
+                await asyncio.shield(self._refresh_task)
+            return
+
+        if time.time() - self.loaded_at <= WS_SESSION_TTL_SECONDS:
+            return
+        if self._refresh_task and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.create_task(self._background_refresh())
+
+    async def _background_refresh(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            print(f"⚠ WS session refresh failed for {self.email}: {e}")
+
+    # ------------------------------------------------------------
+    # Identity helpers
+    # ------------------------------------------------------------
+
+    @property
+    def current_user(self) -> dict:
+        return {"email": self.email, "name": self.name, "role": self.role}
+
+    def can(self, page: str, action: str = "View") -> bool:
+        if self.role == "Admin":
+            return True
+        if self.permissions is None or not self.permissions.has_page(page):
+            return False
+        return self.permissions.allows(page, action)
+
+    # ------------------------------------------------------------
+    # Project / chat resolution
+    # ------------------------------------------------------------
+
+    def resolve_project(self, project_id: str | None) -> str | None:
+        """Map a custom project id (projects.custom_uuid) to projects.id."""
+        if not project_id or project_id == DEFAULT_PROJECT_ID or _is_uuid(project_id):
+            return project_id
+
+        if project_id in self._projects:
+            return self._projects[project_id]
+
+        try:
+            res = (
+                supabase.table("projects")
+                .select("id")
+                .eq("custom_uuid", project_id)
+                .limit(1)
+                .execute()
+            )
+            resolved = res.data[0]["id"] if res.data else None
+        except Exception as e:
+            print(f"❌ Error resolving project ID: {e}")
+            return None
+
+        self._projects[project_id] = resolved
+        return resolved
+
+    def project_data(self, project_id: str, loader):
+        """Return the cached project row, loading it with loader() on first use."""
+        if project_id not in self._project_data:
+            self._project_data[project_id] = loader()
+        return self._project_data[project_id]
+
+    def resolve_chat_id(self, project_id: str | None, candidate_chat_id: str | None = None) -> str:
+        key = (project_id, candidate_chat_id)
+        if key not in self._chat_ids:
+            self._chat_ids[key] = _resolve_chat_id(project_id, self.email, candidate_chat_id)
+        return self._chat_ids[key]
+
+    # ------------------------------------------------------------
+    # History window
+    # ------------------------------------------------------------
+
+    def history(self, project_id: str | None, chat_id: str | None, limit: int = 15) -> list:
+        """
+        Most recent `limit` messages of a chat as [{"role", "content"}].
+        The window is loaded once and then kept current by save_message().
+        """
+        if not chat_id or not _is_uuid(chat_id) or not self.user_id:
+            return []
+
+        key = (project_id or DEFAULT_PROJECT_ID, chat_id)
+        window = self._history.get(key)
+
+        if window is None:
+            window = deque(self._load_history(*key), maxlen=WS_SESSION_HISTORY_WINDOW)
+            self._history[key] = window
+
+        return list(window)[-limit:] if limit else list(window)
+
+    def _load_history(self, project_id: str, chat_id: str) -> list:
+        try:
+            res = (
+                supabase.table("user_memorys")
+                .select("role, content, created_at")
+                .eq("user_id", self.user_id)
+                .eq("project_id", project_id)
+                .eq("chat_id", chat_id)
+                .order("created_at", desc=True)
+                .limit(WS_SESSION_HISTORY_WINDOW)
+                .execute()
+            )
+        except Exception as e:
+            print("⚠ WS session history load error:", e)
+            return []
+
+        return [{"role": m["role"], "content": m["content"]} for m in reversed(res.data or [])]
+
+    def save_message(self, user_email: str, role: str, content: str, project_id: str, chat_id: str, **kwargs):
+        """save_chat_message() with the session's user id, keeping the history window in sync."""
+        message_id = save_chat_message(
+            user_email=user_email,
+            role=role,
+            content=content,
+            project_id=project_id,
+            chat_id=chat_id,
+            user_id=self.user_id,
+            **kwargs
+        )
+
+        window = self._history.get((project_id or DEFAULT_PROJECT_ID, chat_id))
+        if window is not None and content:
+            window.append({"role": role, "content": content})
+
+        return message_id
+
+
+def mark_stale(email: str | None = None):
+    """Ask live sessions (of one user, or all) to refresh before their next message."""
+    targets = [email] if email else list(_live_sessions)
+    for target in targets:
+        for session in list(_live_sessions.get(target, ())):
+            session._stale = True
+
+
+def _on_permissions_invalidated(namespace: str, key: str | None):
+    # invalidate_permissions() on another worker
+    if namespace == PERMISSION_BUS_NAMESPACE:
+        mark_stale(key)
+
+
+get_bus().subscribe(_on_permissions_invalidated)
@@ -1,19 +1,45 @@
+import os
+import json
+import time
+import asyncio
+import contextlib
+import threading
+from collections import deque
 from fastapi import WebSocket
 
+# Token frames are coalesced: consecutive tokens are merged into one frame
+# until WS_BATCH_MAX_DELAY_MS has passed since the first buffered token or
+# WS_BATCH_MAX_BYTES of content is buffered. 0 ms disables batching.
+WS_BATCH_MAX_DELAY_MS = float(os.getenv("WS_BATCH_MAX_DELAY_MS", "30"))
+WS_BATCH_MAX_BYTES = int(os.getenv("WS_BATCH_MAX_BYTES", "256"))
+WS_STATS_WINDOW_SECONDS = 60
 
-async def stream_response(websocket: WebSocket, stream):
+_stats_lock = threading.Lock()
+_frame_stats = {
+    "started_at": time.time(),
+    "frames": 0,
+    "bytes": 0,
+    "tokens_in": 0,
+    "token_frames_out": 0,
+    "connections": 0,
+    "deflate_offered": 0
+}
+_recent = deque()   # [second, frames, bytes] buckets for the rate window
+
+
+async def iter_frames(stream):
     """
-    Generic streaming handler for all chat types.
+    Turn a chat service result into websocket frames (token..., meta, done).
     Works for both streaming and non-stream responses.
     """
 
     # 🔹 Non-stream response (normal dict)
     if not hasattr(stream, "__aiter__"):
         # 1. Send text content first
-        await websocket.send_json({
+        yield {
             "type": "token",
             "content": stream.get("reply", "No reply")
-        })
+        }
 
         # 2. Send metadata (id, chat_id, suggestions) in a 'meta' frame
         # Standardize message_ids from different backend formats
@@ -21,27 +47,163 @@ async def stream_response(websocket: WebSocket, stream):
         if not msg_ids and "message_id" in stream:
             msg_ids = {"assistant": stream["message_id"]}
 
-        meta_frame = {
+        yield {
             "type": "meta",
             "chat_id": stream.get("chat_id"),
             "message_ids": msg_ids,
             "clarifications": stream.get("clarifications") or stream.get("suggestions"),
             "multi_clarification": stream.get("multi_clarification", False)
         }
-        await websocket.send_json(meta_frame)
 
         # 3. Signal completion
-        await websocket.send_json({"type": "done"})
+        yield {"type": "done"}
         return
 
     # 🔹 Streaming response
     async for chunk in stream:
         if isinstance(chunk, dict):
-            await websocket.send_json(chunk)
+            yield chunk
         else:
-            await websocket.send_json({
+            yield {
                 "type": "token",
                 "content": chunk
-            })
+            }
+
+    yield {"type": "done"}
+
+
+async def coalesce_frames(frames, max_delay_ms: float | None = None, max_bytes: int | None = None):
+    """
+    Merge consecutive token frames from `frames` on a time/size budget.
+    Any other frame (meta, done, ...) flushes pending tokens first, so
+    ordering is preserved.
+    """
+    max_delay = (WS_BATCH_MAX_DELAY_MS if max_delay_ms is None else max_delay_ms) / 1000
+    max_bytes = WS_BATCH_MAX_BYTES if max_bytes is None else max_bytes
+
+    loop = asyncio.get_running_loop()
+    parts = []
+    size = 0
+    deadline = None
+    pending = None
+
+    def flush():
+        nonlocal parts, size, deadline
+        frame = {"type": "token", "content": "".join(parts)}
+        _record_tokens(len(parts))
+        parts, size, deadline = [], 0, None
+        return frame
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(frames.__anext__())
+
+            timeout = max(deadline - loop.time(), 0) if parts else None
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+            if not done:
+                yield flush()
+                continue
+
+            try:
+                frame = pending.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                pending = None
+
+            is_plain_token = frame.get("type") == "token" and set(frame) == {"type", "content"}
+
+            if not is_plain_token or max_delay <= 0:
+                if parts:
+                    yield flush()
+                if frame.get("type") == "token":
+                    _record_tokens(1)
+                yield frame
+                continue
+
+            content = frame.get("content") or ""
+            if not parts:
+                deadline = loop.time() + max_delay
+            parts.append(content)
+            size += len(content.encode("utf-8"))
+
+            if size >= max_bytes:
+                yield flush()
+
+        if parts:
+            yield flush()
+
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            with contextlib.suppress(BaseException):
+                await pending
+        with contextlib.suppress(Exception):
+            await frames.aclose()
+
+
+# ------------------------------------------------------------
+# Frame counters
+# ------------------------------------------------------------
+
+async def send_frame(websocket: WebSocket, frame: dict):
+    """send_json equivalent that also feeds the frame counters."""
+    text = json.dumps(frame, separators=(",", ":"), ensure_ascii=False)
+    await websocket.send_text(text)
+    _record_frame(len(text.encode("utf-8")))
+
+
+def record_connection(websocket: WebSocket):
+    """
+    Count a new chat socket. permessage-deflate itself is negotiated by the
+    ASGI server (uvicorn enables it by default) when the client offers it.
+    """
+    offered = "permessage-deflate" in (websocket.headers.get("sec-websocket-extensions") or "")
+    with _stats_lock:
+        _frame_stats["connections"] += 1
+        if offered:
+            _frame_stats["deflate_offered"] += 1
+
+
+def _record_frame(nbytes: int):
+    now = int(time.time())
+    with _stats_lock:
+        _frame_stats["frames"] += 1
+        _frame_stats["bytes"] += nbytes
+
+        if _recent and _recent[-1][0] == now:
+            _recent[-1][1] += 1
+            _recent[-1][2] += nbytes
+        else:
+            _recent.append([now, 1, nbytes])
+
+        while _recent and _recent[0][0] <= now - WS_STATS_WINDOW_SECONDS:
+            _recent.popleft()
+
+
+def _record_tokens(tokens: int):
+    with _stats_lock:
+        _frame_stats["tokens_in"] += tokens
+        _frame_stats["token_frames_out"] += 1
+
+
+def get_frame_stats() -> dict:
+    now = int(time.time())
+    with _stats_lock:
+        stats = dict(_frame_stats)
+        window = [b for b in _recent if b[0] > now - WS_STATS_WINDOW_SECONDS]
+
+    uptime = max(time.time() - stats.pop("started_at"), 1)
+    span = min(WS_STATS_WINDOW_SECONDS, uptime)
 
-    await websocket.send_json({"type": "done"})
\ No newline at end of file
+    return {
+        **stats,
+        "frames_per_second": round(sum(b[1] for b in window) / span, 2),
+        "bytes_per_second": round(sum(b[2] for b in window) / span, 2),
+        "avg_tokens_per_frame": round(stats["tokens_in"] / stats["token_frames_out"], 2) if stats["token_frames_out"] else 0,
+        "window_seconds": WS_STATS_WINDOW_SECONDS,
+        "batch_max_delay_ms": WS_BATCH_MAX_DELAY_MS,
+        "batch_max_bytes": WS_BATCH_MAX_BYTES
+    }
@@ -0,0 +1,40 @@
+import os
+import sys
+import base64
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(BACKEND_DIR, "scripts")
+
+for path in (BACKEND_DIR, SCRIPTS_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from fake_supabase import FakeSupabase
+
+# core builds its Supabase client, Chroma store and log files at import time:
+# point it at the in-memory fake, a dead LLM endpoint and a scratch directory
+# before any test imports it.
+os.environ.setdefault("SUPABASE_URL", "http://fake-supabase.local")
+os.environ.setdefault("SUPABASE_KEY", "test")
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
+os.environ.setdefault("OPENROUTER_BASE_URL", "http://127.0.0.1:9/api/v1")
+os.environ.setdefault("MASTER_CHAT_KEY", base64.b64encode(b"t" * 32).decode())
+
+FAKE_SUPABASE = FakeSupabase()
+try:
+    FAKE_SUPABASE.install()
+except ImportError:
+    pass
+
+os.chdir(tempfile.mkdtemp(prefix="backend-tests-"))
+
+
+@pytest.fixture
+def fake_db():
+    """The fake Supabase client core uses, emptied for the test."""
+    FAKE_SUPABASE._tables.clear()
+    FAKE_SUPABASE.reset_counters()
+    return FAKE_SUPABASE
@@ -0,0 +1,88 @@
+import sys
+import time
+import types
+import threading
+
+import pytest
+
+from services import context_budget
+from services.context_budget import ContextBudget, count_tokens, fit_messages
+
+
+@pytest.fixture
+def chars_tokenizer(monkeypatch):
+    """Deterministic ~4 chars/token counting, whatever tiktoken does here."""
+    monkeypatch.setattr(context_budget, "_encoding", None)
+    monkeypatch.setattr(context_budget, "_encoding_state", "failed")
+    monkeypatch.setattr(context_budget, "CONTEXT_BUDGET_LOG", False)
+    context_budget.count_tokens_cached.cache_clear()
+
+
+def _reset_encoding(monkeypatch, tiktoken_module, timeout=0.2):
+    monkeypatch.setitem(sys.modules, "tiktoken", tiktoken_module)
+    monkeypatch.setattr(context_budget, "_encoding", None)
+    monkeypatch.setattr(context_budget, "_encoding_state", "unloaded")
+    monkeypatch.setattr(context_budget, "TIKTOKEN_LOAD_TIMEOUT_SECONDS", timeout)
+
+
+def test_failed_encoding_download_falls_back_to_length(monkeypatch):
+    def get_encoding(name):
+        raise OSError("network unreachable")
+
+    _reset_encoding(monkeypatch, types.SimpleNamespace(get_encoding=get_encoding))
+    assert count_tokens("x" * 40) == 10
+    assert context_budget._encoding_state == "failed"
+
+
+def test_hanging_encoding_download_does_not_block_callers(monkeypatch):
+    release = threading.Event()
+
+    def get_encoding(name):
+        release.wait(5)
+        raise OSError("gave up")
+
+    _reset_encoding(monkeypatch, types.SimpleNamespace(get_encoding=get_encoding))
+    try:
+        started = time.monotonic()
+        assert count_tokens("x" * 40) == 10
+        assert count_tokens("y" * 8) == 2
+        assert time.monotonic() - started < 1
+    finally:
+        release.set()
+        context_budget._encoding_thread.join(5)
+
+
+def test_required_sections_are_kept_and_low_priority_ones_cut(chars_tokenizer):
+    budget = ContextBudget(reserve=0, label="test")
+    budget.budget = 100
+    budget.add("question", "q" * 80, priority=0)
+    budget.add("rows", "\n".join(f"row {i} " + "r" * 20 for i in range(20)), priority=3, mode="lines")
+    budget.add("documents", "d" * 400, priority=5)
+
+    fitted = budget.fit()
+
+    assert fitted["question"] == "q" * 80
+    assert "more lines omitted" in fitted["rows"]
+    assert fitted["documents"] == ""
+    assert sum(count_tokens(v) for v in fitted.values()) <= 100
+
+
+def test_history_keeps_the_newest_messages(chars_tokenizer):
+    messages = [{"role": "user", "content": f"{i}" * 40} for i in range(10)]
+    budget = ContextBudget(label="test")
+    budget.budget = 50
+    budget.add_history("history", messages)
+
+    kept = budget.fit()["history"]
+    assert kept == messages[-len(kept):]
+    assert 0 < len(kept) < 10
+
+
+def test_fit_messages_cuts_the_longest_message_first(chars_tokenizer):
+    messages = [{"role": "system", "content": "s" * 40}, {"role": "user", "content": "u" * 4000}]
+    fitted, before, after = fit_messages(messages, 200)
+
+    assert fitted[0] == messages[0]
+    assert fitted[1]["content"].endswith("[truncated]")
+    assert before > 200 >= after
+    assert messages[1]["content"] == "u" * 4000
@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from services import dashboard_stats
+
+
+@pytest.fixture
+def tables(fake_db, monkeypatch):
+    monkeypatch.setitem(dashboard_stats._state, "ready", False)
+    monkeypatch.setattr(dashboard_stats, "_response_cache", {})
+    fake_db._tables.update({
+        "project_broadcasts": [{"id": 1, "organization_id": "org-1"}],
+        "broadcast_tasks": [{"id": 10, "broadcast_id": 1}, {"id": 11, "broadcast_id": 1}],
+        "task_assignments": [
+            {"task_id": 10, "status": "pending"},
+            {"task_id": 10, "status": "done"},
+            {"task_id": 11, "status": "pending"},
+        ]
+    })
+    return fake_db
+
+
+def test_reconcile_counts_by_status_broadcast_and_organization(tables):
+    payload = dashboard_stats.get_dashboard("organization")
+    assert payload["total_assignments"] == 3
+    assert payload["status_breakdown"] == {"pending": 2, "done": 1}
+    assert payload["by_organization"] == {"org-1": {"pending": 2, "done": 1}}
+
+
+def test_deltas_update_counts_without_refetching(tables):
+    dashboard_stats.get_dashboard()
+    calls = tables.calls
+
+    dashboard_stats.record_status_change(11, "pending", "done")
+    dashboard_stats.record_assignments(10, 2)
+    payload = dashboard_stats.get_dashboard("broadcast")
+
+    assert payload["by_broadcast"] == {"1": {"pending": 3, "done": 2}}
+    assert tables.calls == calls
+
+
+def test_returned_payload_is_not_changed_by_later_writes(tables):
+    payload = dashboard_stats.get_dashboard("broadcast")
+    dashboard_stats.record_status_change(10, "pending", "done")
+    assert payload["status_breakdown"] == {"pending": 2, "done": 1}
+    assert payload["by_broadcast"] == {"1": {"pending": 2, "done": 1}}
+
+
+def test_reads_do_not_wait_for_a_running_reconciliation(tables, monkeypatch):
+    dashboard_stats.get_dashboard()
+    monkeypatch.setattr(dashboard_stats, "_response_cache", {})
+    monkeypatch.setitem(dashboard_stats._state, "reconciled_at", 0)
+
+    entered, release = threading.Event(), threading.Event()
+    fetch_all = dashboard_stats._fetch_all
+
+    def slow_fetch(table, columns):
+        entered.set()
+        release.wait(5)
+        return fetch_all(table, columns)
+
+    monkeypatch.setattr(dashboard_stats, "_fetch_all", slow_fetch)
+    worker = threading.Thread(target=dashboard_stats.get_dashboard)
+    worker.start()
+    entered.wait(5)
+    try:
+        # Served from the current counters; writes are not blocked either
+        dashboard_stats.record_status_change(10, "pending", "done")
+        assert dashboard_stats.get_dashboard()["status_breakdown"] == {"pending": 1, "done": 2}
+    finally:
+        release.set()
+        worker.join()
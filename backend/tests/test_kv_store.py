@@ -0,0 +1,103 @@
+import sys
+import types
+
+import pytest
+
+from utils import kv_store
+from utils.kv_store import MemoryStore, SQLiteStore, build_store
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(kv_store.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store_factory(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return MemoryStore(**kwargs)
+        kwargs.pop("max_bytes", None)
+        return SQLiteStore(str(tmp_path / "kv.sqlite3"), **kwargs)
+    return make
+
+
+def test_values_round_trip_as_json(store_factory):
+    store = store_factory()
+    store.set("a", {"n": 1, "items": [1, 2]})
+    assert store.get("a") == {"n": 1, "items": [1, 2]}
+    store.delete("a")
+    assert store.get("a", "missing") == "missing"
+
+
+def test_entries_expire_after_ttl(store_factory, clock):
+    store = store_factory(default_ttl=10)
+    store.set("a", 1)
+    store.set("b", 2, ttl=100)
+
+    clock[0] += 11
+    assert store.get("a") is None
+    assert store.get("b") == 2
+    assert store.stats()["evictions_ttl"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(store_factory, clock):
+    store = store_factory(max_entries=2)
+    store.set("a", 1)
+    clock[0] += 1
+    store.set("b", 2)
+    clock[0] += 1
+    store.get("a")           # a is now more recent than b
+    clock[0] += 1
+    store.set("c", 3)
+
+    assert store.get("b") is None
+    assert (store.get("a"), store.get("c")) == (1, 3)
+    assert store.stats()["evictions_lru"] == 1
+
+
+def test_memory_store_is_bounded_by_bytes():
+    store = MemoryStore(max_bytes=50)
+    for i in range(10):
+        store.set(f"k{i}", "x" * 10)
+    assert store.stats()["bytes"] <= 50
+    assert store.get("k9") == "x" * 10
+
+
+def _fake_redis(ping_error=None):
+    class Client:
+        def __init__(self, **kwargs):
+            self.kwargs = kwargs
+
+        def ping(self):
+            if ping_error:
+                raise ping_error
+            return True
+
+    class Redis:
+        @staticmethod
+        def from_url(url, **kwargs):
+            return Client(url=url, **kwargs)
+
+    return types.SimpleNamespace(Redis=Redis)
+
+
+def test_unreachable_redis_falls_back_to_memory(monkeypatch):
+    monkeypatch.setitem(sys.modules, "redis", _fake_redis(ConnectionError("refused")))
+    assert isinstance(build_store("sessions", backend="redis"), MemoryStore)
+
+
+def test_unreachable_redis_fails_fast_in_strict_mode(monkeypatch):
+    monkeypatch.setitem(sys.modules, "redis", _fake_redis(ConnectionError("refused")))
+    monkeypatch.setattr(kv_store, "KV_STORE_STRICT", True)
+    with pytest.raises(RuntimeError):
+        build_store("sessions", backend="redis")
+
+
+def test_reachable_redis_is_used_with_timeouts(monkeypatch):
+    monkeypatch.setitem(sys.modules, "redis", _fake_redis())
+    store = build_store("sessions", backend="redis")
+    assert isinstance(store, kv_store.RedisStore)
+    assert store.client.kwargs["socket_connect_timeout"] == kv_store.KV_STORE_REDIS_TIMEOUT_SECONDS
@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip("langchain_community")
+
+import core
+
+USER_ID = "legacy-user"
+
+
+class _DownSupabase:
+    """Builds queries like supabase-py; execute() fails like a network error."""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        raise ConnectionError("supabase unreachable")
+
+
+@pytest.fixture
+def legacy_log(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "LEGACY_SETTINGS_LOG", str(tmp_path / "legacy.log"))
+    monkeypatch.setattr(core, "LEGACY_SETTINGS_FILE", str(tmp_path / "legacy.json"))
+    monkeypatch.setattr(core, "_legacy_settings_store", None)
+    core.USER_LLM_CACHE.invalidate(USER_ID)
+    yield
+    core.USER_LLM_CACHE.invalidate(USER_ID)
+
+
+def test_settings_saved_while_db_is_down_are_read_back(fake_db, legacy_log, monkeypatch):
+    fake_client = core.supabase
+    monkeypatch.setattr(core, "supabase", _DownSupabase())
+    assert core.set_active_llm(USER_ID, "anthropic/claude-3-haiku")
+    core.USER_LLM_CACHE.invalidate(USER_ID)
+
+    # DB still down: nothing cached, served from the legacy log
+    assert core.get_active_llm(USER_ID)["llm_model"] == "anthropic/claude-3-haiku"
+    assert core.load_legacy_settings(USER_ID)["provider"] == "openrouter"
+
+    # DB back without a row for the user: the legacy entry beats the default
+    monkeypatch.setattr(core, "supabase", fake_client)
+    core.USER_LLM_CACHE.invalidate(USER_ID)
+    assert core.get_active_llm(USER_ID)["llm_model"] == "anthropic/claude-3-haiku"
+
+
+def test_unknown_user_gets_the_default(fake_db, legacy_log):
+    assert core.load_legacy_settings(USER_ID) is None
+    assert core.get_active_llm(USER_ID)["llm_model"] == "openai/gpt-4o-mini"
@@ -0,0 +1,101 @@
+import pytest
+from fastapi import HTTPException, Request, Response
+
+pytest.importorskip("langchain_community")
+
+from services.listing import list_rows, conditional_response, compute_etag
+from utils.pagination import encode_cursor, decode_cursor, check_key_value, InvalidCursor
+
+
+@pytest.fixture
+def announcements(fake_db):
+    # Pairs of rows share a timestamp so the id tie-breaker matters
+    fake_db._tables["announcements"] = [
+        {"id": i, "title": f"a{i}", "created_at": f"2024-01-01T00:00:{i // 2:02d}+00:00"}
+        for i in range(1, 12)
+    ]
+    return fake_db
+
+
+def _request(if_none_match: str | None = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "headers": headers})
+
+
+# ------------------------------------------------------------
+# Keyset cursors
+# ------------------------------------------------------------
+
+def test_cursor_round_trip():
+    values = {"created_at": "2024-01-01T00:00:00+00:00", "id": 5}
+    assert decode_cursor(encode_cursor(values)) == values
+    assert decode_cursor(None) is None
+
+
+@pytest.mark.parametrize("cursor", ["not base64 !", "W10", encode_cursor(["a"])])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("column, value", [
+    ("id", "1) or (id.gt.0"),
+    ("id", True),
+    ("created_at", "2024-01-01\",id.gt.\"0"),
+    ("created_at", "yesterday")
+])
+def test_injected_key_values_are_rejected(column, value):
+    with pytest.raises(InvalidCursor):
+        check_key_value(column, value)
+
+
+def test_keyset_pages_cover_every_row_once(announcements):
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = list_rows("announcements", "created_at", "id", cursor=cursor, limit=3)
+        seen.extend(row["id"] for row in rows)
+        if not cursor:
+            break
+
+    assert seen == list(range(11, 0, -1))
+
+
+def test_since_returns_only_newer_rows(announcements):
+    rows, _ = list_rows("announcements", "created_at", "id", since="2024-01-01T00:00:04+00:00")
+    assert sorted(row["id"] for row in rows) == [10, 11]
+
+
+def test_bad_cursor_is_a_400(announcements):
+    with pytest.raises(HTTPException) as bad:
+        list_rows("announcements", "created_at", "id", cursor=encode_cursor({"created_at": "x", "id": 1}))
+    assert bad.value.status_code == 400
+
+
+# ------------------------------------------------------------
+# ETag / 304
+# ------------------------------------------------------------
+
+def test_etag_is_attached_and_matching_poll_is_304():
+    payload = {"data": [{"id": 1}]}
+    response = Response()
+
+    assert conditional_response(_request(), response, payload, next_page="abc") == payload
+    etag = response.headers["ETag"]
+    assert response.headers["X-Next-Cursor"] == "abc"
+
+    not_modified = conditional_response(_request(f'"other", {etag}'), Response(), payload, next_page="abc")
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+    assert not_modified.headers["X-Next-Cursor"] == "abc"
+    assert not not_modified.body
+
+
+def test_changed_payload_gets_a_new_etag():
+    old = compute_etag({"data": [{"id": 1}]})
+    assert compute_etag({"data": [{"id": 1}, {"id": 2}]}) != old
+
+    response = Response()
+    payload = {"data": [{"id": 2}]}
+    assert conditional_response(_request(old), response, payload) == payload
+    assert response.headers["ETag"] != old
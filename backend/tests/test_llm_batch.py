@@ -0,0 +1,79 @@
+import uuid
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from services import llm_batch
+from services.llm_batch import run_batch, checkpoint_path
+
+
+@pytest.fixture
+def batch_env(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_batch, "BATCH_CHECKPOINT_DIR", str(tmp_path))
+    monkeypatch.setattr(llm_batch, "BATCH_RATE_PER_MINUTE", 0)
+    state = {"llm_calls": [], "llm_down_for": set(), "writes": [], "write_fails": False}
+
+    def fake_llm(task, messages, temperature=None, max_tokens=None):
+        item_id = messages[0]["content"]
+        state["llm_calls"].append(item_id)
+        return None if item_id in state["llm_down_for"] else f"summary of {item_id}"
+
+    monkeypatch.setattr(llm_batch, "call_llm_for_task", fake_llm)
+    return state
+
+
+def _spec(state):
+    def write(results):
+        if state["write_fails"]:
+            raise ConnectionError("supabase unreachable")
+        state["writes"].extend(item["id"] for item, _ in results)
+        return [item["id"] for item, result in results if result == "summary of skip-me"]
+
+    return {"task": "batch_episodic_summary", "parse": lambda output: output, "write": write}
+
+
+def _items(*ids):
+    return [{"id": i, "messages": [{"role": "user", "content": i}], "meta": {}} for i in ids]
+
+
+def test_resume_retries_failures_and_writes_generated_results_without_the_llm(batch_env):
+    job_id = str(uuid.uuid4())
+    spec = _spec(batch_env)
+
+    # Run 1: the LLM fails for "b" and the write of the others fails
+    batch_env.update(llm_down_for={"b"}, write_fails=True)
+    first = run_batch(job_id, spec, _items("a", "b", "c"))
+    assert first["failed"] == 1 and first["generated"] == 2 and first["write_failed"] == 2
+    assert sorted(batch_env["llm_calls"]) == ["a", "b", "c"]
+
+    # Run 2: only "b" goes back to the LLM; "a" and "c" are written from the checkpoint
+    batch_env.update(llm_calls=[], llm_down_for=set(), write_fails=False)
+    second = run_batch(job_id, spec, _items("a", "b", "c", "skip-me"))
+    assert sorted(batch_env["llm_calls"]) == ["b", "skip-me"]
+    assert second["resumed_generated"] == 2
+    assert second["written"] == 3 and second["skipped"] == 1
+    assert sorted(batch_env["writes"]) == ["a", "b", "c", "skip-me"]
+
+    # Run 3: everything is done, nothing is called or written again
+    batch_env.update(llm_calls=[], writes=[])
+    third = run_batch(job_id, spec, _items("a", "b", "c", "skip-me"))
+    assert third["resumed_done"] == 4
+    assert batch_env["llm_calls"] == [] and batch_env["writes"] == []
+
+
+def test_stopped_job_leaves_unsubmitted_items_for_resume(batch_env):
+    job_id = str(uuid.uuid4())
+    spec = _spec(batch_env)
+
+    stopped = run_batch(job_id, spec, _items("a", "b"), should_stop=lambda: True)
+    assert stopped["total"] == 0 and batch_env["llm_calls"] == []
+
+    resumed = run_batch(job_id, spec, _items("a", "b"))
+    assert resumed["written"] == 2
+
+
+@pytest.mark.parametrize("job_id", ["../../etc/passwd", "job-1", ""])
+def test_job_ids_must_be_uuids(job_id):
+    with pytest.raises(ValueError):
+        checkpoint_path(job_id)
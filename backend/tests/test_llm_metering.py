@@ -0,0 +1,57 @@
+import pytest
+
+from services import llm_metering
+from services.llm_metering import UsageMeter, usage_context, tag_usage, current_usage_tags
+
+
+def test_usage_context_restores_outer_tags():
+    tag_usage(call_site="chat_common", user="a@example.com")
+    with usage_context(call_site="intent"):
+        assert current_usage_tags()["call_site"] == "intent"
+        assert current_usage_tags()["user"] == "a@example.com"
+    assert current_usage_tags()["call_site"] == "chat_common"
+
+
+def test_report_aggregates_tokens_and_cost_per_dimension():
+    meter = UsageMeter()
+    usage = {"prompt_tokens": 1000, "completion_tokens": 500}
+    meter.record("openai/gpt-4o-mini", {"call_site": "intent", "user_email": "a"}, 120, usage=usage)
+    meter.record("openai/gpt-4o-mini", {"call_site": "intent", "user_email": "b"}, 80, usage=usage)
+    meter.record("openai/gpt-4o-mini", {"call_site": "chat_common", "user_email": "a"}, 900, usage=usage)
+
+    report = meter.report()
+    by_site = {row["call_site"]: row for row in report["call_sites"]}
+
+    assert by_site["intent"]["calls"] == 2
+    assert by_site["intent"]["total_tokens"] == 3000
+    expected = 2 * llm_metering.estimate_cost("openai/gpt-4o-mini", 1000, 500)
+    assert by_site["intent"]["cost_usd"] == pytest.approx(expected, rel=1e-3)
+    assert by_site["chat_common"]["p95_latency_ms"] == 900
+    assert {row["user"]: row["calls"] for row in report["top_users"]} == {"a": 2, "b": 1}
+    assert report["total_cost_usd"] == pytest.approx(1.5 * expected, rel=1e-3)
+
+
+def test_missing_usage_is_estimated_from_text_length():
+    meter = UsageMeter()
+    meter.record("openai/gpt-4o-mini", {"call_site": "intent"}, 10, prompt_chars=400, completion_chars=40)
+
+    row = meter.report()["call_sites"][0]
+    assert (row["prompt_tokens"], row["completion_tokens"], row["estimated"]) == (100, 10, 1)
+
+
+def test_file_sink_is_opt_in(monkeypatch):
+    monkeypatch.setattr(llm_metering, "LLM_USAGE_LOG", "")
+    assert "file" not in [name for name, _ in UsageMeter()._sinks]
+
+
+def test_file_sink_rotates(tmp_path, monkeypatch):
+    path = tmp_path / "usage.jsonl"
+    monkeypatch.setattr(llm_metering, "LLM_USAGE_LOG", str(path))
+    monkeypatch.setattr(llm_metering, "LLM_USAGE_LOG_MAX_BYTES", 100)
+    monkeypatch.setattr(llm_metering, "LLM_USAGE_LOG_BACKUPS", 2)
+    meter = UsageMeter()
+
+    for _ in range(6):
+        meter._write_file([{"call_site": "intent", "padding": "x" * 80}])
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["usage.jsonl", "usage.jsonl.1", "usage.jsonl.2"]
@@ -0,0 +1,129 @@
+import time
+
+import pytest
+
+from services import llm_resilience
+from services.llm_resilience import CircuitBreaker, ResilientCaller, UpstreamError
+
+MODEL = "test/model"
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(llm_resilience, "LLM_RETRY_BASE_MS", 1)
+    monkeypatch.setattr(llm_resilience, "LLM_RETRY_MAX_MS", 2)
+
+
+def _failing(status: int | None = 503):
+    calls = []
+
+    def send(model, timeout):
+        calls.append(model)
+        raise UpstreamError("upstream down", status=status)
+    return send, calls
+
+
+# ------------------------------------------------------------
+# CircuitBreaker
+# ------------------------------------------------------------
+
+def test_breaker_opens_after_threshold_and_rejects():
+    breaker = CircuitBreaker(failure_threshold=3, open_seconds=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.snapshot()["state"] == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_lets_one_probe_through_then_closes_on_success():
+    breaker = CircuitBreaker(failure_threshold=1, open_seconds=0)
+    breaker.record_failure()
+
+    assert breaker.allow()          # the probe
+    assert not breaker.allow()      # everyone else waits for its verdict
+    breaker.record_success()
+    assert breaker.snapshot() == {"state": CircuitBreaker.CLOSED, "consecutive_failures": 0, "retry_in_seconds": None}
+
+
+def test_failed_probe_reopens_and_released_probe_allows_another():
+    breaker = CircuitBreaker(failure_threshold=1, open_seconds=0)
+    breaker.record_failure()
+
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.snapshot()["state"] == CircuitBreaker.OPEN
+
+
+# ------------------------------------------------------------
+# ResilientCaller
+# ------------------------------------------------------------
+
+def test_retryable_errors_are_retried_then_give_none(monkeypatch):
+    monkeypatch.setattr(llm_resilience, "LLM_MAX_RETRIES", 2)
+    caller = ResilientCaller(max_workers=2)
+    send, calls = _failing(503)
+
+    assert caller.call(MODEL, send, timeout=5) is None
+    assert len(calls) == 3
+    assert caller.health()["retries"] == 2
+
+
+def test_client_errors_are_not_retried_and_do_not_trip_the_breaker():
+    caller = ResilientCaller(max_workers=2)
+    send, calls = _failing(400)
+
+    assert caller.call(MODEL, send, timeout=5) is None
+    assert len(calls) == 1
+    assert caller.breaker(MODEL).snapshot()["consecutive_failures"] == 0
+
+
+def test_open_circuit_rejects_without_calling_upstream(monkeypatch):
+    monkeypatch.setattr(llm_resilience, "LLM_MAX_RETRIES", 0)
+    caller = ResilientCaller(max_workers=2)
+    caller._breakers[MODEL] = CircuitBreaker(failure_threshold=2, open_seconds=60)
+    send, calls = _failing(503)
+
+    for _ in range(2):
+        caller.call(MODEL, send, timeout=5)
+    assert len(calls) == 2
+
+    assert caller.call(MODEL, send, timeout=5) is None
+    assert len(calls) == 2
+    health = caller.health()
+    assert health["circuit_rejections"] == 1
+    assert health["status"] == "degraded"
+
+
+def test_slow_primary_is_hedged_and_the_first_answer_wins(monkeypatch):
+    monkeypatch.setattr(llm_resilience, "LLM_HEDGE_DEFAULT_MS", 20)
+    caller = ResilientCaller(max_workers=4)
+    calls = []
+
+    def send(model, timeout):
+        calls.append(model)
+        if len(calls) == 1:
+            time.sleep(0.5)
+            return "slow"
+        return "fast"
+
+    assert caller.call(MODEL, send, timeout=5, hedge=True, call_site="intent") == "fast"
+    health = caller.health()
+    assert health["hedges"] == 1 and health["hedge_wins"] == 1
+
+
+def test_deadline_bounds_a_hung_upstream():
+    caller = ResilientCaller(max_workers=2)
+
+    def send(model, timeout):
+        time.sleep(1)
+        return "late"
+
+    started = time.monotonic()
+    assert caller.call(MODEL, send, timeout=0.1) is None
+    assert time.monotonic() - started < 0.5
+    assert caller.health()["timeouts"] == 1
@@ -0,0 +1,86 @@
+import json
+import threading
+
+import pytest
+
+from services.model_router import ModelRouter, USER_MODEL
+
+
+@pytest.fixture
+def router(tmp_path):
+    config = {
+        "tiers": {
+            "tiny": {
+                "models": ["model-a", USER_MODEL], "max_tokens": 100, "max_prompt_tokens": 200,
+                "latency_budget_ms": 5000, "max_concurrency": 1, "queue_timeout_ms": 50
+            }
+        },
+        "tasks": {"intent": "tiny"}
+    }
+    path = tmp_path / "router.json"
+    path.write_text(json.dumps(config))
+    return ModelRouter(str(path))
+
+
+def _messages(chars: int):
+    return [
+        {"role": "system", "content": "Classify the intent."},
+        {"role": "user", "content": "word " * (chars // 5)}
+    ]
+
+
+def test_prompt_is_cut_to_max_prompt_tokens(router):
+    seen = {}
+
+    def call_fn(model, tokens, timeout, messages):
+        seen["messages"] = messages
+        return "ok"
+
+    original = _messages(5000)
+    assert router.call("intent", call_fn, original) == "ok"
+
+    sent = seen["messages"]
+    assert sent[0] == original[0]                      # short instructions kept whole
+    assert sent[1]["content"].endswith("[truncated]")
+    assert original[1]["content"] == "word " * 1000     # caller's list untouched
+    stats = router.stats()["tasks"]["intent"]
+    assert stats["prompts_truncated"] == 1
+    assert stats["prompt_tokens"] <= 200
+
+
+def test_small_prompt_is_sent_unchanged(router):
+    original = _messages(100)
+    router.call("intent", lambda model, tokens, timeout, messages: messages, original)
+    assert "prompts_truncated" not in router.stats()["tasks"]["intent"]
+
+
+def test_falls_back_to_the_next_model_and_caps_tokens(router):
+    calls = []
+
+    def call_fn(model, tokens, timeout, messages):
+        calls.append((model, tokens))
+        return None if model == "model-a" else "ok"
+
+    assert router.call("intent", call_fn, _messages(10), user_model=lambda: "user-model", max_tokens=500) == "ok"
+    assert calls == [("model-a", 100), ("user-model", 100)]
+    assert router.stats()["tasks"]["intent"]["fallbacks"] == 1
+
+
+def test_saturated_tier_skips_the_call(router):
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow(model, tokens, timeout, messages):
+        started.set()
+        release.wait(5)
+        return "ok"
+
+    worker = threading.Thread(target=router.call, args=("intent", slow, _messages(10)))
+    worker.start()
+    started.wait(5)
+    try:
+        assert router.call("intent", lambda *args: "ok", _messages(10)) is None
+    finally:
+        release.set()
+        worker.join()
+    assert router.stats()["tasks"]["intent"]["rejected"] == 1
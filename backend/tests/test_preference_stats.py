@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from services import preference_stats
+
+
+@pytest.fixture
+def votes(fake_db, monkeypatch):
+    monkeypatch.setattr(preference_stats, "_users", preference_stats.OrderedDict())
+    fake_db._tables["user_memorys"] = [
+        {"id": 1, "user_id": 1, "response_category": "short", "context_feedback": True},
+        {"id": 2, "user_id": 1, "response_category": "short", "context_feedback": True},
+        {"id": 3, "user_id": 1, "response_category": "long", "context_feedback": False},
+        {"id": 4, "user_id": 1, "response_category": "long", "context_feedback": None},
+        {"id": 5, "user_id": 2, "response_category": "long", "context_feedback": True},
+    ]
+    return fake_db
+
+
+def test_summary_is_loaded_once_then_served_from_memory(votes):
+    assert preference_stats.get_summary(1) == {
+        "stats": {"short": 2, "medium": 0, "long": -1},
+        "preferred_style": "short"
+    }
+    calls = votes.calls
+    preference_stats.get_summary(1)
+    assert votes.calls == calls
+
+
+def test_flipping_a_vote_reverses_the_old_one(votes):
+    preference_stats.get_summary(1)
+    assert preference_stats.apply_feedback(1, 1, "short", False) == {"short": 0, "medium": 0, "long": -1}
+    assert preference_stats.apply_feedback(1, 1, "short", None) == {"short": 1, "medium": 0, "long": -1}
+
+
+def test_cache_is_bounded_lru(votes, monkeypatch):
+    monkeypatch.setattr(preference_stats, "PREFERENCE_STATS_MAX_USERS", 1)
+    preference_stats.get_summary(1)
+    preference_stats.get_summary(2)
+    assert list(preference_stats._users) == ["2"]
+
+
+def test_entry_is_reloaded_after_ttl(votes, monkeypatch):
+    preference_stats.get_summary(2)
+    # A vote recorded by another worker
+    votes._tables["user_memorys"].append(
+        {"id": 6, "user_id": 2, "response_category": "medium", "context_feedback": True}
+    )
+    assert preference_stats.get_summary(2)["stats"]["medium"] == 0
+
+    monkeypatch.setattr(preference_stats, "PREFERENCE_STATS_TTL_SECONDS", 0)
+    assert preference_stats.get_summary(2)["stats"]["medium"] == 1
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+pytest.importorskip("langchain_community")
+
+from security import rbac_utils
+from security.rbac_utils import PermissionBackendError, require_permission, resolve_permissions
+from utils import tiered_cache
+from utils.tiered_cache import SQLiteBus
+
+EMAIL = "rbac@example.com"
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    rbac_utils.invalidate_permissions()
+    yield
+    rbac_utils.invalidate_permissions()
+
+
+def _login(fake_db, permission_roles):
+    fake_db._tables["user_logins"] = [{"email": EMAIL, "permission_roles": permission_roles}]
+
+
+def _check(page: str, action: str = "View"):
+    checker = require_permission(page, action)
+    return asyncio.run(checker(request=None, current_user={"email": EMAIL, "role": "Employee"}))
+
+
+class _DownSupabase:
+    """Builds queries like supabase-py; execute() fails like a network error."""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        raise ConnectionError("supabase unreachable")
+
+
+def test_grants_are_compiled_and_cached(fake_db):
+    _login(fake_db, {"Projects": {"View": True, "Update": False}, "Tasks": {"All": True}})
+
+    assert _check("Projects")["email"] == EMAIL
+    assert _check("Tasks", "Delete")["email"] == EMAIL
+    with pytest.raises(HTTPException) as denied:
+        _check("Projects", "Update")
+    assert denied.value.status_code == 403
+    assert fake_db.calls == 1
+
+
+def test_malformed_permission_roles_is_denied_not_an_outage(fake_db):
+    _login(fake_db, ["Projects"])
+
+    assert resolve_permissions(EMAIL) is None
+    with pytest.raises(HTTPException) as denied:
+        _check("Projects")
+    assert denied.value.status_code == 403
+
+
+def test_unreachable_backend_without_cache_is_503(monkeypatch):
+    monkeypatch.setattr(rbac_utils, "supabase", _DownSupabase())
+
+    with pytest.raises(PermissionBackendError):
+        resolve_permissions(EMAIL)
+    with pytest.raises(HTTPException) as unavailable:
+        _check("Projects")
+    assert unavailable.value.status_code == 503
+
+
+def test_stale_entry_is_served_within_grace_when_backend_is_down(fake_db, monkeypatch):
+    _login(fake_db, {"Projects": {"View": True}})
+    resolve_permissions(EMAIL)
+
+    monkeypatch.setattr(rbac_utils, "PERMISSION_CACHE_TTL", 0)
+    monkeypatch.setattr(rbac_utils, "supabase", _DownSupabase())
+    assert resolve_permissions(EMAIL).allows("Projects", "View")
+
+    monkeypatch.setattr(rbac_utils, "PERMISSION_STALE_GRACE", -1)
+    with pytest.raises(PermissionBackendError):
+        resolve_permissions(EMAIL)
+
+
+def test_invalidation_from_another_worker_drops_the_cached_entry(fake_db, monkeypatch, tmp_path):
+    path = str(tmp_path / "cache_events.sqlite3")
+    this_worker, other_worker = SQLiteBus(path), SQLiteBus(path)
+    this_worker.subscribe(rbac_utils._on_invalidate)
+    monkeypatch.setattr(rbac_utils, "_bus", this_worker)
+    monkeypatch.setattr(tiered_cache, "CACHE_BUS_POLL_SECONDS", 0)
+
+    _login(fake_db, {"Projects": {"View": True}})
+    resolve_permissions(EMAIL)
+    _login(fake_db, {})
+
+    other_worker.publish(rbac_utils.PERMISSION_BUS_NAMESPACE, EMAIL)
+    assert not resolve_permissions(EMAIL).has_page("Projects")
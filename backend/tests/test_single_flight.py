@@ -0,0 +1,80 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.single_flight import SingleFlight, request_key
+
+CALLERS = 5
+
+
+def _overlapping(flight: SingleFlight, fn):
+    """Run CALLERS concurrent flight.do() calls; the leader is held until all have joined."""
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def leader_fn():
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return fn()
+
+    def call(i):
+        try:
+            return flight.do("same", leader_fn)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(CALLERS) as pool:
+        first = pool.submit(call, 0)
+        started.wait(5)
+        rest = [pool.submit(call, i) for i in range(1, CALLERS)]
+        # Let every follower reach do() before the leader finishes
+        while flight.stats()["calls"] < CALLERS:
+            time.sleep(0.001)
+        release.set()
+        results = [first.result()] + [f.result() for f in rest]
+    return results, len(runs)
+
+
+def test_overlapping_identical_calls_share_one_execution():
+    flight = SingleFlight("test")
+    results, runs = _overlapping(flight, lambda: {"answer": 42})
+
+    assert runs == 1
+    assert results == [{"answer": 42}] * CALLERS
+    stats = flight.stats()
+    assert stats["deduplicated"] == CALLERS - 1 and stats["in_flight"] == 0
+
+
+def test_waiters_receive_the_leaders_exception():
+    flight = SingleFlight("test")
+
+    def boom():
+        raise TimeoutError("upstream timeout")
+
+    results, runs = _overlapping(flight, boom)
+
+    assert runs == 1
+    assert all(isinstance(r, TimeoutError) for r in results)
+    assert flight.stats()["errors"] == 1
+
+
+def test_nothing_is_cached_after_the_call():
+    flight = SingleFlight("test")
+    calls = []
+    for _ in range(3):
+        flight.do("k", lambda: calls.append(1))
+    assert len(calls) == 3
+
+
+def test_request_key_is_stable_and_distinguishes_requests():
+    messages = [{"role": "user", "content": "hi"}]
+    assert request_key("m", messages, {"a": 1, "b": 2}) == request_key("m", messages, {"b": 2, "a": 1})
+    assert request_key("m", messages) != request_key("other", messages)
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight("test")
+    assert [flight.do(str(i), lambda i=i: i) for i in range(3)] == [0, 1, 2]
+    assert flight.stats()["executed"] == 3
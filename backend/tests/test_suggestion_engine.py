@@ -0,0 +1,81 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from services import suggestion_engine
+from services.suggestion_engine import SuggestionJob
+
+
+@pytest.fixture
+def slow_llm(monkeypatch):
+    release = threading.Event()
+    started = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    def speculate(user_query, project_data, user_email):
+        started.set()
+        release.wait(5)
+        return ["What is the deadline?", "Who owns this?"]
+
+    monkeypatch.setattr(suggestion_engine, "_executor", executor)
+    monkeypatch.setattr(suggestion_engine, "_speculate", speculate)
+    monkeypatch.setattr(suggestion_engine, "_stats", dict.fromkeys(suggestion_engine._stats, 0))
+    yield started, release
+    release.set()
+    executor.shutdown(wait=True)
+
+
+def test_running_call_is_left_to_finish_and_counted_as_abandoned(slow_llm):
+    started, release = slow_llm
+    job = SuggestionJob("status?", None, None, None, speculate=True)
+    started.wait(5)
+
+    job.resolve("Plain answer.", inline=[], wait=0)
+
+    assert not job._future.cancelled()
+    release.set()
+    assert job._future.result(5)
+    stats = suggestion_engine.get_suggestion_stats()
+    assert (stats["llm_timeouts"], stats["llm_abandoned"], stats["llm_cancelled"]) == (1, 1, 0)
+
+
+def test_queued_call_is_cancelled(slow_llm):
+    started, _ = slow_llm
+    busy = SuggestionJob("first", None, None, None, speculate=True)
+    started.wait(5)
+    queued = SuggestionJob("second", None, None, None, speculate=True)
+
+    queued.resolve("Plain answer.", inline=[], wait=0)
+
+    assert queued._future.cancelled()
+    assert not busy._future.cancelled()
+    assert suggestion_engine.get_suggestion_stats()["llm_cancelled"] == 1
+
+
+def test_inline_suggestions_skip_the_speculative_result(slow_llm):
+    started, _ = slow_llm
+    job = SuggestionJob("status?", None, None, None, speculate=True)
+    started.wait(5)
+
+    result = job.resolve("Answer", inline=["Which tasks are late?", "Who is on the team?"])
+
+    assert result[:2] == ["Which tasks are late?", "Who is on the team?"]
+    stats = suggestion_engine.get_suggestion_stats()
+    assert (stats["inline"], stats["llm_abandoned"]) == (1, 1)
+
+
+def test_resolve_async_uses_the_speculative_result_when_it_arrives(slow_llm, monkeypatch):
+    _, release = slow_llm
+    monkeypatch.setattr(suggestion_engine, "SUGGESTIONS_WAIT_SECONDS", 5)
+    job = SuggestionJob("status?", None, None, None, speculate=True)
+    threading.Timer(0.05, release.set).start()
+
+    result = asyncio.run(job.resolve_async("Plain answer.", inline=[]))
+
+    assert "What is the deadline?" in result
+    stats = suggestion_engine.get_suggestion_stats()
+    assert (stats["llm_used"], stats["llm_timeouts"], stats["llm_abandoned"]) == (1, 0, 0)
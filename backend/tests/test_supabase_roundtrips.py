@@ -0,0 +1,59 @@
+"""
+Supabase calls per chat turn must stay within scripts/supabase_budgets.json.
+
+Runs scripts/bench_supabase_roundtrips.py in a subprocess (core creates its
+Supabase client at import time, so the fake must be installed in a fresh
+interpreter) and checks the call counts per service and turn. Wall time is
+left to the bench's own --check in CI.
+"""
+import os
+import sys
+import json
+import socket
+import subprocess
+
+import pytest
+
+pytest.importorskip("langchain_community")
+pytest.importorskip("uvicorn")
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+BENCH = os.path.join(SCRIPTS_DIR, "bench_supabase_roundtrips.py")
+BUDGETS = os.path.join(SCRIPTS_DIR, "supabase_budgets.json")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def results(tmp_path_factory):
+    out = tmp_path_factory.mktemp("bench") / "results.json"
+    proc = subprocess.run(
+        [sys.executable, BENCH, "--latency-ms", "0", "--mock-port", str(_free_port()), "--json", str(out)],
+        capture_output=True, text=True, timeout=600
+    )
+    assert proc.returncode == 0, proc.stdout[-2000:] + proc.stderr[-2000:]
+    with open(out) as f:
+        return json.load(f)
+
+
+with open(BUDGETS) as _f:
+    BUDGET_CASES = [
+        (service, turn, budget["calls"])
+        for service, turns in json.load(_f).items()
+        for turn, budget in turns.items()
+    ]
+
+
+@pytest.mark.parametrize("service,turn,budget", BUDGET_CASES)
+def test_calls_within_budget(results, service, turn, budget):
+    measured = results[service][turn]
+    assert measured["calls"] <= budget, f"{service}/{turn}: by table {measured['by_table']}"
+
+
+def test_warm_turn_not_more_expensive_than_cold(results):
+    for service, turns in results.items():
+        assert turns["warm"]["calls"] <= turns["cold"]["calls"], service
@@ -0,0 +1,111 @@
+import time
+
+import jwt
+import pytest
+
+from security import auth_utils
+from security.auth_utils import create_access_token, create_refresh_token, verify_token, revoke_token
+
+USER = {"id": "u-1", "email": "token@example.com", "role": "Employee"}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    with auth_utils._token_cache_lock:
+        auth_utils._token_cache.clear()
+        auth_utils._revoked_tokens.clear()
+    auth_utils._revocation_store.clear()
+    yield
+
+
+def _token(exp_offset: float) -> str:
+    now = time.time()
+    return jwt.encode({
+        "sub": "u-1", "iat": int(now), "exp": int(now + exp_offset),
+        "iss": auth_utils.JWT_ISSUER, "aud": auth_utils.JWT_AUDIENCE, "type": "access"
+    }, auth_utils.PRIVATE_KEY, algorithm=auth_utils.JWT_ALGORITHM)
+
+
+def test_second_verify_is_served_from_cache():
+    token = create_access_token(USER)
+    decodes = auth_utils.get_token_cache_stats()["decode_count"]
+
+    assert verify_token(token)["email"] == USER["email"]
+    assert verify_token(token)["email"] == USER["email"]
+    assert auth_utils.get_token_cache_stats()["decode_count"] == decodes + 1
+
+
+def test_cached_token_is_not_trusted_past_exp(monkeypatch):
+    token = _token(60)
+    assert "error" not in verify_token(token)
+
+    decodes = auth_utils.get_token_cache_stats()["decode_count"]
+    later = time.time() + 120
+    monkeypatch.setattr(auth_utils.time, "time", lambda: later)
+    verify_token(token)
+
+    # Dropped from the cache and verified again (PyJWT checks exp itself)
+    assert auth_utils.get_token_cache_stats()["decode_count"] == decodes + 1
+    assert auth_utils._token_digest(token) not in auth_utils._token_cache
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(auth_utils, "TOKEN_CACHE_MAX_ENTRIES", 3)
+    tokens = [create_access_token({**USER, "id": f"u-{i}"}) for i in range(5)]
+    for token in tokens:
+        verify_token(token)
+    assert len(auth_utils._token_cache) == 3
+    assert auth_utils._token_digest(tokens[0]) not in auth_utils._token_cache
+
+
+def test_revoked_token_is_rejected_until_exp():
+    token = create_access_token(USER)
+    verify_token(token)
+    revoke_token(token)
+    assert verify_token(token) == {"error": "Token revoked"}
+
+
+def test_revocation_from_another_worker_via_bus():
+    token = create_access_token(USER)
+    verify_token(token)
+    digest = auth_utils._token_digest(token)
+
+    exp = time.time() + 600
+    auth_utils._on_token_revoked(auth_utils.TOKEN_REVOCATION_NAMESPACE, f"{digest}:{exp}")
+    assert verify_token(token) == {"error": "Token revoked"}
+
+
+def test_revocation_from_another_worker_via_shared_store():
+    token = create_access_token(USER)
+    digest = auth_utils._token_digest(token)
+
+    # Written by another worker; this one never cached or revoked the token
+    auth_utils._revocation_store.set(digest, time.time() + 600)
+    assert verify_token(token) == {"error": "Token revoked"}
+
+
+def test_refresh_sets_new_token_cookie(monkeypatch):
+    pytest.importorskip("langchain_community")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from security import fastapi_routes
+    from security.models.user import User, users_db
+
+    user = User("u-refresh", "refresh@example.com", "x")
+    monkeypatch.setitem(users_db, user.id, user)
+    monkeypatch.setattr(fastapi_routes, "get_user_role", lambda email: "Employee")
+
+    app = FastAPI()
+    app.include_router(fastapi_routes.router)
+    client = TestClient(app)
+    # Issued before a role change: the refreshed token carries the current role
+    old_access = create_access_token({"id": user.id, "email": user.email, "role": "Admin"})
+    client.cookies.set("refresh_token", create_refresh_token(user.id))
+    client.cookies.set("token", old_access)
+
+    res = client.post("/auth/refresh")
+
+    assert res.status_code == 200
+    assert res.cookies.get("token") == res.json()["access_token"]
+    assert verify_token(res.json()["access_token"])["role"] == "Employee"
+    assert verify_token(old_access) == {"error": "Token revoked"}
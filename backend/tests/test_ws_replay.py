@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from services import ws_replay
+from services.ws_replay import ReplayUnavailable, start_generation, get_generation
+
+EMAIL = "replay@example.com"
+
+
+async def _collect(gen, offset=0):
+    return [frame async for frame in gen.follow(offset)]
+
+
+def _producer(count: int, gate: asyncio.Event | None = None):
+    async def produce(gen):
+        for i in range(count):
+            if gate is not None and i == count // 2:
+                await gate.wait()
+            await gen.append({"type": "token", "content": f"t{i}"})
+    return produce
+
+
+def test_resume_replays_from_offset_then_follows_live():
+    async def scenario():
+        gate = asyncio.Event()
+        gen = start_generation(EMAIL, "r1", _producer(6, gate))
+
+        # First socket reads the first half, then "drops"
+        first = []
+        async for frame in gen.follow(0):
+            first.append(frame)
+            if len(first) == 3:
+                break
+
+        # Reconnect from the last seen seq + 1 while generation continues
+        resumed = asyncio.ensure_future(_collect(gen, first[-1]["seq"] + 1))
+        gate.set()
+        return first, await resumed
+
+    first, resumed = asyncio.run(scenario())
+
+    assert [f["content"] for f in first] == ["t0", "t1", "t2"]
+    assert [f["content"] for f in resumed] == ["t3", "t4", "t5"]
+    assert [f["seq"] for f in first + resumed] == list(range(6))
+
+
+def test_finished_generation_is_replayable_by_its_owner_only():
+    async def scenario():
+        gen = start_generation(EMAIL, "r2", _producer(3))
+        await gen.task
+        return gen, await _collect(get_generation(gen.generation_id, EMAIL), 1)
+
+    gen, frames = asyncio.run(scenario())
+
+    assert [f["seq"] for f in frames] == [1, 2]
+    assert get_generation(gen.generation_id, "someone@example.com") is None
+
+
+def test_offset_dropped_from_bounded_buffer_is_unavailable(monkeypatch):
+    monkeypatch.setattr(ws_replay, "WS_REPLAY_MAX_BYTES", 200)
+
+    async def scenario():
+        gen = start_generation(EMAIL, "r3", _producer(20))
+        await gen.task
+        tail = await _collect(gen, 19)
+        with pytest.raises(ReplayUnavailable):
+            await _collect(gen, 0)
+        return tail
+
+    assert [f["seq"] for f in asyncio.run(scenario())] == [19]
+
+
+def test_generation_is_cancelled_after_disconnect_grace(monkeypatch):
+    monkeypatch.setattr(ws_replay, "WS_REPLAY_GRACE_SECONDS", 0.01)
+
+    async def scenario():
+        never = asyncio.Event()
+        gen = start_generation(EMAIL, "r4", _producer(4, never))
+        async for _ in gen.follow(0):
+            break
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(gen.task, 1)
+        return gen
+
+    assert asyncio.run(scenario()).finished
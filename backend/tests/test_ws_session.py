@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+import core
+from services import ws_session
+from services.ws_session import ChatSession
+
+EMAIL = "ws@example.com"
+PROJECT_ID = "00000000-0000-0000-0000-000000000001"
+CHAT_ID = "00000000-0000-0000-0000-0000000000aa"
+
+
+@pytest.fixture
+def chat_rows(fake_db):
+    fake_db._tables["user_perms"] = [{"id": 7, "email": EMAIL}]
+    fake_db._tables["user_memorys"] = [
+        {
+            "id": i, "user_id": 7, "project_id": PROJECT_ID, "chat_id": CHAT_ID,
+            "role": "user" if i % 2 else "assistant", "content": f"m{i}",
+            "created_at": f"2024-01-01T00:00:{i:02d}+00:00"
+        }
+        for i in range(20)
+    ]
+    return fake_db
+
+
+def test_http_and_ws_history_return_the_same_newest_window(chat_rows):
+    session = ChatSession(EMAIL)
+    session.user_id = 7
+
+    ws_history = session.history(PROJECT_ID, CHAT_ID, limit=5)
+    http_history = core.load_chat_history(EMAIL, PROJECT_ID, CHAT_ID, limit=5)
+
+    assert [m["content"] for m in ws_history] == ["m15", "m16", "m17", "m18", "m19"]
+    assert http_history == ws_history
+
+
+@pytest.fixture
+def identity(monkeypatch):
+    state = {"role": "Employee", "loads": 0}
+
+    def get_role(email):
+        state["loads"] += 1
+        return state["role"]
+
+    monkeypatch.setattr(ws_session, "get_user_perms_id", lambda email: 7)
+    monkeypatch.setattr(ws_session, "get_user_role", get_role)
+    monkeypatch.setattr(ws_session, "get_user_llm_model", lambda email: None)
+    monkeypatch.setattr(ws_session, "resolve_permissions", lambda email: None)
+    return state
+
+
+def test_ensure_fresh_waits_for_refresh_after_mark_stale(identity):
+    async def scenario():
+        session = await ChatSession.open(EMAIL)
+        try:
+            identity["role"] = "Admin"
+            ws_session.mark_stale(EMAIL)
+            await session.ensure_fresh()
+            return session.role
+        finally:
+            session.close()
+
+    assert asyncio.run(scenario()) == "Admin"
+
+
+def test_ensure_fresh_refreshes_expired_session_in_background(identity):
+    async def scenario():
+        session = await ChatSession.open(EMAIL)
+        try:
+            identity["role"] = "Admin"
+            session.loaded_at = 0
+            await session.ensure_fresh()
+            before = session.role
+            await session._refresh_task
+            return before, session.role
+        finally:
+            session.close()
+
+    assert asyncio.run(scenario()) == ("Employee", "Admin")
+
+
+def test_mark_stale_during_refresh_triggers_another_refresh(identity):
+    async def scenario():
+        session = await ChatSession.open(EMAIL)
+        try:
+            session.loaded_at = 0
+            await session.ensure_fresh()          # background refresh in flight
+            identity["role"] = "Admin"
+            ws_session.mark_stale(EMAIL)
+            loads = identity["loads"]
+            await session.ensure_fresh()
+            return session.role, identity["loads"] - loads
+        finally:
+            session.close()
+
+    role, loads = asyncio.run(scenario())
+    assert role == "Admin"
+    assert loads >= 1
@@ -0,0 +1,58 @@
+import asyncio
+
+from services.ws_utils import coalesce_frames, iter_frames
+
+
+async def _frames(*items, delay: float = 0):
+    for item in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield item
+
+
+def _run(frames, **budget):
+    async def collect():
+        return [frame async for frame in coalesce_frames(frames, **budget)]
+    return asyncio.run(collect())
+
+
+def _token(text: str) -> dict:
+    return {"type": "token", "content": text}
+
+
+def test_tokens_within_the_budget_are_merged_into_one_frame():
+    out = _run(_frames(*map(_token, "hello")), max_delay_ms=1000, max_bytes=1000)
+    assert out == [_token("hello")]
+
+
+def test_byte_budget_flushes_early():
+    out = _run(_frames(*map(_token, "abcdef")), max_delay_ms=1000, max_bytes=2)
+    assert out == [_token("ab"), _token("cd"), _token("ef")]
+
+
+def test_time_budget_flushes_a_slow_stream():
+    out = _run(_frames(_token("a"), _token("b"), delay=0.05), max_delay_ms=10, max_bytes=1000)
+    assert out == [_token("a"), _token("b")]
+
+
+def test_other_frames_flush_pending_tokens_and_keep_order():
+    meta = {"type": "meta", "chat_id": "c1"}
+    tagged = {"type": "token", "content": "!", "request_id": "r1"}
+    out = _run(_frames(_token("a"), _token("b"), meta, tagged, _token("c"), {"type": "done"}),
+               max_delay_ms=1000, max_bytes=1000)
+    assert out == [_token("ab"), meta, tagged, _token("c"), {"type": "done"}]
+
+
+def test_zero_delay_disables_batching():
+    out = _run(_frames(*map(_token, "abc")), max_delay_ms=0, max_bytes=1000)
+    assert out == [_token("a"), _token("b"), _token("c")]
+
+
+def test_non_stream_reply_becomes_token_meta_done():
+    async def collect():
+        return [f async for f in coalesce_frames(iter_frames({"reply": "hi", "chat_id": "c1", "message_id": 3}))]
+
+    token, meta, done = asyncio.run(collect())
+    assert token == _token("hi")
+    assert meta["chat_id"] == "c1" and meta["message_ids"] == {"assistant": 3}
+    assert done == {"type": "done"}
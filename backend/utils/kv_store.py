@@ -0,0 +1,295 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# ============================================================
+# ==================== KEY / VALUE STORES ====================
+# ============================================================
+# Small JSON key/value stores with TTLs, used for state that must survive
+# between requests (chat sessions, shared caches):
+#
+#   MemoryStore  - per-process LRU + TTL with entry and byte caps
+#   SQLiteStore  - file backed; shared by workers on one host, and a
+#                  stand-in for Redis in tests / local runs
+#   RedisStore   - shared across hosts (needs the optional `redis` package)
+#
+# Every store exposes get / set / delete / clear / stats.
+
+KV_STORE_REDIS_TIMEOUT_SECONDS = float(os.getenv("KV_STORE_REDIS_TIMEOUT_SECONDS", "2"))
+# "1": refuse to start when the configured Redis cannot be reached, instead
+# of falling back to a per-process memory store
+KV_STORE_STRICT = os.getenv("KV_STORE_STRICT", "0") == "1"
+
+
+class MemoryStore:
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 32 * 1024 * 1024, default_ttl: float | None = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+
+        self._data = OrderedDict()   # key -> (json, expires_at | None)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "sets": 0, "evictions_lru": 0, "evictions_ttl": 0}
+
+    def get(self, key: str, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+
+            raw, expires_at = entry
+            if expires_at is not None and expires_at <= now:
+                self._remove(key)
+                self._stats["evictions_ttl"] += 1
+                self._stats["misses"] += 1
+                return default
+
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+
+        return json.loads(raw)
+
+    def set(self, key: str, value, ttl: float | None = None):
+        raw = json.dumps(value, separators=(",", ":"), default=str)
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (raw, expires_at)
+            self._bytes += len(raw)
+            self._stats["sets"] += 1
+            self._evict()
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                **self._stats,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes
+            }
+
+    def _remove(self, key: str):
+        raw, _ = self._data.pop(key)
+        self._bytes -= len(raw)
+
+    def _evict(self):
+        # Expired entries first, then least recently used
+        now = time.time()
+        for key in [k for k, (_, exp) in self._data.items() if exp is not None and exp <= now]:
+            self._remove(key)
+            self._stats["evictions_ttl"] += 1
+
+        while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            key = next(iter(self._data))
+            self._remove(key)
+            self._stats["evictions_lru"] += 1
+
+
+class SQLiteStore:
+
+    def __init__(self, path: str, default_ttl: float | None = None, max_entries: int = 100000):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "sets": 0, "evictions_ttl": 0, "evictions_lru": 0}
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL,"
+            " touched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, default=None):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM kv WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return default
+
+            if row[1] is not None and row[1] <= now:
+                self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+                self._conn.commit()
+                self._stats["evictions_ttl"] += 1
+                self._stats["misses"] += 1
+                return default
+
+            self._conn.execute("UPDATE kv SET touched_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._stats["hits"] += 1
+
+        return json.loads(row[0])
+
+    def set(self, key: str, value, ttl: float | None = None):
+        raw = json.dumps(value, separators=(",", ":"), default=str)
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO kv (key, value, expires_at, touched_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, "
+                "expires_at = excluded.expires_at, touched_at = excluded.touched_at",
+                (key, raw, expires_at, now)
+            )
+            self._stats["sets"] += 1
+            self._evict(now)
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM kv")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM kv").fetchone()
+            return {
+                "backend": "sqlite",
+                "path": self.path,
+                **self._stats,
+                "entries": entries,
+                "bytes": size,
+                "max_entries": self.max_entries
+            }
+
+    def _evict(self, now: float):
+        cur = self._conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        self._stats["evictions_ttl"] += max(cur.rowcount, 0)
+
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM kv").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            cur = self._conn.execute(
+                "DELETE FROM kv WHERE key IN (SELECT key FROM kv ORDER BY touched_at ASC LIMIT ?)",
+                (overflow,)
+            )
+            self._stats["evictions_lru"] += max(cur.rowcount, 0)
+
+
+class RedisStore:
+    """Shared store for multi-worker / multi-host deployments (pip install redis)."""
+
+    def __init__(self, url: str, namespace: str = "", default_ttl: float | None = None):
+        import redis   # optional dependency
+
+        self.url = url
+        self.namespace = namespace
+        self.default_ttl = default_ttl
+        self.client = redis.Redis.from_url(
+            url,
+            socket_connect_timeout=KV_STORE_REDIS_TIMEOUT_SECONDS,
+            socket_timeout=KV_STORE_REDIS_TIMEOUT_SECONDS
+        )
+        # from_url() connects lazily: find out now, not on the first request
+        self.client.ping()
+        self._stats = {"hits": 0, "misses": 0, "sets": 0}
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}" if self.namespace else key
+
+    def get(self, key: str, default=None):
+        raw = self.client.get(self._key(key))
+        if raw is None:
+            self._stats["misses"] += 1
+            return default
+        self._stats["hits"] += 1
+        return json.loads(raw)
+
+    def set(self, key: str, value, ttl: float | None = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        raw = json.dumps(value, separators=(",", ":"), default=str)
+        self.client.set(self._key(key), raw, px=int(ttl * 1000) if ttl else None)
+        self._stats["sets"] += 1
+
+    def delete(self, key: str):
+        self.client.delete(self._key(key))
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self._key("*")):
+            self.client.delete(key)
+
+    def stats(self) -> dict:
+        # Memory caps and eviction are Redis' own (maxmemory / maxmemory-policy)
+        info = self.client.info("stats")
+        return {
+            "backend": "redis",
+            **self._stats,
+            "evicted_keys": info.get("evicted_keys"),
+            "expired_keys": info.get("expired_keys")
+        }
+
+
+def build_store(
+    namespace: str,
+    backend: str | None = None,
+    default_ttl: float | None = None,
+    max_entries: int = 10000,
+    max_bytes: int = 32 * 1024 * 1024
+):
+    """
+    Create a store from configuration.
+
+    backend: "memory" | "sqlite" | "redis" (default: KV_STORE_BACKEND, else "memory")
+      sqlite uses KV_STORE_SQLITE_DIR/<namespace>.sqlite3
+      redis uses KV_STORE_REDIS_URL; falls back to memory if the package is
+      missing or the server does not answer a ping (KV_STORE_STRICT=1: raise)
+    """
+    backend = (backend or os.getenv("KV_STORE_BACKEND") or "memory").lower()
+
+    if backend == "redis":
+        try:
+            return RedisStore(
+                os.getenv("KV_STORE_REDIS_URL", "redis://localhost:6379/0"),
+                namespace=namespace,
+                default_ttl=default_ttl
+            )
+        except Exception as e:
+            if KV_STORE_STRICT:
+                raise RuntimeError(f"Redis store unavailable for {namespace}: {e}") from e
+            print(f"⚠ Redis store unavailable for {namespace}, using memory: {e}")
+
+    if backend == "sqlite":
+        directory = os.getenv("KV_STORE_SQLITE_DIR", ".")
+        os.makedirs(directory, exist_ok=True)
+        return SQLiteStore(
+            os.path.join(directory, f"{namespace}.sqlite3"),
+            default_ttl=default_ttl,
+            max_entries=max_entries
+        )
+
+    return MemoryStore(max_entries=max_entries, max_bytes=max_bytes, default_ttl=default_ttl)
@@ -0,0 +1,229 @@
+import os
+import json
+import threading
+import uuid
+
+try:
+    import fcntl
+except ImportError:   # Windows: single-process locking only
+    fcntl = None
+
+# ============================================================
+# ============ APPEND-ONLY KEY/VALUE LOG (embedded) ==========
+# ============================================================
+# One JSON record per line:  {"k": key, "v": value}  or  {"k": key, "d": 1}
+# The first line, {"epoch": ...}, changes whenever the file is rewritten.
+#
+#   - writes append whole records and fsync; readers skip a torn last line
+#   - an in-memory index maps key -> (offset, length) of its latest record
+#   - other processes' appends are picked up by reading the file tail
+#   - an exclusive flock on <path>.lock serialises access across workers
+#   - compaction rewrites live records to a temp file and os.replace()s it
+#     once dead records outweigh live ones
+
+
+class AppendOnlyStore:
+
+    COMPACT_MIN_BYTES = 256 * 1024
+
+    def __init__(self, path: str, import_json: str | None = None):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self._lock = threading.RLock()
+
+        self._index = {}       # key -> (offset, length)
+        self._end = 0          # bytes of the log already indexed
+        self._epoch = None
+        self._live_bytes = 0
+
+        with self._file_lock():
+            if not os.path.exists(self.path):
+                self._create(import_json)
+            self._reload()
+
+    # ------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------
+
+    def get(self, key: str, default=None):
+        with self._lock, self._file_lock():
+            self._catch_up()
+            entry = self._index.get(key)
+            if entry is None:
+                return default
+            with open(self.path, "rb") as f:
+                f.seek(entry[0])
+                record = json.loads(f.read(entry[1]))
+            return record.get("v", default)
+
+    def items(self) -> dict:
+        with self._lock, self._file_lock():
+            self._catch_up()
+            result = {}
+            with open(self.path, "rb") as f:
+                for key, (offset, length) in self._index.items():
+                    f.seek(offset)
+                    result[key] = json.loads(f.read(length)).get("v")
+            return result
+
+    def put(self, key: str, value):
+        self.put_many({key: value})
+
+    def put_many(self, data: dict):
+        """Append all records in one fsync'd write."""
+        if not data:
+            return
+        self._append([{"k": str(k), "v": v} for k, v in data.items()])
+
+    def delete(self, key: str):
+        self._append([{"k": str(key), "d": 1}])
+
+    def compact(self):
+        with self._lock, self._file_lock():
+            self._catch_up()
+            self._compact()
+
+    # ------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------
+
+    def _file_lock(self):
+        return _FileLock(self.lock_path)
+
+    def _create(self, import_json: str | None):
+        records = []
+        if import_json and os.path.exists(import_json):
+            try:
+                with open(import_json, "r") as f:
+                    legacy = json.load(f)
+                records = [{"k": str(k), "v": v} for k, v in (legacy or {}).items()]
+                print(f"ℹ Imported {len(records)} records from {import_json} into {self.path}")
+            except Exception as e:
+                print(f"⚠ Could not import {import_json}: {e}")
+        self._write_atomic(records)
+
+    def _append(self, records: list):
+        payload = b"".join(_encode(r) for r in records)
+
+        with self._lock, self._file_lock():
+            self._catch_up()
+            # Anything past the indexed end is a torn write from a crash: overwrite it
+            with open(self.path, "r+b") as f:
+                offset = self._end
+                f.seek(offset)
+                f.write(payload)
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+
+            for record in records:
+                line = _encode(record)
+                self._apply(record, offset, len(line))
+                offset += len(line)
+            self._end = offset
+
+            if self._end > self.COMPACT_MIN_BYTES and self._end > 2 * self._live_bytes:
+                self._compact()
+
+    def _apply(self, record: dict, offset: int, length: int):
+        key = record.get("k")
+        previous = self._index.pop(key, None)
+        if previous:
+            self._live_bytes -= previous[1]
+        if not record.get("d"):
+            self._index[key] = (offset, length)
+            self._live_bytes += length
+
+    def _reload(self):
+        self._index = {}
+        self._end = 0
+        self._live_bytes = 0
+        self._epoch = self._read_epoch()
+        self._read_from(0)
+
+    def _catch_up(self):
+        """Index records appended by other processes (or reload after their compaction)."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_size < self._end or self._read_epoch() != self._epoch:
+            self._reload()
+        elif stat.st_size > self._end:
+            self._read_from(self._end)
+
+    def _read_from(self, start: int):
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break   # torn write at the tail; not committed
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    offset += len(line)
+                    continue
+                if "k" in record:
+                    self._apply(record, offset, len(line))
+                offset += len(line)
+        self._end = offset
+
+    def _read_epoch(self):
+        with open(self.path, "rb") as f:
+            try:
+                return json.loads(f.readline()).get("epoch")
+            except ValueError:
+                return None
+
+    def _compact(self):
+        records = []
+        with open(self.path, "rb") as f:
+            for key, (offset, length) in self._index.items():
+                f.seek(offset)
+                records.append(json.loads(f.read(length)))
+        self._write_atomic(records)
+        self._reload()
+
+    def _write_atomic(self, records: list):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_encode({"epoch": uuid.uuid4().hex}))
+            f.write(b"".join(_encode(r) for r in records))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+
+class _FileLock:
+    """Exclusive cross-process lock on a side file (no-op without fcntl)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._fd = open(self.path, "a")
+            fcntl.flock(self._fd.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd.fileno(), fcntl.LOCK_UN)
+            self._fd.close()
+            self._fd = None
+
+
+def _encode(record: dict) -> bytes:
+    return (json.dumps(record, separators=(",", ":"), default=str) + "\n").encode("utf-8")
@@ -0,0 +1,108 @@
+import re
+import uuid
+import base64
+import json
+from datetime import datetime
+
+
+class InvalidCursor(ValueError):
+    """A cursor (or `since` value) that is malformed or does not fit the sort key."""
+
+
+def encode_cursor(values: dict) -> str:
+    """
+    Encode keyset values (e.g. {"assigned_at": ..., "id": ...}) into an
+    opaque, URL-safe cursor string.
+    """
+    raw = json.dumps(values, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str | None) -> dict | None:
+    """
+    Decode a cursor produced by encode_cursor.
+    Returns None for an empty cursor; raises InvalidCursor for a malformed one.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(values, dict):
+        raise InvalidCursor("Malformed cursor")
+    return values
+
+
+def check_key_value(column: str, value):
+    """
+    Validate a client supplied keyset value before it goes into a filter.
+
+    Cursors are client controlled and end up inside or_() filter strings, so
+    only values of the column's shape are let through: an int or UUID for
+    `id`, an ISO timestamp for every other sort column.
+    """
+    if column == "id":
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        if isinstance(value, str):
+            if re.fullmatch(r"\d{1,19}", value):
+                return value
+            try:
+                return str(uuid.UUID(value))
+            except ValueError:
+                pass
+        raise InvalidCursor(f"Invalid cursor value for {column}")
+
+    if isinstance(value, str) and re.fullmatch(r"[0-9T:.+\- Z]{10,40}", value):
+        try:
+            datetime.fromisoformat(value)
+            return value
+        except ValueError:
+            pass
+    raise InvalidCursor(f"Invalid cursor value for {column}")
+
+
+def apply_keyset(
+    query,
+    sort_col: str,
+    tie_col: str | None,
+    cursor: dict | None,
+    desc: bool = True
+):
+    """
+    Apply keyset ordering (sort_col, tie_col) and, when a cursor is given,
+    the "rows after this one" filter to a Supabase query builder.
+
+    Cursor values are checked with check_key_value (InvalidCursor otherwise).
+    Endpoint scoping filters belong on the query itself, not in here.
+    """
+    op = "lt" if desc else "gt"
+
+    if cursor and cursor.get(sort_col) is not None:
+        sort_val = check_key_value(sort_col, cursor[sort_col])
+        if tie_col and tie_col != sort_col and cursor.get(tie_col) is not None:
+            tie_val = check_key_value(tie_col, cursor[tie_col])
+            query = query.or_(
+                f'{sort_col}.{op}."{sort_val}",'
+                f'and({sort_col}.eq."{sort_val}",{tie_col}.{op}."{tie_val}")'
+            )
+        else:
+            query = query.or_(f'{sort_col}.{op}."{sort_val}"')
+
+    query = query.order(sort_col, desc=desc)
+    if tie_col and tie_col != sort_col:
+        query = query.order(tie_col, desc=desc)
+    return query
+
+
+def next_cursor(rows: list, sort_col: str, tie_col: str | None, limit: int | None) -> str | None:
+    """Return the cursor for the page after `rows`, or None on the last page."""
+    if not limit or not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    values = {sort_col: last.get(sort_col)}
+    if tie_col:
+        values[tie_col] = last.get(tie_col)
+    return encode_cursor(values)
@@ -0,0 +1,77 @@
+import os
+import threading
+
+# ============================================================
+# ============ STATIC-FIRST SYSTEM PROMPT TEMPLATES ===========
+# ============================================================
+# Providers cache the KV state of a prompt *prefix* (OpenAI: prompts of
+# 1024+ tokens, in 128-token steps). A prefix only matches if it is
+# byte-identical, so anything user-specific early in the system prompt
+# (name, email, facts) makes every request a cache miss.
+#
+# A PromptTemplate is:
+#   static blocks   joined once, when the template is created
+#   dynamic part    str.format() template rendered per request, placed last
+#
+# Each render records how much of the prompt is the shared static prefix
+# and how much it shares with the previous render of the same template.
+# get_prompt_stats() reports both.
+
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "1024"))
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    limit = min(len(a), len(b))
+    i = 0
+    while i < limit and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class PromptTemplate:
+
+    def __init__(self, name: str, static_blocks: list[str], dynamic: str = ""):
+        self.name = name
+        self.prefix = "\n\n".join(block.strip("\n") for block in static_blocks if block) + "\n\n"
+        self.dynamic = dynamic
+
+        self._lock = threading.Lock()
+        self._last = None
+        self._stats = {"renders": 0, "total_chars": 0, "shared_chars": 0}
+
+        with _templates_lock:
+            _templates[name] = self
+
+    def render(self, **values) -> str:
+        text = self.prefix + self.dynamic.format(**values)
+        with self._lock:
+            shared = _common_prefix_length(self._last, text) if self._last is not None else len(self.prefix)
+            self._last = text
+            self._stats["renders"] += 1
+            self._stats["total_chars"] += len(text)
+            self._stats["shared_chars"] += shared
+        return text
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        renders = stats["renders"] or 1
+        prefix_tokens = len(self.prefix) // 4
+        return {
+            "renders": stats["renders"],
+            "static_prefix_chars": len(self.prefix),
+            "static_prefix_tokens_est": prefix_tokens,
+            "prefix_cacheable": prefix_tokens >= PROMPT_CACHE_MIN_TOKENS,
+            "avg_prompt_chars": round(stats["total_chars"] / renders),
+            "static_ratio": round(len(self.prefix) * stats["renders"] / stats["total_chars"], 3) if stats["total_chars"] else 0,
+            "shared_prefix_ratio": round(stats["shared_chars"] / stats["total_chars"], 3) if stats["total_chars"] else 0
+        }
+
+
+def get_prompt_stats() -> dict:
+    with _templates_lock:
+        templates = dict(_templates)
+    return {name: template.stats() for name, template in sorted(templates.items())}
@@ -0,0 +1,87 @@
+import json
+import hashlib
+import threading
+
+# ============================================================
+# ================ SINGLE-FLIGHT CALL COALESCING =============
+# ============================================================
+# Concurrent calls with the same key share one execution: the first caller
+# (the leader) runs the function, the others wait and receive its result
+# (or its exception). Nothing is cached once the call finishes — this only
+# collapses requests that overlap in time.
+#
+# Waiters block on a threading.Event, so it only works for callers running
+# in worker threads. The async chat handlers call the deduplicated helpers
+# (detect_intent, llm_force_json_table, the table retry) through
+# asyncio.to_thread, and speculative follow-ups run on the suggestion
+# engine's executor. Called straight from the event loop, two requests could
+# never overlap, and a waiter would block the loop.
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}   # key -> _Call
+        self._stats = {"calls": 0, "executed": 0, "deduplicated": 0, "errors": 0}
+
+    def do(self, key: str, fn):
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats["deduplicated"] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._stats["executed"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+        return call.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            in_flight = len(self._calls)
+        return {
+            "name": self.name,
+            **stats,
+            "in_flight": in_flight,
+            "dedup_ratio": round(stats["deduplicated"] / stats["calls"], 3) if stats["calls"] else 0
+        }
+
+
+def request_key(*parts) -> str:
+    """Stable hash of JSON-serialisable request parts (model, messages, params...)."""
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import uuid
+from utils.kv_store import MemoryStore, build_store
+
+# ============================================================
+# ================= TWO-LEVEL (TIERED) CACHE =================
+# ============================================================
+# L1: process-local LRU (short TTL)  ->  L2: shared store  ->  loader
+#
+#   get(key, loader)   read-through; fills L2 then L1
+#   set(key, value)    write-through to both levels + invalidation message
+#   invalidate(key)    drop from both levels + invalidation message
+#
+# Invalidation messages tell the other workers to drop their L1 copy:
+#   redis  -> pub/sub channel
+#   sqlite -> shared events table, polled at most every CACHE_BUS_POLL_SECONDS
+#   memory -> single process, nothing to send
+# The L1 TTL bounds staleness if a message is ever missed.
+
+CACHE_BUS_POLL_SECONDS = float(os.getenv("CACHE_BUS_POLL_SECONDS", "1"))
+CACHE_BUS_CHANNEL = "cache-invalidation"
+
+
+class LocalBus:
+
+    def __init__(self):
+        self._subscribers = []
+        # Identifies this process on the bus so it ignores its own messages
+        self.origin = uuid.uuid4().hex
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def publish(self, namespace: str, key: str | None):
+        # Single process: the publisher already updated its own L1
+        pass
+
+    def poll(self):
+        pass
+
+    def _dispatch(self, namespace: str, key: str | None):
+        for callback in list(self._subscribers):
+            try:
+                callback(namespace, key)
+            except Exception as e:
+                print("⚠ Cache invalidation handler failed:", e)
+
+
+class SQLiteBus(LocalBus):
+    """Invalidation events in a SQLite table shared by workers on one host."""
+
+    RETENTION_SECONDS = 3600
+
+    def __init__(self, path: str):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._last_poll = 0.0
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_events ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " namespace TEXT NOT NULL,"
+            " key TEXT,"
+            " origin TEXT,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        (self._last_id,) = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM cache_events").fetchone()
+
+    def publish(self, namespace: str, key: str | None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO cache_events (namespace, key, origin, created_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, self.origin, now)
+            )
+            self._conn.execute("DELETE FROM cache_events WHERE created_at < ?", (now - self.RETENTION_SECONDS,))
+            self._conn.commit()
+
+    def poll(self):
+        now = time.time()
+        if now - self._last_poll < CACHE_BUS_POLL_SECONDS:
+            return
+        with self._lock:
+            self._last_poll = now
+            rows = self._conn.execute(
+                "SELECT id, namespace, key, origin FROM cache_events WHERE id > ? ORDER BY id",
+                (self._last_id,)
+            ).fetchall()
+            if rows:
+                self._last_id = rows[-1][0]
+        for _, namespace, key, origin in rows:
+            if origin != self.origin:
+                self._dispatch(namespace, key)
+
+
+class RedisBus(LocalBus):
+    """Invalidation over Redis pub/sub (optional `redis` package)."""
+
+    def __init__(self, url: str):
+        import redis   # optional dependency
+
+        super().__init__()
+        self.client = redis.Redis.from_url(url)
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(CACHE_BUS_CHANNEL)
+        threading.Thread(target=self._listen, daemon=True).start()
+
+    def publish(self, namespace: str, key: str | None):
+        self.client.publish(CACHE_BUS_CHANNEL, json.dumps({"namespace": namespace, "key": key, "origin": self.origin}))
+
+    def _listen(self):
+        for message in self._pubsub.listen():
+            try:
+                event = json.loads(message["data"])
+                if event.get("origin") == self.origin:
+                    continue
+                self._dispatch(event.get("namespace"), event.get("key"))
+            except Exception as e:
+                print("⚠ Bad cache invalidation message:", e)
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_bus(backend: str | None = None):
+    """Process-wide invalidation bus matching the configured cache backend."""
+    global _bus
+    with _bus_lock:
+        if _bus is not None:
+            return _bus
+
+        backend = (backend or os.getenv("CACHE_BACKEND") or os.getenv("KV_STORE_BACKEND") or "memory").lower()
+        try:
+            if backend == "redis":
+                _bus = RedisBus(os.getenv("KV_STORE_REDIS_URL", "redis://localhost:6379/0"))
+            elif backend == "sqlite":
+                directory = os.getenv("KV_STORE_SQLITE_DIR", ".")
+                os.makedirs(directory, exist_ok=True)
+                _bus = SQLiteBus(os.path.join(directory, "cache_events.sqlite3"))
+        except Exception as e:
+            print(f"⚠ Cache invalidation bus unavailable ({backend}), using local: {e}")
+
+        if _bus is None:
+            _bus = LocalBus()
+        return _bus
+
+
+class TieredCache:
+
+    def __init__(
+        self,
+        namespace: str,
+        local_ttl: float = 30,
+        shared_ttl: float = 600,
+        local_max_entries: int = 5000,
+        backend: str | None = None
+    ):
+        backend = (backend or os.getenv("CACHE_BACKEND") or os.getenv("KV_STORE_BACKEND") or "memory").lower()
+
+        self.namespace = namespace
+        self.local = MemoryStore(max_entries=local_max_entries, default_ttl=local_ttl)
+        # A memory L2 would just duplicate L1 inside the same process
+        self.shared = None if backend == "memory" else build_store(namespace, backend=backend, default_ttl=shared_ttl)
+        self.bus = get_bus(backend)
+        self.bus.subscribe(self._on_invalidate)
+
+        self._lock = threading.Lock()
+        self._stats = {
+            "l1_hits": 0,
+            "l2_hits": 0,
+            "misses": 0,
+            "loads": 0,
+            "writes": 0,
+            "invalidations_sent": 0,
+            "invalidations_received": 0
+        }
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key: str, loader=None):
+        """
+        Return the cached value, or load it with loader(key) and cache it.
+        Loaders return None for "don't cache" (not found / lookup failed).
+        """
+        self.bus.poll()
+
+        value = self.local.get(key)
+        if value is not None:
+            self._count("l1_hits")
+            return value
+
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                print(f"⚠ Shared cache read failed ({self.namespace}):", e)
+                value = None
+            if value is not None:
+                self._count("l2_hits")
+                self.local.set(key, value)
+                return value
+
+        self._count("misses")
+        if loader is None:
+            return None
+
+        value = loader(key)
+        self._count("loads")
+        if value is not None:
+            self._fill(key, value)
+        return value
+
+    def _fill(self, key: str, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value)
+            except Exception as e:
+                print(f"⚠ Shared cache write failed ({self.namespace}):", e)
+
+    def set(self, key: str, value):
+        """Write-through after the source of truth was updated."""
+        self._fill(key, value)
+        self._count("writes")
+        self._publish(key)
+
+    def invalidate(self, key: str | None = None):
+        """Drop one key (or the whole namespace) on every worker."""
+        if key is None:
+            self.local.clear()
+            if self.shared is not None:
+                self.shared.clear()
+        else:
+            self.local.delete(key)
+            if self.shared is not None:
+                self.shared.delete(key)
+        self._publish(key)
+
+    def _publish(self, key: str | None):
+        try:
+            self.bus.publish(self.namespace, key)
+            self._count("invalidations_sent")
+        except Exception as e:
+            print(f"⚠ Cache invalidation publish failed ({self.namespace}):", e)
+
+    def _on_invalidate(self, namespace: str, key: str | None):
+        if namespace != self.namespace:
+            return
+        self._count("invalidations_received")
+        if key is None:
+            self.local.clear()
+        else:
+            self.local.delete(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["l1_hits"] + stats["l2_hits"] + stats["misses"]
+        return {
+            "namespace": self.namespace,
+            **stats,
+            "hit_ratio": round((stats["l1_hits"] + stats["l2_hits"]) / lookups, 3) if lookups else 0,
+            "local": self.local.stats(),
+            "shared": self.shared.stats() if self.shared is not None else None
+        }